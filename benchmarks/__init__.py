@@ -0,0 +1,11 @@
+"""
+基准测试套件
+- 固定的输入：合成的战斗截图（可用 --screens 换成真实截图目录）、data/ 下的模型响应样例、
+  12 人合成角色池与敌人配置
+- 覆盖每回合流水线的各个阶段：截图、PNG 编码、OCR、模板匹配、响应解析、回合模拟、队伍搜索，
+  以及用录制响应回放的完整决策回合
+- 结果输出为 JSON，compare 子命令与基线比较并标出超过阈值的回退
+
+    python -m benchmarks run --out bench.json
+    python -m benchmarks compare baseline.json bench.json --threshold 0.1
+"""
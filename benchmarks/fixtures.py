@@ -0,0 +1,116 @@
+"""
+基准测试的固定输入
+- 截图按固定种子合成（带纹理的渐变背景、角色头像、血条、技能按钮与数值文字），每次运行完全一致
+- 模型响应、角色池与敌人配置读取自 benchmarks/data/
+"""
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from src.ai.mock_server import load_responses
+from src.replay.sources import FolderScreenSource
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SCREEN_SIZE = (1920, 1080)
+# 合成截图中各元素的位置 (left, top, width, height)
+STATS_REGION = (1380, 260, 420, 300)
+SKILL_BUTTON_REGION = (1660, 860, 120, 120)
+
+
+def synthetic_screen(seed: int = 0, size: Tuple[int, int] = SCREEN_SIZE) -> np.ndarray:
+    """合成一张 RGB 战斗截图。"""
+    width, height = size
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[..., 0] = (30 + 60 * xx / width).astype(np.uint8)
+    img[..., 1] = (20 + 40 * yy / height).astype(np.uint8)
+    img[..., 2] = (70 + 25 * np.sin(xx / 37.0) * np.cos(yy / 53.0)).astype(np.uint8)
+    # 底部 4 个角色头像与血条
+    for i in range(4):
+        x = 560 + i * 200
+        cv2.rectangle(img, (x, 900), (x + 150, 1040), tuple(int(v) for v in rng.integers(60, 230, 3)), -1)
+        cv2.rectangle(img, (x, 1046), (x + 150, 1056), (40, 40, 40), -1)
+        cv2.rectangle(img, (x, 1046), (x + int(150 * rng.uniform(0.3, 1.0)), 1056), (60, 220, 90), -1)
+    # 敌人与韧性条
+    cv2.ellipse(img, (960, 420), (180, 240), 0, 0, 360, (150, 40, 60), -1)
+    cv2.rectangle(img, (760, 120), (1160, 136), (230, 230, 230), -1)
+    # 技能按钮（模板匹配目标）
+    left, top, w, h = SKILL_BUTTON_REGION
+    cx, cy = left + w // 2, top + h // 2
+    cv2.circle(img, (cx, cy), 52, (240, 200, 80), -1)
+    cv2.circle(img, (cx, cy), 40, (30, 30, 60), 4)
+    cv2.putText(img, "E", (cx - 16, cy + 16), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (255, 255, 255), 3)
+    # 数值面板（OCR 目标）
+    left, top, w, h = STATS_REGION
+    cv2.rectangle(img, (left, top), (left + w, top + h), (15, 15, 25), -1)
+    for i, line in enumerate(("ATK 2412", "HP 4213", "DEF 902", "SPD 134", "CRIT 62%", "CDMG 140%")):
+        cv2.putText(img, line, (left + 20, top + 42 + i * 46), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (235, 235, 235), 2)
+    return img
+
+
+def crop(img: np.ndarray, region: Tuple[int, int, int, int]) -> np.ndarray:
+    left, top, width, height = region
+    return img[top:top + height, left:left + width]
+
+
+class StaticScreenSource:
+    """循环返回给定的 PIL 图像，接口与 replay.sources 相同。"""
+
+    def __init__(self, images: List[Image.Image]):
+        self.images = images
+        self.position = 0
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None):
+        img = self.images[self.position % len(self.images)]
+        self.position += 1
+        if region:
+            left, top, width, height = region
+            return img.crop((left, top, left + width, top + height))
+        return img
+
+
+@dataclass
+class Fixtures:
+    screens: List[np.ndarray]  # RGB
+    responses: Dict[str, List[str]]
+    roster: List[Dict[str, Any]]
+    enemy: Dict[str, Any]
+    template: np.ndarray = field(init=False)  # BGR
+
+    def __post_init__(self):
+        self.template = cv2.cvtColor(np.ascontiguousarray(crop(self.screens[0], SKILL_BUTTON_REGION)),
+                                     cv2.COLOR_RGB2BGR)
+
+    def screen_source(self):
+        return StaticScreenSource([Image.fromarray(s) for s in self.screens])
+
+
+def _load_json(name: str) -> Any:
+    with open(os.path.join(DATA_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_fixtures(screens_dir: Optional[str] = None) -> Fixtures:
+    """screens_dir 为截图目录时使用其中的截图，否则使用合成截图。"""
+    if screens_dir:
+        source = FolderScreenSource(screens_dir)
+        screens = [np.asarray(source.capture()) for _ in range(len(source))]
+    else:
+        screens = [synthetic_screen(seed) for seed in range(3)]
+    return Fixtures(
+        screens=screens,
+        responses=load_responses(os.path.join(DATA_DIR, "responses.jsonl")),
+        roster=_load_json("roster.json"),
+        enemy=_load_json("enemy.json"),
+    )
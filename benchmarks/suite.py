@@ -0,0 +1,438 @@
+"""
+基准测试的注册、计时、基线比较与命令行
+- 每项基准由 @benchmark 注册：setup(fixtures) 返回待计时的无参函数，依赖缺失时抛出 SkipBenchmark
+- 计时：先预热一次，再按单次耗时自动确定每个样本的调用次数（样本不短于 20 ms），取 repeat 个样本
+- budget_ms 是各阶段的延迟预算：一个回合的本地开销（截图、编码、解析、执行）应远小于模型往返。
+  预算按单核参考机上实测 p90 的约 1.5 倍设定（未能实测的 capture_live / ocr / 真实按键后端为估计值），
+  run 中任一项中位数超出预算时退出码为 1（--no-budget-check 只报告不失败）
+- compare 以中位数比较，变慢超过 threshold 且绝对差超过 min_delta_ms 记为回退，命令以退出码 1 结束
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from .fixtures import SKILL_BUTTON_REGION, STATS_REGION, Fixtures, crop, load_fixtures
+
+MIN_SAMPLE_SECONDS = 0.02
+MAX_NUMBER = 1000
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_MIN_DELTA_MS = 0.05
+# 按键发送基准使用的键；为 None 时只测 recording 后端，真实后端需 --live-input 开启（会向前台窗口发送按键）
+LIVE_INPUT_KEY: Optional[str] = None
+
+
+class SkipBenchmark(Exception):
+    """当前环境无法运行该基准（例如缺少可选依赖）。"""
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[Fixtures], Callable[[], Any]]
+    budget_ms: Optional[float] = None
+    repeat: int = 15
+    description: str = ""
+
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(name: str, budget_ms: Optional[float] = None, repeat: int = 15):
+    def register(setup: Callable[[Fixtures], Callable[[], Any]]):
+        doc = (setup.__doc__ or "").strip().splitlines()
+        BENCHMARKS[name] = Benchmark(name, setup, budget_ms, repeat, doc[0] if doc else "")
+        return setup
+    return register
+
+
+def _bgr(img: np.ndarray) -> np.ndarray:
+    return cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2BGR)
+
+
+def _quiet_logger() -> logging.Logger:
+    log = logging.getLogger("benchmarks.pipeline")
+    log.setLevel(logging.WARNING)
+    return log
+
+
+# ---- 基准项 ----
+@benchmark("capture", budget_ms=6)
+def bench_capture(fx: Fixtures):
+    """从画面来源取一帧并转为 BGR 数组（与 ImageRecognizer.capture_screen 相同的转换）"""
+    source = fx.screen_source()
+    return lambda: cv2.cvtColor(np.asarray(source.capture()), cv2.COLOR_RGB2BGR)
+
+
+@benchmark("capture_live", budget_ms=30)
+def bench_capture_live(fx: Fixtures):
+    """实时全屏截图（需要图形环境与 pyautogui）"""
+    try:
+        import pyautogui
+        pyautogui.screenshot()
+    except Exception as e:
+        raise SkipBenchmark(f"无法实时截图：{e}")
+    return pyautogui.screenshot
+
+
+@benchmark("encode", budget_ms=250)
+def bench_encode(fx: Fixtures):
+    """整帧 PNG 编码 + base64（AIStrategyEngine.screenshot_to_base64）"""
+    from src.ai.strategy_engine import AIStrategyEngine
+    from src.game_control.controller import NullController
+    from src.replay.runner import RecordedAIClient
+    from src.storage.memory import InMemoryStore
+
+    engine = AIStrategyEngine(RecordedAIClient({}), NullController(), InMemoryStore(), logger=_quiet_logger())
+    engine.screen_source = fx.screen_source()
+    return engine.screenshot_to_base64
+
+
+@benchmark("ocr_preprocess", budget_ms=0.5)
+def bench_ocr_preprocess(fx: Fixtures):
+    """数值面板的灰度/二值化预处理（OCR.preprocess）"""
+    from src.image_recognition.ocr import OCR
+
+    ocr, panel = OCR(), _bgr(crop(fx.screens[0], STATS_REGION))
+    return lambda: ocr.preprocess(panel)
+
+
+@benchmark("ocr", budget_ms=300, repeat=5)
+def bench_ocr(fx: Fixtures):
+    """数值面板 Tesseract 识别（需要 pytesseract 与 tesseract）"""
+    from src.image_recognition.ocr import OCR, OCRConfig, pytesseract
+
+    if pytesseract is None:
+        raise SkipBenchmark("未安装 pytesseract")
+    ocr, panel = OCR(OCRConfig(lang="eng")), _bgr(crop(fx.screens[0], STATS_REGION))
+    if ocr.image_to_text(panel).startswith("[OCR 失败"):
+        raise SkipBenchmark("tesseract 不可用")
+    return lambda: ocr.image_to_text(panel)
+
+
+@benchmark("template_match", budget_ms=1200)
+def bench_template_match(fx: Fixtures):
+    """整帧技能按钮模板匹配（ImageRecognizer.find_template，不含截图）"""
+    from src.image_recognition.recognizer import ImageRecognizer
+
+    frame = _bgr(fx.screens[0])
+    recognizer = ImageRecognizer()
+    recognizer.templates["skill_button"] = fx.template
+    recognizer.capture_screen = lambda: frame
+
+    def run():
+        found, loc = recognizer.find_template("skill_button")
+        if not found or tuple(loc) != SKILL_BUTTON_REGION[:2]:
+            raise RuntimeError(f"模板匹配结果不正确：{found} {loc}")
+    return run
+
+
+@benchmark("template_match_roi", budget_ms=10)
+def bench_template_match_roi(fx: Fixtures):
+    """只在技能按钮周围 ROI 内做模板匹配（ResolvedRegion 切片，不含截图），与 template_match 对比"""
+    from src.image_recognition.recognizer import ImageRecognizer
+    from src.image_recognition.roi import ROIRegistry
+
+    frame = _bgr(fx.screens[0])
+    left, top, w, h = SKILL_BUTTON_REGION
+    roi = ROIRegistry({"skill_button": [left - 40, top - 40, w + 80, h + 80]})
+    roi.resolve((frame.shape[1], frame.shape[0]))
+    recognizer = ImageRecognizer()
+    recognizer.templates["skill_button"] = fx.template
+    recognizer.capture_screen = lambda: frame
+    recognizer.roi = roi
+
+    def run():
+        found, loc = recognizer.find_template("skill_button", region="skill_button")
+        if not found or tuple(loc) != SKILL_BUTTON_REGION[:2]:
+            raise RuntimeError(f"模板匹配结果不正确：{found} {loc}")
+    return run
+
+
+@benchmark("json_parse", budget_ms=1)
+def bench_json_parse(fx: Fixtures):
+    """解析并校验全部响应样例一遍（含代码块、夹带说明文字与需要宽松修正的响应）"""
+    from src.ai.response_parser import parse_json_response
+
+    items = [(call_type, text) for call_type, texts in fx.responses.items() for text in texts]
+
+    def run():
+        for call_type, text in items:
+            parse_json_response(text, call_type)
+    return run
+
+
+def _team(fx: Fixtures, size: int = 4):
+    from src.models.enemy import enemy_from_config
+    from src.models.tables import RosterTable
+
+    roster = fx.roster[:size]
+    computed = RosterTable.from_configs(roster).computed_rows()
+    team = [{**c, "element": r.get("element"), "path": r.get("path"), "level": r.get("level", 80)}
+            for r, c in zip(roster, computed)]
+    enemy_obj = enemy_from_config(fx.enemy)
+    enemy = {**enemy_obj.computed, "level": enemy_obj.level,
+             "weaknesses": enemy_obj.weaknesses, "resistances": enemy_obj.resistances}
+    return team, enemy
+
+
+@benchmark("turn_order_sim", budget_ms=100)
+def bench_turn_order_sim(fx: Fixtures):
+    """4 人队伍 2000 次行动值战斗模拟（simulate_battle）"""
+    from src.models.simulator import simulate_battle
+
+    team, enemy = _team(fx)
+    return lambda: simulate_battle(team, enemy, trials=2000, seed=0)
+
+
+@benchmark("team_search", budget_ms=500, repeat=3)
+def bench_team_search(fx: Fixtures):
+    """12 人角色池搜索最优队伍：495 组粗筛 + 16 组模拟精排（单进程）"""
+    from src.strategy.team_search import search_teams
+
+    return lambda: search_teams(fx.roster, fx.enemy, top_k=5, refine=16, trials=500, workers=0, seed=0)
+
+
+@benchmark("battle_tick", budget_ms=250)
+def bench_battle_tick(fx: Fixtures):
+    """完整决策回合：截图 → 编码 → 提示词 → 录制响应 → 解析 → 执行（不含网络）"""
+    from src.ai.prompts import BATTLE_DECISION, GENERATE_STRATEGY
+    from src.ai.response_parser import parse_json_response
+    from src.ai.strategy_engine import AIStrategyEngine
+    from src.decision_engine.ai_decision import AIBattleDecision
+    from src.game_control.controller import NullController
+    from src.replay.runner import RecordedAIClient
+    from src.storage.memory import InMemoryStore
+
+    memory = InMemoryStore()
+    memory.save("current_strategy", parse_json_response(fx.responses[GENERATE_STRATEGY][0], GENERATE_STRATEGY))
+    client = RecordedAIClient({BATTLE_DECISION: [{"response": r} for r in fx.responses[BATTLE_DECISION]]}, loop=True)
+    controller = NullController()
+    log = _quiet_logger()
+    engine = AIStrategyEngine(client, controller, memory, logger=log)
+    engine.screen_source = fx.screen_source()
+    decision = AIBattleDecision(engine, logger=log)
+    decision.wait_seconds = 0.0
+
+    def run():
+        if decision.current_round >= 20:
+            decision.start_battle()
+        decision.execute_action(decision.make_decision(), controller)
+    return run
+
+
+@benchmark("pixel_probes", budget_ms=0.05)
+def bench_pixel_probes(fx: Fixtures):
+    """16 个 HUD 像素探针在整帧上一次求值（PixelProbeSet）"""
+    from src.image_recognition.probes import PixelProbe, PixelProbeSet
+
+    frame = fx.screens[0]
+    points = [(560 + i * 200 + 75, 970) for i in range(4)] + [(560 + i * 200 + 75, 1050) for i in range(4)]
+    points += [(SKILL_BUTTON_REGION[0] + 10 * i, SKILL_BUTTON_REGION[1] + 60) for i in range(8)]
+    probes = PixelProbeSet(PixelProbe(f"p{i}", x, y, tuple(int(v) for v in frame[y, x]), 20)
+                           for i, (x, y) in enumerate(points))
+    return lambda: probes.evaluate(frame)
+
+
+def _key_dispatch(backend_name: str, **options: Any):
+    def setup(fx: Fixtures):
+        from src.game_control.backends import create_backend
+
+        if backend_name != "recording" and LIVE_INPUT_KEY is None:
+            raise SkipBenchmark("会发送真实按键，需 --live-input")
+        try:
+            backend = create_backend(backend_name, **options)
+            backend.position()  # 延迟导入的后端在这里暴露依赖或显示问题
+        except Exception as e:
+            raise SkipBenchmark(f"后端不可用：{e}")
+        key = LIVE_INPUT_KEY or "f10"
+        return lambda: backend.press(key)
+    setup.__doc__ = f"单次按键（按下+抬起）的发送耗时，{backend_name} 后端"
+    return setup
+
+
+for _name, _budget, _options in (
+    ("recording", 0.01, {}),
+    ("pyautogui", 1.0, {"pause": 0.0}),
+    ("pynput", 0.5, {}),
+    ("xtest", 0.5, {}),
+    ("uinput", 0.2, {}),
+):
+    benchmark(f"key_{_name}", budget_ms=_budget, repeat=5)(_key_dispatch(_name, **_options))
+
+
+# ---- 计时与报告 ----
+def measure(fn: Callable[[], Any], repeat: int, min_sample: float = MIN_SAMPLE_SECONDS) -> Dict[str, Any]:
+    """返回单次调用耗时（毫秒）的统计。"""
+    t0 = time.perf_counter()
+    fn()
+    first = time.perf_counter() - t0
+    number = max(1, min(MAX_NUMBER, math.ceil(min_sample / first))) if first > 0 else MAX_NUMBER
+    samples: List[float] = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t0) / number * 1000.0)
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 4),
+        "min_ms": round(ordered[0], 4),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))], 4),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "stdev_ms": round(statistics.stdev(ordered), 4) if len(ordered) > 1 else 0.0,
+        "number": number,
+        "repeat": len(ordered),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_suite(fx: Fixtures, only: Optional[List[str]] = None, repeat: Optional[int] = None) -> Dict[str, Any]:
+    names = only or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"未知的基准项：{', '.join(unknown)}，可选 {', '.join(BENCHMARKS)}")
+    results: Dict[str, Any] = {}
+    for name in names:
+        b = BENCHMARKS[name]
+        entry: Dict[str, Any] = {"description": b.description, "budget_ms": b.budget_ms}
+        try:
+            entry.update(measure(b.setup(fx), repeat or b.repeat))
+            entry["over_budget"] = b.budget_ms is not None and entry["median_ms"] > b.budget_ms
+        except SkipBenchmark as e:
+            entry["skipped"] = str(e)
+        results[name] = entry
+        print(f"  {name:<16} {_fmt(entry)}", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "screens": len(fx.screens),
+        },
+        "benchmarks": results,
+    }
+
+
+def _fmt(entry: Dict[str, Any]) -> str:
+    if "skipped" in entry:
+        return f"跳过（{entry['skipped']}）"
+    flag = "  超出预算" if entry.get("over_budget") else ""
+    return f"{entry['median_ms']:>10.3f} ms  (p90 {entry['p90_ms']:.3f}, 预算 {entry['budget_ms']}){flag}"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS, metric: str = "median_ms") -> List[Dict[str, Any]]:
+    """逐项比较，status 为 regression / improved / ok / new / missing / skipped。"""
+    base, cur = baseline.get("benchmarks", {}), current.get("benchmarks", {})
+    rows = []
+    for name in list(base) + [n for n in cur if n not in base]:
+        b, c = base.get(name) or {}, cur.get(name) or {}
+        row: Dict[str, Any] = {"name": name, "baseline_ms": b.get(metric), "current_ms": c.get(metric), "change": None}
+        if name not in cur:
+            row["status"] = "missing"
+        elif name not in base:
+            row["status"] = "new"
+        elif row["baseline_ms"] is None or row["current_ms"] is None:
+            row["status"] = "skipped"
+        else:
+            delta = row["current_ms"] - row["baseline_ms"]
+            row["change"] = round(delta / row["baseline_ms"], 4) if row["baseline_ms"] > 0 else None
+            if abs(delta) < min_delta_ms or row["change"] is None or abs(row["change"]) <= threshold:
+                row["status"] = "ok"
+            else:
+                row["status"] = "regression" if delta > 0 else "improved"
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]], threshold: float):
+    labels = {"regression": "回退", "improved": "提升", "ok": "持平", "new": "新增", "missing": "缺失", "skipped": "跳过"}
+    print(f"{'基准项':<16} {'基线 ms':>12} {'当前 ms':>12} {'变化':>9}  状态（阈值 {threshold:.0%}）")
+    for r in rows:
+        b = f"{r['baseline_ms']:.3f}" if r["baseline_ms"] is not None else "-"
+        c = f"{r['current_ms']:.3f}" if r["current_ms"] is not None else "-"
+        change = f"{r['change']:+.1%}" if r["change"] is not None else "-"
+        print(f"{r['name']:<16} {b:>12} {c:>12} {change:>9}  {labels[r['status']]}")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="流水线各阶段基准测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="运行基准并输出 JSON")
+    run_p.add_argument("--only", default=None, help="逗号分隔的基准项，默认全部")
+    run_p.add_argument("--repeat", type=int, default=None, help="覆盖各项的样本数")
+    run_p.add_argument("--screens", default=None, help="用截图目录代替合成截图")
+    run_p.add_argument("--out", default=None, help="结果写入文件，默认输出到标准输出")
+    run_p.add_argument("--baseline", default=None, help="运行后与该基线比较")
+    run_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    run_p.add_argument("--no-budget-check", action="store_true", help="超出预算时只在输出中标出，退出码仍为 0")
+    run_p.add_argument("--live-input", nargs="?", const="f10", default=None, metavar="KEY",
+                       help="同时测真实输入后端的按键耗时（向前台窗口发送 KEY，默认 f10）")
+    cmp_p = sub.add_parser("compare", help="比较两份结果，有回退时退出码为 1")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    cmp_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="相对变慢比例，默认 0.1")
+    cmp_p.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="忽略小于该值的绝对差")
+    cmp_p.add_argument("--metric", default="median_ms", choices=["median_ms", "min_ms", "p90_ms", "mean_ms"])
+    list_p = sub.add_parser("list", help="列出全部基准项")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    if args.command == "list":
+        for b in BENCHMARKS.values():
+            print(f"{b.name:<16} 预算 {b.budget_ms} ms  {b.description}")
+        return
+    if args.command == "compare":
+        rows = compare(_load(args.baseline), _load(args.current), args.threshold, args.min_delta_ms, args.metric)
+        print_comparison(rows, args.threshold)
+        sys.exit(1 if any(r["status"] == "regression" for r in rows) else 0)
+
+    global LIVE_INPUT_KEY
+    LIVE_INPUT_KEY = args.live_input
+    only = [n.strip() for n in args.only.split(",") if n.strip()] if args.only else None
+    report = run_suite(load_fixtures(args.screens), only, args.repeat)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    failed = False
+    if args.baseline:
+        rows = compare(_load(args.baseline), report, args.threshold)
+        print_comparison(rows, args.threshold)
+        failed = any(r["status"] == "regression" for r in rows)
+    over = [name for name, e in report["benchmarks"].items() if e.get("over_budget")]
+    if over:
+        print(f"超出预算：{', '.join(over)}", file=sys.stderr)
+        failed = failed or not args.no_budget_check
+    sys.exit(1 if failed else 0)
@@ -8,13 +8,20 @@ import logging
 from typing import Dict, Optional
 
 from src.image_recognition.recognizer import ImageRecognizer
+from src.image_recognition.roi import ROIRegistry, screen_size
+from src.game_control.backends import create_backend
 from src.game_control.controller import GameController
+from src.game_control.executor import InputExecutor
 
 # AI策略引擎
 from src.config import load_config
 from src.ai import AIClient, AIConfig, AIProviderType, AIStrategyEngine
-from src.storage.memory import MemoryStore
+from src.ai.response_parser import parse_stats
+from src.storage.memory import MemoryStore, create_memory_store
+from src.storage.battle_log import BattleLog
+from src.storage.session import SessionRecorder
 from src.decision_engine.ai_decision import AIBattleDecision
+from src.telemetry import metrics, profiling, tracing
 
 
 class StarRailAutoBattle:
@@ -38,15 +45,21 @@ class StarRailAutoBattle:
         self.ai_client: Optional[AIClient] = None
         self.ai_strategy_engine: Optional[AIStrategyEngine] = None
         self.ai_decision: Optional[AIBattleDecision] = None
+        self.battle_log: Optional[BattleLog] = None
+        self.roi: Optional[ROIRegistry] = None
+        self.recorder: Optional[SessionRecorder] = None
+        self.metrics_server: Optional[metrics.MetricsServer] = None
+        self.metrics_snapshot: Optional[metrics.SnapshotWriter] = None
+        self.profiler: Optional[profiling.Profiler] = None
+        self.input_executor: Optional[InputExecutor] = None
 
         # 运行模式
         self.plan_only = False  # 仅规划模式
         self.scan_only = False  # 仅扫描模式
+        self.replay: Dict = {}  # 离线回放配置（run.replay）
 
-        # 战斗状态
+        # 战斗状态（战斗数与胜场由 metrics.BATTLES 统计）
         self.is_running = False
-        self.battle_count = 0
-        self.victory_count = 0
 
     def _setup_ai(self):
         """设置AI客户端和策略引擎"""
@@ -62,6 +75,14 @@ class StarRailAutoBattle:
                 timeout=int(ai_cfg.get("timeout", 60)),
                 endpoint=ai_cfg.get("endpoint"),
                 headers=ai_cfg.get("headers"),
+                response_format=ai_cfg.get("response_format", "json_schema"),
+                max_tokens=ai_cfg.get("max_tokens") or None,
+                resilience=ai_cfg.get("resilience") or None,
+                fallbacks=ai_cfg.get("fallbacks") or None,
+                profiles=ai_cfg.get("profiles") or None,
+                routes=ai_cfg.get("routes") or None,
+                escalation=ai_cfg.get("escalation") or None,
+                min_confidence=float(ai_cfg.get("min_confidence", 0.5)),
             )
         except Exception as e:
             self.logger.warning(f"AI配置解析失败：{e}，使用默认配置")
@@ -77,9 +98,11 @@ class StarRailAutoBattle:
                 memory_store=self.memory,
                 logger=self.logger
             )
+            self.ai_strategy_engine.roi = self.roi
             self.ai_decision = AIBattleDecision(
                 ai_strategy_engine=self.ai_strategy_engine,
-                logger=self.logger
+                logger=self.logger,
+                battle_log=self.battle_log
             )
         else:
             self.logger.warning("AI未启用，将无法使用自动战斗功能")
@@ -89,10 +112,30 @@ class StarRailAutoBattle:
         inp = (self.config.get("input", {}) or {})
         keybinds = (inp.get("keybinds") or {})
         enabled = bool(inp.get("enable_inputs", False))
+        backend = None
+        name = inp.get("backend") or "pyautogui"
+        if name != self.game_controller.backend.name:
+            try:
+                backend = create_backend(name, **(inp.get("backend_options") or {}))
+            except (RuntimeError, ValueError, TypeError) as e:
+                self.logger.warning(f"输入后端 {name} 不可用：{e}，继续使用 {self.game_controller.backend.name}")
         try:
-            self.game_controller.update_settings(keybinds=keybinds, enable_inputs=enabled)
+            self.game_controller.update_settings(keybinds=keybinds, enable_inputs=enabled, backend=backend,
+                                                 pause=inp.get("pause"), move_duration=inp.get("move_duration"))
         except Exception as e:
             self.logger.warning(f"更新游戏控制器设置失败：{e}")
+        if inp.get("executor", True):
+            region = inp.get("reaction_region")
+            region = tuple(region) if region else None
+            self.input_executor = InputExecutor(
+                self.game_controller,
+                min_key_interval=float(inp.get("min_key_interval", 0.05)),
+                macros=inp.get("macros"),
+                frame_source=lambda: self.game_controller.screenshot(region),
+                reaction_timeout=float(inp.get("reaction_timeout", 1.0)),
+            )
+            if self.ai_decision is not None:
+                self.ai_decision.executor = self.input_executor
 
     def scan_characters_and_enemies(self):
         """扫描角色和敌人信息（使用AI识图）"""
@@ -104,7 +147,6 @@ class StarRailAutoBattle:
         self.logger.info("开始扫描模式")
         self.logger.info("="*60)
         
-        ui_regions = self.config.get("ui_regions", {})
         roster_config = self.config.get("roster", [])
         enemy_config = self.config.get("enemy", {})
         
@@ -124,7 +166,7 @@ class StarRailAutoBattle:
                     name=name,
                     element=element,
                     path=path,
-                    ui_regions=ui_regions
+                    ui_regions=self.roi
                 )
                 self.ai_strategy_engine.characters.append(char_info)
                 self.logger.info(f"✓ 角色 {name} 扫描完成")
@@ -145,7 +187,7 @@ class StarRailAutoBattle:
             try:
                 enemy_info = self.ai_strategy_engine.scan_enemy_with_ai(
                     name=enemy_name,
-                    ui_regions=ui_regions
+                    ui_regions=self.roi
                 )
                 self.ai_strategy_engine.enemies.append(enemy_info)
                 self.logger.info(f"✓ 敌人 {enemy_name} 扫描完成")
@@ -220,17 +262,61 @@ class StarRailAutoBattle:
         except Exception as e:
             self.logger.error(f"策略生成失败：{e}")
 
+    def _setup_metrics(self, telemetry: Dict):
+        """按 telemetry 配置启动指标 HTTP 服务与定期快照"""
+        metrics.set_prices(telemetry.get("prices"))
+        port = telemetry.get("metrics_port")
+        if port is not None:
+            try:
+                self.metrics_server = metrics.MetricsServer(
+                    host=telemetry.get("metrics_host", "127.0.0.1"), port=int(port)).start()
+            except OSError as e:
+                self.logger.warning(f"指标服务启动失败：{e}")
+        interval = float(telemetry.get("metrics_snapshot_interval", 60) or 0)
+        if interval > 0:
+            self.metrics_snapshot = metrics.SnapshotWriter(
+                path=telemetry.get("metrics_snapshot_path"), interval=interval).start()
+
+    def _setup_profiler(self, telemetry: Dict):
+        """按 telemetry 配置创建性能剖析器，并安装开关信号"""
+        self.profiler = profiling.Profiler(
+            telemetry.get("profile_path"),
+            interval=float(telemetry.get("profile_interval", 300)),
+            sample_hz=float(telemetry.get("profile_sample_hz", 50)),
+        )
+        signame = telemetry.get("profile_signal")
+        if profiling.install_signal_toggle(self.profiler, profiling.DEFAULT_SIGNAL if signame is None else signame):
+            self.logger.info(f"发送 {signame or profiling.DEFAULT_SIGNAL} 可开关性能剖析")
+        if telemetry.get("profile"):
+            self.profiler.start()
+
     def initialize(self):
         """初始化系统"""
         self.logger.info("正在初始化星穹铁道AI自动战斗系统...")
         
         # 加载配置
         self.config = load_config()
+        self.memory = create_memory_store(self.config.get("storage"))
+        telemetry = self.config.get("telemetry", {}) or {}
+        if telemetry.get("battle_log", True):
+            self.battle_log = BattleLog(telemetry.get("path"))
+        if telemetry.get("trace"):
+            tracing.enable(int(telemetry.get("trace_max_events", tracing.DEFAULT_MAX_EVENTS)))
+            self.logger.info("阶段追踪已启用，停止时导出 Chrome trace")
+        self._setup_metrics(telemetry)
+        self._setup_profiler(telemetry)
+        
+        # UI 区域与像素探针按当前屏幕尺寸解析一次，之后整屏截图尺寸变化时由策略引擎重新解析
+        self.roi = ROIRegistry.from_config(self.config)
+        size = screen_size()
+        if size and self.roi.resolve(size).invalid:
+            self.logger.warning(self.roi.problems())
         
         # 读取运行模式
         run_cfg = self.config.get("run", {})
         self.plan_only = bool(run_cfg.get("plan_only", False))
         self.scan_only = bool(run_cfg.get("scan_only", False))
+        self.replay = run_cfg.get("replay") or {}
         
         # 设置AI
         self._setup_ai()
@@ -238,7 +324,18 @@ class StarRailAutoBattle:
         # 应用输入设置
         self._apply_input_settings()
         
-        if self.scan_only:
+        if telemetry.get("record_session"):
+            self.recorder = SessionRecorder(
+                telemetry.get("session_path"),
+                scale=int(telemetry.get("frame_scale", 4)),
+                keyframe_interval=int(telemetry.get("keyframe_interval", 30)),
+                meta={"mode": self.config.get("mode"), "model": (self.config.get("ai") or {}).get("model")},
+            ).attach(self)
+            self.logger.info(f"会话录制已启用：{self.recorder.path}")
+        
+        if self.replay.get("source"):
+            self.logger.info(f"已启用回放模式：{self.replay['source']}")
+        elif self.scan_only:
             self.logger.info("已启用仅扫描模式：将扫描角色和敌人信息并保存")
         elif self.plan_only:
             self.logger.info("已启用仅规划模式：将生成策略，不会启动自动战斗")
@@ -265,7 +362,7 @@ class StarRailAutoBattle:
         try:
             while self.is_running:
                 self.battle_loop()
-                time.sleep(0.5)  # 控制决策频率
+                tracing.sleep(0.5, "tick_interval")  # 控制决策频率
         
         except KeyboardInterrupt:
             self.logger.info("收到停止信号...")
@@ -275,6 +372,28 @@ class StarRailAutoBattle:
         """停止自动战斗"""
         self.is_running = False
         self.logger.info("自动战斗已停止")
+        if self.ai_decision is not None and self.ai_decision.battle_started:
+            self.ai_decision.end_battle("stopped")
+        self.memory.flush(timeout=5.0)
+        if self.battle_log is not None:
+            self.battle_log.flush(timeout=5.0)
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.metrics_snapshot is not None:
+            self.metrics_snapshot.stop()
+            self.logger.info(f"指标快照：{self.metrics_snapshot.path}")
+            self.metrics_snapshot = None
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.input_executor is not None:
+            self.input_executor.stop()
+        if self.profiler is not None and self.profiler.running:
+            self.profiler.stop()
+        if tracing.is_enabled():
+            tracing.disable()
+            path = tracing.export_chrome_trace((self.config.get("telemetry") or {}).get("trace_path"))
+            self.logger.info(f"追踪已导出：{path}（{tracing.stats()['events']} 个事件，可用 ui.perfetto.dev 打开）")
         
         # 显示统计
         stats = self.get_statistics()
@@ -283,16 +402,67 @@ class StarRailAutoBattle:
         self.logger.info(f"  总战斗数：{stats.get('total_battles', 0)}")
         self.logger.info(f"  胜利次数：{stats.get('victories', 0)}")
         self.logger.info(f"  胜率：{stats.get('win_rate', 'N/A')}")
+        if stats["decisions"]:
+            self.logger.info(f"  决策：{stats['decisions']} 次，p50 {stats['decision_p50_ms']}ms / p99 {stats['decision_p99_ms']}ms，"
+                             f"上传 {stats['upload_mb']} MB")
+        if stats["input_reaction_p50_ms"] is not None:
+            self.logger.info(f"  按键到画面响应：p50 {stats['input_reaction_p50_ms']}ms")
+        if self.ai_client is not None and self.ai_client.usage_stats["calls"]:
+            usage = self.ai_client.usage_stats
+            ratio = self.ai_client.cache_hit_ratio()
+            self.logger.info(
+                f"  模型调用：{usage['calls']} 次，输入 {usage['prompt_tokens']} / 输出 {usage['completion_tokens']} tokens，"
+                f"提示词缓存命中 {usage['cached_tokens']}（{ratio * 100 if ratio is not None else 0:.1f}%）"
+            )
+        if self.ai_client is not None and self.ai_client.resilience.metrics["requests"]:
+            m = self.ai_client.resilience.metrics
+            self.logger.info(
+                f"  请求容错：重试 {m['retries']}，切换备用端点 {m['failovers']}，对冲 {m['hedged']}（胜出 {m['hedge_wins']}），"
+                f"熔断 {m['breaker_opened']} 次，最终失败 {m['failures']}"
+            )
+        if self.ai_strategy_engine is not None and len(self.ai_strategy_engine.router.clients) > 1:
+            for name, ps in self.ai_strategy_engine.router.profile_stats().items():
+                if ps["calls"] or ps["errors"]:
+                    self.logger.info(
+                        f"  档位 {name}（{ps['model']}）：调用 {ps['calls']}，失败 {ps['errors']}，升级 {ps['escalations']}，"
+                        f"p50 {ps['p50_ms']}ms / p95 {ps['p95_ms']}ms"
+                    )
+        for call_type, counts in parse_stats.items():
+            if counts["failed"] or counts["invalid"] or counts["fixed"]:
+                self.logger.info(
+                    f"  响应解析 {call_type}：成功 {counts['ok']}，修正后成功 {counts['fixed']}，"
+                    f"解析失败 {counts['failed']}，结构不符 {counts['invalid']}"
+                )
+        self.logger.info("="*60)
+
+    def run_replay(self) -> Dict:
+        """离线回放 run.replay.source，输出决策吞吐、延迟与分歧率"""
+        from src.replay import run_replay
+        backend = self.replay.get("backend", "recorded")
+        report = run_replay(
+            self.replay["source"], backend,
+            client=self.ai_client if backend == "live" else None,
+            ticks=self.replay.get("ticks"), log=self.logger,
+        )
+        div = report["divergence"]
+        self.logger.info("="*60)
+        self.logger.info(f"回放完成（{backend}）：{report['ticks']} 次决策，用时 {report['wall_s']}s，"
+                         f"{report['decisions_per_sec']} 次/秒，加速 {report['speedup']} 倍")
+        self.logger.info(f"  决策延迟：p50 {report['decision_ms']['p50']}ms / p99 {report['decision_ms']['p99']}ms")
+        if div["compared"]:
+            self.logger.info(f"  与录制动作不一致：{div['diverged']}/{div['compared']}（{div['rate'] * 100:.1f}%）")
         self.logger.info("="*60)
+        return report
 
     def battle_loop(self):
         """AI驱动的战斗循环"""
         try:
-            # AI做出决策
-            action = self.ai_decision.make_decision()
-            
-            # 执行动作
-            self.ai_decision.execute_action(action, self.game_controller)
+            with tracing.span("battle_tick", "loop"):
+                # AI做出决策
+                action = self.ai_decision.make_decision()
+                
+                # 执行动作
+                self.ai_decision.execute_action(action, self.game_controller)
             
             # 检测战斗结果（简化版，实际可以让AI识别）
             # TODO: 让AI识别战斗是否结束
@@ -301,18 +471,26 @@ class StarRailAutoBattle:
             self.logger.error(f"战斗循环出错：{e}")
 
     def get_statistics(self) -> Dict:
-        """获取战斗统计"""
-        if self.battle_count == 0:
-            return {"message": "暂无战斗数据"}
-        
-        win_rate = (self.victory_count / self.battle_count) * 100
+        """获取战斗统计（来自 metrics 注册表）"""
+        battles = int(metrics.BATTLES.total())
+        victories = int(metrics.BATTLES.value(result="victory"))
+        p50 = metrics.DECISION_LATENCY.quantile(0.5)
+        p99 = metrics.DECISION_LATENCY.quantile(0.99)
+        reaction = metrics.INPUT_REACTION.quantile(0.5)
         return {
-            "total_battles": self.battle_count,
-            "victories": self.victory_count,
-            "win_rate": f"{win_rate:.1f}%"
+            "total_battles": battles,
+            "victories": victories,
+            "win_rate": f"{victories / battles * 100:.1f}%" if battles else "N/A",
+            "decisions": metrics.DECISION_LATENCY.count(),
+            "decision_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "decision_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "tokens_in": int(metrics.TOKENS.total(direction="in")),
+            "tokens_out": int(metrics.TOKENS.total(direction="out")),
+            "upload_mb": round(metrics.UPLOAD_BYTES.total() / 1e6, 2),
+            "frames_dropped": int(metrics.FRAMES_DROPPED.total()),
+            "input_reaction_p50_ms": round(reaction * 1000, 1) if reaction is not None else None,
         }
 
-
 def main():
     """主函数"""
     auto_battle = StarRailAutoBattle()
@@ -321,6 +499,11 @@ def main():
         auto_battle.initialize()
         
         # 根据运行模式执行不同操作
+        if auto_battle.replay.get("source"):
+            # 回放模式：不截图、不发送按键
+            auto_battle.run_replay()
+            return
+        
         if auto_battle.scan_only:
             # 仅扫描模式
             auto_battle.scan_characters_and_enemies()
@@ -5,12 +5,14 @@ AI 接入模块
 """
 
 from .client import AIClient, AIConfig, AIProviderType
+from .prompts import PromptRegistry
 from .strategy_engine import AIStrategyEngine, CharacterInfo, EnemyInfo, BattleAction
 
 __all__ = [
     "AIClient",
     "AIConfig",
     "AIProviderType",
+    "PromptRegistry",
     "AIStrategyEngine",
     "CharacterInfo",
     "EnemyInfo",
@@ -3,20 +3,44 @@
 - 支持 OpenAI 兼容 API（如 OpenAI、DeepSeek、硅基流动、云厂商网关等）
 - 通过配置指定 provider、base_url、model、api_key 与系统提示词
 - 只在需要时调用，默认对项目其它模块零侵入
+- 请求经 resilience.ResilientCaller 发出：重试退避、熔断、对冲与备用端点（config.ai.resilience / fallbacks）
 """
 from __future__ import annotations
 
 import json
 import logging
+import time
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 try:
     import requests  # type: ignore
 except Exception:  # 在无 requests 环境下，延迟报错
     requests = None  # type: ignore
 
+from .resilience import Endpoint, ResilienceConfig, ResilientCaller
+from src.telemetry import metrics, tracing
+
+
+def cached_prompt_tokens(usage: Dict) -> int:
+    """从 usage 中读取命中提示词缓存的 token 数，兼容 OpenAI / DeepSeek / Anthropic 兼容网关的字段。"""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(
+        details.get("cached_tokens")
+        or usage.get("prompt_cache_hit_tokens")
+        or usage.get("cache_read_input_tokens")
+        or 0
+    )
+
+
+# 结构化输出的降级顺序；None 表示不发送 response_format
+RESPONSE_FORMAT_LEVELS = ("json_schema", "json_object", None)
+
+
+def _chat_url(base_url: str) -> str:
+    return f"{base_url.rstrip('/')}/chat/completions"
+
 
 class AIProviderType(str, Enum):
     OPENAI_COMPATIBLE = "openai_compatible"  # 通用 /v1/chat/completions 兼容
@@ -35,6 +59,19 @@ class AIConfig:
     # 仅 CUSTOM_HTTP 时可用
     endpoint: Optional[str] = None
     headers: Optional[Dict[str, str]] = None
+    # 结构化输出：json_schema（按调用类型的 schema）、json_object 或 none
+    response_format: Optional[str] = "json_schema"
+    # 各调用类型的 max_tokens，覆盖引擎默认值
+    max_tokens: Optional[Dict[str, int]] = None
+    # 重试/熔断/对冲参数，见 resilience.ResilienceConfig
+    resilience: Optional[Dict[str, Any]] = None
+    # 按顺序尝试的备用端点：[{name, base_url, model, api_key, timeout}]，缺省字段沿用主端点
+    fallbacks: Optional[List[Dict[str, Any]]] = None
+    # 命名模型档位、调用类型到档位的路由与升级档位，见 router.ModelRouter
+    profiles: Optional[Dict[str, Dict[str, Any]]] = None
+    routes: Optional[Dict[str, str]] = None
+    escalation: Optional[Dict[str, str]] = None
+    min_confidence: float = 0.5
 
 
 class AIClient:
@@ -45,47 +82,117 @@ class AIClient:
     def __init__(self, config: AIConfig):
         self.logger = logging.getLogger(__name__)
         self.config = config
+        # 最近一次请求的 usage 字段（prompt_tokens / completion_tokens 等），网关未返回时为空
+        self.last_usage: Dict[str, int] = {}
+        # 累计用量；cached_tokens 为命中服务商提示词缓存的输入 token
+        self.usage_stats: Dict[str, int] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        # 网关实际支持的结构化输出层级，首次被拒后降级并记住
+        level = (config.response_format or "none").lower()
+        self._format_level: Optional[str] = level if level in RESPONSE_FORMAT_LEVELS else None
+        self.resilience = ResilientCaller(self._build_endpoints(), ResilienceConfig.from_dict(config.resilience))
+        # 可选的会话录制器（storage.session.SessionRecorder），记录每次请求与响应
+        self.recorder = None
 
     def is_available(self) -> bool:
         return bool(self.config.enabled and self.config.api_key)
 
+    def _build_endpoints(self) -> List[Endpoint]:
+        cfg = self.config
+        if cfg.provider == AIProviderType.CUSTOM_HTTP:
+            return [Endpoint("primary", cfg.endpoint or "", cfg.model, cfg.api_key, cfg.timeout)]
+        endpoints = [Endpoint("primary", _chat_url(cfg.base_url), cfg.model, cfg.api_key, cfg.timeout)]
+        # 备用端点只用于 OpenAI 兼容协议
+        for i, fb in enumerate(cfg.fallbacks or []):
+            endpoints.append(Endpoint(
+                name=fb.get("name") or f"fallback{i + 1}",
+                url=_chat_url(fb.get("base_url") or cfg.base_url),
+                model=fb.get("model") or cfg.model,
+                api_key=fb.get("api_key", cfg.api_key),
+                timeout=fb.get("timeout") or cfg.timeout,
+            ))
+        return endpoints
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        return {"metrics": dict(self.resilience.metrics), "endpoints": self.resilience.endpoint_stats()}
+
     def _ensure_requests(self):
         if requests is None:
             raise RuntimeError("缺少 requests 依赖，请先安装: pip install requests")
 
-    def chat(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
-             temperature: float = 0.2, max_tokens: Optional[int] = None) -> str:
-        """与大模型对话，返回 assistant 文本。
-        messages: [{role, content}]，支持 system/assistant/user
-        """
-        if not self.is_available():
-            self.logger.warning("AI 未启用或未配置，返回占位文本")
-            return "[AI 未启用：无法生成计划，请在 config.json 配置 ai 字段]"
+    def _record_usage(self, j: Dict, call_type: Optional[str] = None):
+        usage = j.get("usage") or {}
+        self.last_usage = usage
+        cached = cached_prompt_tokens(usage)
+        metrics.record_usage(self.config.model, call_type, usage, cached)
+        self.usage_stats["calls"] += 1
+        self.usage_stats["prompt_tokens"] += int(usage.get("prompt_tokens") or 0)
+        self.usage_stats["completion_tokens"] += int(usage.get("completion_tokens") or 0)
+        self.usage_stats["cached_tokens"] += cached
+        if usage:
+            self.logger.debug(f"用量：输入 {usage.get('prompt_tokens')}（缓存命中 {cached}），输出 {usage.get('completion_tokens')}")
 
-        self._ensure_requests()
-        sys_prompt = system_prompt or self.config.system_prompt
-        payload_msgs: List[Dict[str, str]] = []
-        if sys_prompt:
-            payload_msgs.append({"role": "system", "content": sys_prompt})
-        payload_msgs.extend(messages)
+    def cache_hit_ratio(self) -> Optional[float]:
+        """累计输入 token 中命中提示词缓存的比例；没有用量数据时返回 None。"""
+        total = self.usage_stats["prompt_tokens"]
+        return self.usage_stats["cached_tokens"] / total if total else None
+
+    def _response_format_payload(self, response_format: Optional[Dict], level: Optional[str]) -> Optional[Dict]:
+        """按降级层级生成 response_format 字段：json_schema 原样发送，json_object 只要求输出 JSON 对象。"""
+        if not response_format or level is None:
+            return None
+        if level == "json_object" or response_format.get("type") == "json_object":
+            return {"type": "json_object"}
+        return response_format
 
+    def _post(self, url: str, headers: Dict[str, str], data: Dict[str, object], timeout: float) -> Dict:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        metrics.UPLOAD_BYTES.inc(len(body))
+        with tracing.span("http.post", "net", model=data.get("model"), bytes=len(body)) as s:
+            resp = requests.post(url, headers={"Content-Type": "application/json", **headers}, data=body,
+                                 timeout=timeout)
+            s.set(status=resp.status_code)
+            resp.raise_for_status()
+            return resp.json()
+
+    def _post_openai(self, ep: Endpoint, data: Dict[str, object]) -> Dict:
+        headers = {
+            "Authorization": f"Bearer {ep.api_key}",
+            "Content-Type": "application/json",
+        }
+        return self._post(ep.url, headers, {**data, "model": ep.model}, ep.timeout)
+
+    def _send(self, payload_msgs: List[Dict[str, object]], temperature: float, max_tokens: Optional[int],
+              response_format: Optional[Dict], call_type: Optional[str] = None) -> str:
+        key = call_type or "default"
         if self.config.provider == AIProviderType.OPENAI_COMPATIBLE:
-            url = f"{self.config.base_url.rstrip('/')}/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json",
-            }
-            data = {
-                "model": self.config.model,
+            data: Dict[str, object] = {
                 "messages": payload_msgs,
                 "temperature": temperature,
             }
             if max_tokens is not None:
                 data["max_tokens"] = max_tokens
 
-            resp = requests.post(url, headers=headers, json=data, timeout=self.config.timeout)
-            resp.raise_for_status()
-            j = resp.json()
+            # 网关不支持结构化输出时（400/422）依次降级为 json_object、不带 response_format，并记住结果
+            start = RESPONSE_FORMAT_LEVELS.index(self._format_level) if response_format else len(RESPONSE_FORMAT_LEVELS) - 1
+            levels = RESPONSE_FORMAT_LEVELS[start:]
+            for i, level in enumerate(levels):
+                fmt = self._response_format_payload(response_format, level)
+                if fmt is not None:
+                    data["response_format"] = fmt
+                else:
+                    data.pop("response_format", None)
+                try:
+                    j = self.resilience.call(lambda ep: self._post_openai(ep, data), key)
+                except Exception as e:
+                    status = getattr(getattr(e, "response", None), "status_code", None)
+                    if fmt is None or status not in (400, 422) or i == len(levels) - 1:
+                        raise
+                    self.logger.info(f"网关不支持 response_format={fmt.get('type')}（HTTP {status}），降级重试")
+                    continue
+                if response_format and level != self._format_level:
+                    self._format_level = level
+                break
+            self._record_usage(j, call_type)
             # OpenAI 格式
             content = j.get("choices", [{}])[0].get("message", {}).get("content")
             if not content:
@@ -104,9 +211,8 @@ class AIClient:
                 "messages": payload_msgs,
                 "temperature": temperature,
             }
-            resp = requests.post(self.config.endpoint, headers=headers, json=data, timeout=self.config.timeout)
-            resp.raise_for_status()
-            j = resp.json()
+            j = self.resilience.call(lambda ep: self._post(ep.url, headers, data, ep.timeout), key)
+            self._record_usage(j, call_type)
             # 尝试兼容 OpenAI 格式
             return (
                 j.get("choices", [{}])[0].get("message", {}).get("content")
@@ -118,8 +224,50 @@ class AIClient:
         else:
             raise NotImplementedError(f"不支持的 provider: {self.config.provider}")
 
+    def _request(self, payload_msgs: List[Dict[str, object]], temperature: float, max_tokens: Optional[int],
+                 response_format: Optional[Dict], call_type: Optional[str]) -> str:
+        start = time.perf_counter()
+        try:
+            content = self._send(payload_msgs, temperature, max_tokens, response_format, call_type)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(call_type=call_type or "default")
+            if self.recorder is not None:
+                self.recorder.record_llm(call_type, self.config.model, payload_msgs, None,
+                                         (time.perf_counter() - start) * 1000.0, error=str(e))
+            raise
+        elapsed = time.perf_counter() - start
+        metrics.LLM_LATENCY.observe(elapsed, call_type=call_type or "default")
+        if self.recorder is not None:
+            self.recorder.record_llm(call_type, self.config.model, payload_msgs, content,
+                                     elapsed * 1000.0, self.last_usage)
+        return content
+
+    @tracing.traced(cat="ai")
+    def chat(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+             temperature: float = 0.2, max_tokens: Optional[int] = None,
+             response_format: Optional[Dict] = None, call_type: Optional[str] = None) -> str:
+        """与大模型对话，返回 assistant 文本。
+        messages: [{role, content}]，支持 system/assistant/user
+        response_format: OpenAI 格式的结构化输出要求（json_schema 或 json_object），网关不支持时自动降级
+        call_type: 调用类型（见 prompts），用于分组统计延迟与对冲截止时间
+        """
+        if not self.is_available():
+            self.logger.warning("AI 未启用或未配置，返回占位文本")
+            return "[AI 未启用：无法生成计划，请在 config.json 配置 ai 字段]"
+
+        self._ensure_requests()
+        self.last_usage = {}
+        sys_prompt = system_prompt or self.config.system_prompt
+        payload_msgs: List[Dict[str, object]] = []
+        if sys_prompt:
+            payload_msgs.append({"role": "system", "content": sys_prompt})
+        payload_msgs.extend(messages)
+        return self._request(payload_msgs, temperature, max_tokens, response_format, call_type)
+
+    @tracing.traced(cat="ai")
     def chat_vision(self, images_b64: List[str], user_prompt: str, system_prompt: Optional[str] = None,
-                    temperature: float = 0.2, max_tokens: Optional[int] = None) -> str:
+                    temperature: float = 0.2, max_tokens: Optional[int] = None,
+                    response_format: Optional[Dict] = None, call_type: Optional[str] = None) -> str:
         """多模态对话：发送一条包含文本+图片的 user 消息。
         images_b64: PNG/JPEG 的 base64 字符串（不带 data: 前缀）
         """
@@ -127,6 +275,7 @@ class AIClient:
             self.logger.warning("AI 未启用或未配置，返回占位文本")
             return "[AI 未启用：无法生成计划，请在 config.json 配置 ai 字段]"
         self._ensure_requests()
+        self.last_usage = {}
         sys_prompt = system_prompt or self.config.system_prompt
         content_parts: List[Dict[str, object]] = []
         content_parts.append({"type": "text", "text": user_prompt})
@@ -139,50 +288,7 @@ class AIClient:
         if sys_prompt:
             payload_msgs.append({"role": "system", "content": sys_prompt})
         payload_msgs.append({"role": "user", "content": content_parts})
-
-        if self.config.provider == AIProviderType.OPENAI_COMPATIBLE:
-            url = f"{self.config.base_url.rstrip('/')}/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json",
-            }
-            data: Dict[str, object] = {
-                "model": self.config.model,
-                "messages": payload_msgs,
-                "temperature": temperature,
-            }
-            if max_tokens is not None:
-                data["max_tokens"] = max_tokens
-            resp = requests.post(url, headers=headers, json=data, timeout=self.config.timeout)
-            resp.raise_for_status()
-            j = resp.json()
-            content = j.get("choices", [{}])[0].get("message", {}).get("content")
-            if not content:
-                content = j.get("choices", [{}])[0].get("text")
-            return content or "[AI 响应为空]"
-
-        elif self.config.provider == AIProviderType.CUSTOM_HTTP:
-            if not self.config.endpoint:
-                raise ValueError("自定义 HTTP 模式需要提供 endpoint")
-            headers = self.config.headers or {}
-            if self.config.api_key:
-                headers.setdefault("Authorization", f"Bearer {self.config.api_key}")
-            data = {
-                "model": self.config.model,
-                "messages": payload_msgs,
-                "temperature": temperature,
-            }
-            resp = requests.post(self.config.endpoint, headers=headers, json=data, timeout=self.config.timeout)
-            resp.raise_for_status()
-            j = resp.json()
-            return (
-                j.get("choices", [{}])[0].get("message", {}).get("content")
-                or j.get("choices", [{}])[0].get("text")
-                or j.get("data")
-                or json.dumps(j, ensure_ascii=False)
-            )
-        else:
-            raise NotImplementedError(f"不支持的 provider: {self.config.provider}")
+        return self._request(payload_msgs, temperature, max_tokens, response_format, call_type)
 
     def summarize_to_plan(self, context: Dict) -> str:
         """给定上下文，生成策略规划文本（由模型输出）。
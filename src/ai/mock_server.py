@@ -0,0 +1,476 @@
+"""
+本地 OpenAI 兼容模拟服务
+- 在后台线程运行 http.server，实现 POST /chat/completions（同时接受 /v1/chat/completions）与 GET /models，
+  支持 stream=true 的 SSE 流式输出（stream_options.include_usage 时在末尾附带 usage）
+- 按 response_format 的 schema 名或 system 提示词识别调用类型（见 prompts），返回：
+  1. 脚本化响应：responses={调用类型: [文本或对象, ...]}，按顺序循环
+  2. 录制的响应：JSONL 文件，每行 {"call_type": ..., "content": ...}
+  3. 以上都没有时返回内置的、符合 response_parser.SCHEMAS 的样例
+- MockBehavior 控制延迟（对数正态分布）、HTTP 错误率、挂起（超时）率与非 JSON 响应率，seed 固定时可复现
+- usage 按字符数估算 token；同一 system 提示词第二次出现起计为提示词缓存命中
+- run_pipeline：无需游戏窗口与 API Key，对模拟服务跑一遍 扫描 → 规划 → 战斗决策 并汇总各阶段延迟
+
+python -m src.ai.mock_server --port 8000                  # 只启动服务
+python -m src.ai.mock_server --load --battles 20 --workers 4 --error 429=0.05 --latency-ms 80
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Union
+
+from src.game_control.controller import NullController
+from src.storage.memory import InMemoryStore
+
+from .prompts import BATTLE_DECISION, GENERATE_STRATEGY, SCAN_CHARACTER, SCAN_ENEMY, TEMPLATES
+from .response_parser import ACTION_TYPES
+
+logger = logging.getLogger(__name__)
+
+# 1x1 PNG，供无界面压测时代替截图
+BLANK_PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+# 流式输出每个分片的字符数
+STREAM_CHUNK_CHARS = 16
+
+
+@dataclass
+class MockBehavior:
+    latency_ms: float = 50.0  # 中位延迟
+    latency_sigma: float = 0.0  # 对数正态分布的 sigma，0 为固定延迟
+    stream_chunk_ms: float = 5.0  # 流式输出分片间隔
+    error_rates: Dict[int, float] = field(default_factory=dict)  # HTTP 状态码 -> 概率
+    timeout_rate: float = 0.0  # 挂起 hang_seconds 后断开连接，不返回响应
+    hang_seconds: float = 30.0
+    malformed_rate: float = 0.0  # 返回无法解析的文本
+    seed: Optional[int] = None
+
+
+def _canned(call_type: Optional[str], rng: random.Random) -> Dict[str, Any]:
+    if call_type == BATTLE_DECISION:
+        action = rng.choice(ACTION_TYPES)
+        return {
+            "action_type": action,
+            "character_index": rng.randint(1, 4) if action == "ultimate" else None,
+            "target_direction": {"switch_target_left": "left", "switch_target_right": "right"}.get(action),
+            "reasoning": "模拟决策",
+            "confidence": round(rng.uniform(0.3, 1.0), 2),
+        }
+    if call_type == SCAN_CHARACTER:
+        return {
+            "stats": {"atk": 2400, "hp": 4200, "def": 900, "spd": rng.choice([101, 115, 134, 160]),
+                      "crit_rate": 0.6, "crit_dmg": 1.4, "break_effect": 0.3, "energy_regen": 1.0,
+                      "effect_hit": 0.2, "effect_res": 0.1},
+            "skills": [{"name": f"模拟技能{i}", "type": t, "brief_description": "模拟", "detailed_description": "模拟",
+                        "energy_cost": 120 if t == "ultimate" else None, "cooldown": None, "effects": []}
+                       for i, t in enumerate(("basic", "skill", "ultimate", "talent"), 1)],
+        }
+    if call_type == SCAN_ENEMY:
+        return {
+            "level": 90,
+            "stats": {"hp": 600000, "def": 1100, "spd": 132, "toughness": 300},
+            "weaknesses": rng.sample(["Physical", "Fire", "Ice", "Lightning", "Wind", "Quantum", "Imaginary"], 3),
+            "resistances": {"Fire": 0.2},
+            "buffs": [],
+        }
+    if call_type == GENERATE_STRATEGY:
+        steps = [{"round": r, "actions": [{"character": "模拟角色", "action": "战技E", "target": "中间", "reasoning": "模拟"}]}
+                 for r in range(1, 4)]
+        plan = {"name": "稳定方案", "description": "模拟", "expected_rounds": 3, "steps": steps}
+        return {"analysis": {"key_points": []}, "plan_a": plan,
+                "plan_b": {**plan, "name": "极限方案", "requires_reroll": False}, "recommendation": "A"}
+    return {"message": "mock"}
+
+
+def detect_call_type(body: Dict[str, Any]) -> Optional[str]:
+    """优先用 response_format 的 schema 名，否则比对 system 提示词的首行。"""
+    schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name")
+    if schema_name in TEMPLATES:
+        return schema_name
+    system = next((m.get("content") for m in body.get("messages") or []
+                   if m.get("role") == "system" and isinstance(m.get("content"), str)), "")
+    for name, tpl in TEMPLATES.items():
+        if tpl.system.strip().splitlines()[0] in system:
+            return name
+    return None
+
+
+def load_responses(path: str) -> Dict[str, List[str]]:
+    """读取录制的响应：JSONL，每行 {"call_type", "content"}。"""
+    responses: Dict[str, List[str]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            responses.setdefault(rec.get("call_type") or "default", []).append(rec["content"])
+    return responses
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("mock: " + fmt % args)
+
+    def _send_json(self, status: int, obj: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        blob = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(blob)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(blob)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            mock = self.server.mock
+            self._send_json(200, {"object": "list", "data": [{"id": mock.model, "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json", "type": "invalid_request_error"}})
+            return
+        self.server.mock._handle(self, body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    mock: "MockOpenAIServer"
+
+
+class MockOpenAIServer:
+    """OpenAI 兼容的本地模拟服务，可作为上下文管理器使用。"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 responses: Optional[Dict[str, List[Union[str, Dict[str, Any]]]]] = None,
+                 behavior: Optional[MockBehavior] = None, model: str = "mock-model"):
+        self.host = host
+        self.port = port
+        self.responses = responses or {}
+        self.behavior = behavior or MockBehavior()
+        self.model = model
+        self.stats: Dict[str, Any] = {"requests": 0, "streamed": 0, "by_call_type": {}, "by_status": {}}
+        self._rng = random.Random(self.behavior.seed)
+        self._cursor: Dict[str, int] = {}
+        self._seen_prefixes: set = set()
+        self._lock = threading.Lock()
+        self._httpd: Optional[_Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self) -> "MockOpenAIServer":
+        self._httpd = _Server((self.host, self.port), _Handler)
+        self._httpd.mock = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        logger.info(f"模拟服务已启动：{self.base_url}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- 请求处理（服务线程） ----
+    def _count(self, call_type: Optional[str], status: Any):
+        with self._lock:
+            self.stats["requests"] += 1
+            by_type = self.stats["by_call_type"]
+            by_type[call_type or "unknown"] = by_type.get(call_type or "unknown", 0) + 1
+            self.stats["by_status"][str(status)] = self.stats["by_status"].get(str(status), 0) + 1
+
+    def _draw(self) -> Dict[str, Any]:
+        """一次性抽取本次请求的延迟与故障，保证 seed 固定时可复现。"""
+        b = self.behavior
+        with self._lock:
+            latency = b.latency_ms * math.exp(b.latency_sigma * self._rng.gauss(0, 1)) if b.latency_sigma else b.latency_ms
+            roll = self._rng.random()
+            status = 200
+            for code, rate in sorted(b.error_rates.items()):
+                if roll < rate:
+                    status = int(code)
+                    break
+                roll -= rate
+            hang = status == 200 and self._rng.random() < b.timeout_rate
+            malformed = status == 200 and self._rng.random() < b.malformed_rate
+            seed = self._rng.random()
+        return {"latency": latency / 1000.0, "status": status, "hang": hang, "malformed": malformed, "seed": seed}
+
+    def _content(self, call_type: Optional[str], seed: float) -> str:
+        with self._lock:
+            scripted = self.responses.get(call_type or "default") or self.responses.get("default")
+            if scripted:
+                i = self._cursor.get(call_type or "default", 0)
+                self._cursor[call_type or "default"] = i + 1
+                item = scripted[i % len(scripted)]
+                return item if isinstance(item, str) else json.dumps(item, ensure_ascii=False)
+        return json.dumps(_canned(call_type, random.Random(seed)), ensure_ascii=False)
+
+    def _usage(self, body: Dict[str, Any], content: str) -> Dict[str, Any]:
+        messages = body.get("messages") or []
+        prompt_text = json.dumps(messages, ensure_ascii=False)
+        system = next((m.get("content") for m in messages if m.get("role") == "system"), None)
+        cached = 0
+        if isinstance(system, str):
+            key = hashlib.sha256(system.encode("utf-8")).digest()
+            with self._lock:
+                if key in self._seen_prefixes:
+                    cached = _estimate_tokens(system)
+                else:
+                    self._seen_prefixes.add(key)
+        prompt_tokens = _estimate_tokens(prompt_text)
+        completion_tokens = _estimate_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": min(cached, prompt_tokens)},
+        }
+
+    def _handle(self, h: _Handler, body: Dict[str, Any]):
+        call_type = detect_call_type(body)
+        draw = self._draw()
+        time.sleep(draw["latency"])
+        if draw["hang"]:
+            self._count(call_type, "hang")
+            time.sleep(self.behavior.hang_seconds)
+            h.close_connection = True
+            return
+        if draw["status"] != 200:
+            self._count(call_type, draw["status"])
+            headers = {"Retry-After": "1"} if draw["status"] == 429 else None
+            h._send_json(draw["status"], {"error": {"message": f"mock error {draw['status']}", "type": "mock_error"}},
+                         headers)
+            return
+
+        content = "抱歉，我无法给出 JSON。" if draw["malformed"] else self._content(call_type, draw["seed"])
+        usage = self._usage(body, content)
+        model = body.get("model") or self.model
+        rid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        self._count(call_type, 200)
+        if body.get("stream"):
+            self._stream(h, rid, model, content, usage if (body.get("stream_options") or {}).get("include_usage") else None)
+            return
+        h._send_json(200, {
+            "id": rid,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, h: _Handler, rid: str, model: str, content: str, usage: Optional[Dict[str, Any]]):
+        with self._lock:
+            self.stats["streamed"] += 1
+        h.send_response(200)
+        h.send_header("Content-Type", "text/event-stream")
+        h.send_header("Cache-Control", "no-cache")
+        h.send_header("Connection", "close")
+        h.end_headers()
+        h.close_connection = True
+        created = int(time.time())
+
+        def event(delta: Dict[str, Any], finish: Optional[str] = None, extra: Optional[Dict[str, Any]] = None):
+            chunk = {"id": rid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            if extra:
+                chunk.update(extra)
+            h.wfile.write(b"data: " + json.dumps(chunk, ensure_ascii=False).encode("utf-8") + b"\n\n")
+            h.wfile.flush()
+
+        try:
+            event({"role": "assistant"})
+            for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                time.sleep(self.behavior.stream_chunk_ms / 1000.0)
+                event({"content": content[i:i + STREAM_CHUNK_CHARS]})
+            event({}, "stop", {"usage": usage} if usage else None)
+            h.wfile.write(b"data: [DONE]\n\n")
+            h.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+# ---- 无界面压测 ----
+def _percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"n": 0, "p50_ms": None, "p95_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)  # noqa: E731
+    return {"n": len(ordered), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": round(ordered[-1] * 1000, 1)}
+
+
+def run_pipeline(base_url: str, battles: int = 10, turns: int = 8, workers: int = 1,
+                 characters: int = 4, timeout: int = 10, ai_overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    对 base_url 跑完整流程：扫描 characters 个角色与 1 个敌人 → 生成策略 → battles 场 × turns 回合决策。
+    workers > 1 时各线程使用独立的引擎并发执行战斗阶段。返回各阶段延迟与兜底次数。
+    """
+    from .client import AIClient, AIConfig
+    from .strategy_engine import AIStrategyEngine
+
+    class _HeadlessEngine(AIStrategyEngine):
+        def screenshot_to_base64(self, region=None) -> str:
+            return BLANK_PNG_B64
+
+    def make_engine() -> _HeadlessEngine:
+        cfg = AIConfig(enabled=True, api_key="mock", base_url=base_url, timeout=timeout, **(ai_overrides or {}))
+        eng = _HeadlessEngine(AIClient(cfg), NullController(), memory, logger=logger)
+        with lock:
+            engines.append(eng)
+        return eng
+
+    memory = InMemoryStore()
+    timings: Dict[str, List[float]] = {SCAN_CHARACTER: [], SCAN_ENEMY: [], GENERATE_STRATEGY: [], BATTLE_DECISION: []}
+    errors: Dict[str, int] = {k: 0 for k in timings}
+    lock = threading.Lock()
+    engines: List[Any] = []
+
+    def timed(stage: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        except Exception as e:
+            with lock:
+                errors[stage] += 1
+            logger.warning(f"{stage} 失败：{e}")
+        finally:
+            with lock:
+                timings[stage].append(time.perf_counter() - start)
+
+    wall = time.perf_counter()
+    engine = make_engine()
+    regions = {"skill_buttons": []}
+    for i in range(characters):
+        info = timed(SCAN_CHARACTER, engine.scan_character_with_ai, f"角色{i + 1}", "Quantum", "Hunt", regions)
+        if info is not None:
+            engine.characters.append(info)
+    enemy = timed(SCAN_ENEMY, engine.scan_enemy_with_ai, "模拟敌人", {})
+    if enemy is not None:
+        engine.enemies.append(enemy)
+    timed(GENERATE_STRATEGY, engine.generate_strategy, "material_farm", {"allow_reroll": False})
+
+    fallbacks = [0]
+
+    def battle_worker(n: int):
+        eng = engine if workers <= 1 else make_engine()
+        for _ in range(n):
+            executed: List[Dict[str, Any]] = []
+            for rnd in range(1, turns + 1):
+                action = timed(BATTLE_DECISION, eng.make_battle_decision, rnd, executed)
+                if action is None:
+                    continue
+                if action.source == "fallback":
+                    with lock:
+                        fallbacks[0] += 1
+                executed.append({"round": rnd, "action_type": action.action_type})
+
+    per_worker = [battles // workers + (1 if i < battles % workers else 0) for i in range(max(1, workers))]
+    battle_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(battle_worker, per_worker))
+    battle_elapsed = time.perf_counter() - battle_start
+
+    decisions = len(timings[BATTLE_DECISION])
+    resilience: Dict[str, int] = {}
+    for eng in engines:
+        for k, v in eng.ai.resilience_stats()["metrics"].items():
+            resilience[k] = resilience.get(k, 0) + v
+    return {
+        "stages": {k: _percentiles(v) for k, v in timings.items()},
+        "errors": errors,
+        "fallback_decisions": fallbacks[0],
+        "decisions_per_sec": round(decisions / battle_elapsed, 2) if battle_elapsed > 0 else None,
+        "wall_s": round(time.perf_counter() - wall, 3),
+        "resilience": resilience,
+    }
+
+
+def _parse_errors(items: List[str]) -> Dict[int, float]:
+    rates = {}
+    for item in items:
+        code, _, rate = item.partition("=")
+        rates[int(code)] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务 / 无界面压测")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="--load 时忽略，使用随机端口")
+    parser.add_argument("--responses", default=None, help="录制的响应 JSONL（{call_type, content}）")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="对数正态分布的 sigma")
+    parser.add_argument("--error", action="append", default=[], metavar="STATUS=RATE", help="如 429=0.05，可重复")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--load", action="store_true", help="启动服务并跑一遍 扫描 → 规划 → 战斗 压测后退出")
+    parser.add_argument("--battles", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--client-timeout", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    behavior = MockBehavior(
+        latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, error_rates=_parse_errors(args.error),
+        timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds, malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    )
+    responses = load_responses(args.responses) if args.responses else None
+    server = MockOpenAIServer(args.host, 0 if args.load else args.port, responses=responses, behavior=behavior)
+    server.start()
+    try:
+        if args.load:
+            report = run_pipeline(server.base_url, args.battles, args.turns, args.workers, timeout=args.client_timeout)
+            report["server"] = server.stats
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+提示词注册表
+- 每个调用类型的提示词拆为两部分：
+  * system：固定的说明、规则与输出格式，启动时编译一次，之后每次请求逐字节相同
+  * suffix：只含本次调用的动态数据（角色名、回合数、已执行动作等）的短模板
+- 服务商的提示词缓存按请求前缀匹配，固定部分放在最前面才能命中缓存；
+  命中情况见 AIClient.usage_stats / cached_prompt_tokens
+- 动态数据统一用紧凑 JSON（无缩进）序列化，减少 token
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import string
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+SCAN_CHARACTER = "scan_character"
+SCAN_ENEMY = "scan_enemy"
+GENERATE_STRATEGY = "generate_strategy"
+BATTLE_DECISION = "battle_decision"
+
+# 各调用类型默认的 max_tokens；战斗决策只需一个小 JSON 对象，限制输出长度可直接缩短延迟
+DEFAULT_MAX_TOKENS: Dict[str, int] = {
+    SCAN_CHARACTER: 2048,
+    SCAN_ENEMY: 512,
+    GENERATE_STRATEGY: 4096,
+    BATTLE_DECISION: 256,
+}
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    system: str  # 固定部分，不参与格式化
+    suffix: str  # 动态部分，str.format 模板
+
+
+@dataclass
+class CompiledPrompt:
+    name: str
+    system: str
+    suffix: str
+    fields: Tuple[str, ...]
+    prefix_hash: str  # system 的摘要，用于确认前缀逐字节稳定
+    renders: int = field(default=0)
+
+    def render(self, **values: Any) -> str:
+        missing = [f for f in self.fields if f not in values]
+        if missing:
+            raise ValueError(f"提示词 {self.name} 缺少字段: {', '.join(missing)}")
+        self.renders += 1
+        return self.suffix.format(**values)
+
+
+_SCAN_CHARACTER_SYSTEM = """你是《崩坏：星穹铁道》的角色信息识别助手。
+
+我会提供以下截图：
+1. 角色属性面板（包含攻击、生命、防御、速度、暴击等所有数值）
+2. 每个技能的粗略描述和详细描述
+
+请提取以下信息并以JSON格式输出：
+{
+    "stats": {
+        "atk": 数值,
+        "hp": 数值,
+        "def": 数值,
+        "spd": 数值,
+        "crit_rate": 数值（小数，如0.50表示50%）,
+        "crit_dmg": 数值（小数，如1.20表示120%）,
+        "break_effect": 数值,
+        "energy_regen": 数值,
+        "effect_hit": 数值,
+        "effect_res": 数值
+    },
+    "skills": [
+        {
+            "name": "技能名称",
+            "type": "basic/skill/ultimate/talent/technique",
+            "brief_description": "简短描述",
+            "detailed_description": "详细描述（包含所有数值、倍率、效果）",
+            "energy_cost": 能量消耗（如果是大招）,
+            "cooldown": 冷却时间（如果有）,
+            "effects": ["效果1", "效果2", ...]
+        }
+    ]
+}
+
+注意：
+1. 仔细阅读所有数值，包括百分比
+2. 技能描述要完整，包括所有倍率和特殊效果
+3. 不要遗漏任何重要信息
+4. 如果某些信息不确定，可以标注为null
+"""
+
+_SCAN_ENEMY_SYSTEM = """你是《崩坏：星穹铁道》的敌人信息识别助手。
+
+请提取截图中敌人的以下信息并以JSON格式输出：
+{
+    "level": 等级,
+    "stats": {
+        "hp": 生命值,
+        "def": 防御力,
+        "spd": 速度,
+        "toughness": 韧性值
+    },
+    "weaknesses": ["弱点元素1", "弱点元素2", ...],
+    "resistances": {"元素": 抗性值（小数）},
+    "buffs": ["增益/机制描述1", "增益/机制描述2", ...]
+}
+
+注意：
+1. 弱点元素包括：Physical, Fire, Ice, Lightning, Wind, Quantum, Imaginary
+2. 抗性为负数表示易伤，正数表示抗性
+3. buffs包括特殊机制、环境增益等
+"""
+
+_GENERATE_STRATEGY_SYSTEM = """你是《崩坏：星穹铁道》的顶级战斗策略专家。
+
+请根据用户给出的战斗模式、偏好、角色队伍与敌人信息，制定最优战斗策略。注意：
+
+1. **深入分析**：
+   - 计算每个角色的实际伤害（考虑属性、暴击、增伤等）
+   - 分析速度轮次，确定行动顺序
+   - 考虑弱点击破、能量恢复、buff/debuff时机
+   - 评估敌人的威胁和最优击杀顺序
+
+2. **按键说明**：
+   - 1-4：释放对应位置角色的大招（终结技）
+   - Q：普通攻击
+   - E：战技
+   - 左右方向键或鼠标点击：选择目标
+   - 注意：每个角色的战技效果不同，不要固化思维！有的是增益，有的是攻击，有的是控制
+
+3. **制定方案**：
+   请提供至少2个方案供玩家选择：
+
+   **方案A（稳定）**：
+   - 不依赖凹本，追求稳定通关
+   - 详细步骤：第X回合，角色Y使用Z技能，目标W
+   - 预计回合数
+
+   **方案B（极限）**：
+   - 追求最少回合数，可以包含凹本操作
+   - 如果允许凹本，说明凹点条件：
+     * 需要哪个角色被攻击
+     * 什么时候被攻击（第几回合，敌人哪个技能）
+     * 目的是什么（回能、触发反击等）
+     * 如果不满足条件，是否重开
+   - 详细步骤
+   - 预计回合数
+
+4. **输出格式**（JSON）：
+{
+    "analysis": {
+        "damage_calculation": "伤害计算详情",
+        "turn_order": "行动顺序分析",
+        "synergy": "队伍协同分析",
+        "key_points": ["关键点1", "关键点2", ...]
+    },
+    "plan_a": {
+        "name": "稳定方案",
+        "description": "方案描述",
+        "expected_rounds": 预计回合数,
+        "steps": [
+            {
+                "round": 1,
+                "actions": [
+                    {
+                        "character": "角色名",
+                        "action": "释放大招1" 或 "普攻Q" 或 "战技E",
+                        "target": "目标描述" 或 "切换目标（左/右）",
+                        "reasoning": "理由"
+                    }
+                ]
+            }
+        ]
+    },
+    "plan_b": {
+        "name": "极限方案",
+        "description": "方案描述",
+        "expected_rounds": 预计回合数,
+        "requires_reroll": true/false,
+        "reroll_condition": {
+            "target_character": "被攻击角色",
+            "trigger_timing": "触发时机",
+            "purpose": "目的",
+            "max_retries": 最大重试次数
+        },
+        "steps": [...]
+    },
+    "recommendation": "推荐方案A还是B，以及理由"
+}
+"""
+
+_BATTLE_DECISION_SYSTEM = """你是《崩坏：星穹铁道》的实时战斗决策助手。
+
+用户会给出原定策略、当前回合数、已执行动作以及当前战斗画面。请查看画面，分析：
+1. 当前轮到谁行动
+2. 各角色和敌人的状态（生命、能量、buff/debuff）
+3. 是否需要调整策略
+
+然后决定下一步动作，输出JSON格式：
+{
+    "action_type": "ultimate" | "skill" | "basic_attack" | "switch_target_left" | "switch_target_right" | "wait",
+    "character_index": 1-4（如果是大招）,
+    "target_direction": "left" | "right"（如果是切换目标）,
+    "reasoning": "决策理由",
+    "confidence": 0-1 之间的小数（对该决策的把握程度）
+}
+"""
+
+TEMPLATES: Dict[str, PromptTemplate] = {
+    SCAN_CHARACTER: PromptTemplate(
+        SCAN_CHARACTER,
+        _SCAN_CHARACTER_SYSTEM,
+        '请分析角色"{name}"的信息。\n- 名称：{name}\n- 元素：{element}\n- 命途：{path}',
+    ),
+    SCAN_ENEMY: PromptTemplate(
+        SCAN_ENEMY,
+        _SCAN_ENEMY_SYSTEM,
+        '请分析敌人"{name}"的信息。',
+    ),
+    GENERATE_STRATEGY: PromptTemplate(
+        GENERATE_STRATEGY,
+        _GENERATE_STRATEGY_SYSTEM,
+        "战斗模式：{mode}\n用户偏好：{preference}\n\n角色队伍：\n{characters}\n\n敌人信息：\n{enemies}",
+    ),
+    # 原定策略在同一场战斗中不变，放在回合信息之前以延长可缓存前缀
+    BATTLE_DECISION: PromptTemplate(
+        BATTLE_DECISION,
+        _BATTLE_DECISION_SYSTEM,
+        "原定策略：{plan}\n回合数：{round}\n已执行动作：{actions}",
+    ),
+}
+
+
+class PromptRegistry:
+    """启动时编译全部模板；base_system（config.ai.system_prompt）拼在每个 system 之前。"""
+
+    def __init__(self, base_system: Optional[str] = None, templates: Optional[Dict[str, PromptTemplate]] = None):
+        self.base_system = base_system
+        self._compiled: Dict[str, CompiledPrompt] = {}
+        for name, tpl in (templates or TEMPLATES).items():
+            self._compiled[name] = self._compile(tpl)
+
+    def _compile(self, tpl: PromptTemplate) -> CompiledPrompt:
+        system = tpl.system.strip()
+        if self.base_system:
+            system = f"{self.base_system.strip()}\n\n{system}"
+        fields = tuple(dict.fromkeys(
+            fname for _, fname, _, _ in string.Formatter().parse(tpl.suffix) if fname
+        ))
+        return CompiledPrompt(
+            name=tpl.name,
+            system=system,
+            suffix=tpl.suffix,
+            fields=fields,
+            prefix_hash=hashlib.sha256(system.encode("utf-8")).hexdigest()[:12],
+        )
+
+    def get(self, name: str) -> CompiledPrompt:
+        try:
+            return self._compiled[name]
+        except KeyError:
+            raise ValueError(f"未注册的提示词: {name}") from None
+
+    def render(self, call_type: str, /, **values: Any) -> Tuple[str, str]:
+        """返回 (system, user 文本)。call_type 只能按位置传入，模板字段可以叫 name。"""
+        prompt = self.get(call_type)
+        return prompt.system, prompt.render(**values)
+
+    def names(self):
+        return list(self._compiled)
@@ -0,0 +1,313 @@
+"""
+AI 请求的容错层
+- 重试：超时、连接错误、429 与 5xx 按带全抖动（full jitter）的指数退避重试，429 的 Retry-After 优先
+- 熔断：同一端点连续失败 failure_threshold 次后熔断 reset_timeout 秒，期间直接跳过；
+  到期后放行一个探测请求（半开），成功即恢复
+- 对冲：端点的历史延迟样本足够时，请求超过其 p95 仍未返回就再发一个相同请求，取先返回的结果
+- 故障转移：按 config.ai.fallbacks 的顺序依次尝试备用端点/模型；所有端点均熔断时立即抛出 CircuitOpenError，
+  不再阻塞到超时
+- 400/422 属于请求本身的问题（例如网关不支持 response_format），不重试也不转移，直接交给调用方处理；
+  端点能正常作答，熔断器按成功计
+- 计数与各端点状态见 ResilientCaller.metrics / endpoint_stats()
+"""
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+try:
+    import requests  # type: ignore
+except Exception:  # 在无 requests 环境下，延迟报错
+    requests = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# 请求本身有误：换端点也不会成功
+NON_RETRYABLE_STATUS = (400, 422)
+# 端点相关的错误（密钥无效、模型不存在等）：不在同一端点重试，但可转移到备用端点
+FAILOVER_STATUS = (401, 403, 404)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """所有端点均处于熔断状态。"""
+
+
+@dataclass
+class ResilienceConfig:
+    max_attempts: int = 3  # 每个端点的最大尝试次数（含首次）
+    base_delay: float = 0.5  # 退避基数（秒），第 n 次重试的上限为 base_delay * 2**n
+    max_delay: float = 8.0
+    failure_threshold: int = 5  # 连续失败多少次后熔断
+    reset_timeout: float = 30.0  # 熔断持续时间（秒）
+    hedge: bool = True
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20  # 延迟样本少于该数时不对冲
+    hedge_min_delay: float = 1.0  # 对冲等待下限（秒），避免延迟极小时成倍放大请求量
+    latency_window: int = 200  # 每个端点/调用类型保留的最近延迟样本数
+
+    @classmethod
+    def from_dict(cls, d: Optional[Dict[str, Any]]) -> "ResilienceConfig":
+        """忽略未知字段，缺省项使用默认值。"""
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (d or {}).items() if k in known and v is not None})
+
+
+def status_of(exc: BaseException) -> Optional[int]:
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """超时、连接错误、429 与 5xx 可在同一端点重试。"""
+    status = status_of(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if requests is not None and isinstance(exc, requests.exceptions.RequestException):
+        return isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """读取 429/503 响应的 Retry-After（秒）；HTTP 日期格式不处理。"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, hint: Optional[float] = None) -> float:
+    """第 attempt 次重试（从 0 起）前的等待时间：[0, min(cap, base*2**attempt)] 内均匀分布。"""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if hint is not None:
+        delay = max(delay, min(hint, cap))
+    return delay
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器，线程安全。"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> bool:
+        """记录一次失败；本次导致熔断时返回 True。"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class LatencyTracker:
+    """最近 window 个延迟样本（秒），用于计算对冲截止时间。"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class Endpoint:
+    name: str
+    url: str
+    model: str
+    api_key: Optional[str] = None
+    timeout: float = 60
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    # 调用类型 -> 延迟统计；不同调用类型的输出长度相差很大，分开统计
+    latency: Dict[str, LatencyTracker] = field(default_factory=dict)
+    successes: int = 0
+    failures: int = 0
+
+
+class ResilientCaller:
+    """
+    对一组有序端点执行同一个请求。
+    send(endpoint) 负责真正发出请求并返回结果，失败时抛出异常（requests 的 HTTPError 等）。
+    """
+
+    def __init__(self, endpoints: List[Endpoint], config: Optional[ResilienceConfig] = None):
+        if not endpoints:
+            raise ValueError("至少需要一个端点")
+        self.endpoints = endpoints
+        self.config = config or ResilienceConfig()
+        for ep in endpoints:
+            ep.breaker.failure_threshold = self.config.failure_threshold
+            ep.breaker.reset_timeout = self.config.reset_timeout
+        self.metrics: Dict[str, int] = {
+            "requests": 0, "attempts": 0, "retries": 0, "failovers": 0, "failures": 0,
+            "hedged": 0, "hedge_wins": 0, "breaker_opened": 0, "breaker_rejected": 0,
+        }
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.metrics[key] += n
+
+    def _tracker(self, ep: Endpoint, key: str) -> LatencyTracker:
+        tracker = ep.latency.get(key)
+        if tracker is None:
+            tracker = ep.latency.setdefault(key, LatencyTracker(self.config.latency_window))
+        return tracker
+
+    def hedge_delay(self, ep: Endpoint, key: str) -> Optional[float]:
+        """对冲前的等待时间；未启用或样本不足时返回 None。"""
+        if not self.config.hedge:
+            return None
+        tracker = ep.latency.get(key)
+        if tracker is None or len(tracker) < self.config.hedge_min_samples:
+            return None
+        return max(self.config.hedge_min_delay, tracker.quantile(self.config.hedge_quantile) or 0.0)
+
+    def _timed(self, send: Callable[[Endpoint], Any], ep: Endpoint, key: str) -> Any:
+        self._count("attempts")
+        start = time.perf_counter()
+        result = send(ep)
+        self._tracker(ep, key).add(time.perf_counter() - start)
+        return result
+
+    def _attempt(self, send: Callable[[Endpoint], Any], ep: Endpoint, key: str) -> Any:
+        delay = self.hedge_delay(ep, key)
+        if delay is None:
+            return self._timed(send, ep, key)
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ai-hedge")
+        first = self._pool.submit(self._timed, send, ep, key)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        # 超过 p95 仍未返回：再发一次，取先成功的结果；落后的请求无法取消，会在后台自然结束
+        self._count("hedged")
+        second = self._pool.submit(self._timed, send, ep, key)
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if fut is second:
+                    self._count("hedge_wins")
+                return result
+        raise error  # type: ignore[misc]
+
+    def call(self, send: Callable[[Endpoint], Any], key: str = "default") -> Any:
+        """依次尝试各端点，返回第一个成功的结果。key 为延迟统计的分组（通常是调用类型）。"""
+        self._count("requests")
+        last_error: Optional[BaseException] = None
+        tried = 0
+        for ep in self.endpoints:
+            if not ep.breaker.allow():
+                self._count("breaker_rejected")
+                continue
+            if tried:
+                self._count("failovers")
+                logger.warning(f"切换到备用端点 {ep.name}（{ep.model}）")
+            tried += 1
+            for attempt in range(max(1, self.config.max_attempts)):
+                try:
+                    result = self._attempt(send, ep, key)
+                except Exception as e:
+                    last_error = e
+                    status = status_of(e)
+                    if status in NON_RETRYABLE_STATUS:
+                        # 端点正常作答，只是请求本身有误：对熔断器按成功处理，半开探测也随之结束
+                        ep.breaker.record_success()
+                        raise
+                    ep.failures += 1
+                    if ep.breaker.record_failure():
+                        self._count("breaker_opened")
+                        logger.warning(f"端点 {ep.name} 连续失败 {ep.breaker.failures} 次，熔断 {self.config.reset_timeout:g}s")
+                    if status in FAILOVER_STATUS or not is_retryable(e) or ep.breaker.state == OPEN:
+                        break
+                    if attempt + 1 < self.config.max_attempts:
+                        wait_s = backoff_delay(attempt, self.config.base_delay, self.config.max_delay, retry_after(e))
+                        logger.info(f"端点 {ep.name} 请求失败（{status or type(e).__name__}），{wait_s:.2f}s 后重试")
+                        self._count("retries")
+                        time.sleep(wait_s)
+                    continue
+                ep.successes += 1
+                ep.breaker.record_success()
+                return result
+        self._count("failures")
+        if last_error is None:
+            raise CircuitOpenError("所有 AI 端点均处于熔断状态")
+        raise last_error
+
+    def endpoint_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各端点的熔断状态、成功/失败次数与各调用类型的 p50/p95 延迟（毫秒）。"""
+        stats: Dict[str, Dict[str, Any]] = {}
+        for ep in self.endpoints:
+            latency = {}
+            for key, tracker in list(ep.latency.items()):
+                p50, p95 = tracker.quantile(0.5), tracker.quantile(0.95)
+                latency[key] = {
+                    "n": len(tracker),
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                }
+            stats[ep.name] = {
+                "model": ep.model,
+                "state": ep.breaker.state,
+                "successes": ep.successes,
+                "failures": ep.failures,
+                "latency": latency,
+            }
+        return stats
@@ -0,0 +1,328 @@
+"""
+模型响应解析
+- extract_json_object：单遍扫描（识别字符串与转义）找出文本中第一个括号配平的 JSON 对象，
+  不依赖 ```json 代码块，也能处理对象前后夹带说明文字的情况
+- 标准解析失败时做宽松修正：去掉 } ] 前的多余逗号、单引号字符串改为双引号、True/False/None 改为 JSON 字面量
+- 按调用类型用 SCHEMAS（JSON Schema 的子集：type / required / properties / items / enum）校验结构；
+  校验前先经 NORMALIZERS 整理可选字段（如 "2"、2.0 形式的 character_index），
+  无关或越界的可选字段置为 None，不让整条可用的响应失败
+- 安装了 orjson 时用它解析
+- 每种调用类型的成功、修正后成功、解析失败、校验失败次数记录在 parse_stats 中
+- response_format_for：把同一份 schema 包装为 OpenAI 结构化输出的 response_format
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson  # type: ignore
+except Exception:  # 可选依赖
+    orjson = None  # type: ignore
+
+from src.telemetry import tracing
+
+from .prompts import BATTLE_DECISION, GENERATE_STRATEGY, SCAN_CHARACTER, SCAN_ENEMY
+
+logger = logging.getLogger(__name__)
+
+ACTION_TYPES = ["ultimate", "skill", "basic_attack", "switch_target_left", "switch_target_right", "wait"]
+
+# 扫描 JSON 对象时需要关注的字符
+_SPECIAL = re.compile(r"[{}\"'\\]")
+
+_NUMBER_OR_NULL = {"type": ["number", "null"]}
+
+SCHEMAS: Dict[str, Dict[str, Any]] = {
+    BATTLE_DECISION: {
+        "type": "object",
+        "required": ["action_type"],
+        "properties": {
+            "action_type": {"type": "string", "enum": ACTION_TYPES},
+            "character_index": {"type": ["integer", "null"], "enum": [1, 2, 3, 4, None]},
+            "target_direction": {"type": ["string", "null"], "enum": ["left", "right", None]},
+            "reasoning": {"type": "string"},
+            "confidence": {"type": ["number", "null"]},
+        },
+    },
+    SCAN_CHARACTER: {
+        "type": "object",
+        "required": ["stats", "skills"],
+        "properties": {
+            "stats": {
+                "type": "object",
+                "properties": {k: _NUMBER_OR_NULL for k in (
+                    "atk", "hp", "def", "spd", "crit_rate", "crit_dmg",
+                    "break_effect", "energy_regen", "effect_hit", "effect_res",
+                )},
+            },
+            "skills": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["name"],
+                    "properties": {
+                        "name": {"type": "string"},
+                        "type": {"type": ["string", "null"]},
+                        "brief_description": {"type": ["string", "null"]},
+                        "detailed_description": {"type": ["string", "null"]},
+                        "energy_cost": _NUMBER_OR_NULL,
+                        "cooldown": _NUMBER_OR_NULL,
+                        "effects": {"type": ["array", "null"], "items": {"type": "string"}},
+                    },
+                },
+            },
+        },
+    },
+    SCAN_ENEMY: {
+        "type": "object",
+        "required": ["stats", "weaknesses"],
+        "properties": {
+            "level": {"type": ["integer", "null"]},
+            "stats": {
+                "type": "object",
+                "properties": {k: _NUMBER_OR_NULL for k in ("hp", "def", "spd", "toughness")},
+            },
+            "weaknesses": {"type": "array", "items": {"type": "string"}},
+            "resistances": {"type": ["object", "null"]},
+            "buffs": {"type": ["array", "null"], "items": {"type": "string"}},
+        },
+    },
+    GENERATE_STRATEGY: {
+        "type": "object",
+        "required": ["plan_a"],
+        "properties": {
+            "analysis": {"type": ["object", "null"]},
+            "plan_a": {
+                "type": "object",
+                "required": ["steps"],
+                "properties": {
+                    "name": {"type": "string"},
+                    "expected_rounds": _NUMBER_OR_NULL,
+                    "steps": {"type": "array", "items": {"type": "object"}},
+                },
+            },
+            "plan_b": {"type": ["object", "null"]},
+            "recommendation": {"type": ["string", "null"]},
+        },
+    },
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def _normalize_battle_decision(data: Dict[str, Any]) -> Dict[str, Any]:
+    """action_type 仍严格校验；character_index 只在大招时保留 1-4 的整数，target_direction 只保留 left/right"""
+    index = data.get("character_index")
+    if data.get("action_type") != "ultimate" or isinstance(index, bool):
+        index = None
+    elif index is not None:
+        try:
+            value = float(index)
+            index = int(value) if value.is_integer() else None
+        except (TypeError, ValueError):
+            index = None
+        if index not in (1, 2, 3, 4):
+            index = None
+    if "character_index" in data:
+        data["character_index"] = index
+    direction = data.get("target_direction")
+    if direction is not None:
+        direction = str(direction).strip().lower()
+        data["target_direction"] = direction if direction in ("left", "right") else None
+    return data
+
+
+# 调用类型 -> 校验前的整理函数（就地修改并返回）
+NORMALIZERS = {
+    BATTLE_DECISION: _normalize_battle_decision,
+}
+
+
+def response_format_for(call_type: str) -> Optional[Dict[str, Any]]:
+    """返回 json_schema 形式的 response_format；未登记 schema 的调用类型返回 None。"""
+    schema = SCHEMAS.get(call_type)
+    if schema is None:
+        return None
+    return {"type": "json_schema", "json_schema": {"name": call_type, "schema": schema, "strict": False}}
+
+
+class ResponseParseError(ValueError):
+    """响应中没有可解析的 JSON 对象，或不符合调用类型的结构。"""
+
+
+_stats_lock = threading.Lock()
+parse_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _count(call_type: Optional[str], outcome: str):
+    key = call_type or "unknown"
+    with _stats_lock:
+        bucket = parse_stats.setdefault(key, {"ok": 0, "fixed": 0, "failed": 0, "invalid": 0})
+        bucket[outcome] += 1
+
+
+def _loads(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """返回文本中第一个括号配平的 {...} 子串；没有时返回 None。单引号字符串同样会被跳过。"""
+    start = -1
+    depth = 0
+    quote = ""
+    escaped = False
+    # 只在括号、引号与反斜杠处停下，普通字符由正则在 C 层跳过
+    for m in _SPECIAL.finditer(text):
+        ch = m.group()
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = ""
+            continue
+        if ch == "{":
+            if depth == 0:
+                start = m.start()
+            depth += 1
+        elif start < 0:
+            continue  # 对象开始前的说明文字
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:m.end()]
+    return None
+
+
+def lenient_fix(text: str) -> str:
+    """单遍修正常见的非标准 JSON：多余逗号、单引号字符串、Python 字面量。"""
+    out: List[str] = []
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            # 复制字符串；单引号字符串转成双引号并转义其中的双引号
+            j = i + 1
+            buf = []
+            while j < n and text[j] != ch:
+                c = text[j]
+                if c == "\\" and j + 1 < n:
+                    nxt = text[j + 1]
+                    buf.append(nxt if (ch == "'" and nxt == "'") else c + nxt)
+                    j += 2
+                    continue
+                buf.append('\\"' if (ch == "'" and c == '"') else c)
+                j += 1
+            out.append('"' + "".join(buf) + '"')
+            i = j + 1
+            continue
+        if ch == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "}]":
+                i += 1
+                continue
+        if ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append({"True": "true", "False": "false", "None": "null"}.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def validate(data: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """返回不符合 schema 的位置说明列表，空列表表示通过。"""
+    errors: List[str] = []
+    types = schema.get("type")
+    if types is not None:
+        allowed = types if isinstance(types, list) else [types]
+        ok = False
+        for t in allowed:
+            if t == "integer":
+                ok = isinstance(data, int) and not isinstance(data, bool)
+            elif t == "number":
+                ok = isinstance(data, (int, float)) and not isinstance(data, bool)
+            else:
+                ok = isinstance(data, _TYPES[t])
+            if ok:
+                break
+        if not ok:
+            return [f"{path}: 期望 {'/'.join(allowed)}，实际为 {type(data).__name__}"]
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: 取值 {data!r} 不在 {schema['enum']} 中")
+    if isinstance(data, dict):
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}: 缺少字段 {key}")
+        for key, sub in (schema.get("properties") or {}).items():
+            if key in data:
+                errors.extend(validate(data[key], sub, f"{path}.{key}"))
+    elif isinstance(data, list) and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+@tracing.traced(cat="parse")
+def parse_json_response(text: str, call_type: Optional[str] = None,
+                        schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    从模型响应中解析 JSON 对象并按调用类型校验。
+    - call_type：prompts 中的调用类型名，用于选择 SCHEMAS 与统计
+    - schema：显式指定时覆盖 SCHEMAS[call_type]
+    失败时抛出 ResponseParseError。
+    """
+    candidate = extract_json_object(text or "")
+    if candidate is None:
+        _count(call_type, "failed")
+        raise ResponseParseError(f"响应中没有 JSON 对象：{(text or '')[:80]!r}")
+
+    outcome = "ok"
+    try:
+        data = _loads(candidate)
+    except ValueError:
+        try:
+            data = _loads(lenient_fix(candidate))
+            outcome = "fixed"
+        except ValueError as e:
+            _count(call_type, "failed")
+            raise ResponseParseError(f"JSON 解析失败：{e}") from e
+
+    if not isinstance(data, dict):
+        _count(call_type, "invalid")
+        raise ResponseParseError("响应的 JSON 不是对象")
+    normalize = NORMALIZERS.get(call_type or "")
+    if normalize is not None:
+        data = normalize(data)
+    schema = schema if schema is not None else SCHEMAS.get(call_type or "")
+    if schema is not None:
+        errors = validate(data, schema)
+        if errors:
+            _count(call_type, "invalid")
+            raise ResponseParseError("响应结构不符合要求：" + "；".join(errors[:5]))
+    _count(call_type, outcome)
+    if outcome == "fixed":
+        logger.debug(f"{call_type} 响应经宽松修正后解析成功")
+    return data
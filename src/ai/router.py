@@ -0,0 +1,146 @@
+"""
+模型档位路由
+- config.ai.profiles 定义命名档位，每个档位覆盖主配置中的 model / base_url / api_key / timeout 等字段，
+  例如 fast 用小模型做每回合决策、smart 用大模型做策略规划
+- config.ai.routes 指定各调用类型使用的档位，未列出的调用类型使用主配置（default 档位）
+- config.ai.escalation 指定升级档位：响应无法解析、或 confidence 低于 min_confidence 时，
+  用升级档位重新请求一次
+- 每个档位使用独立的 AIClient，重试/熔断/用量统计互不干扰；profile_stats() 汇总各档位的调用次数、
+  升级次数、用量与 p50/p95 延迟
+"""
+from __future__ import annotations
+
+import dataclasses
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .client import AIClient, AIConfig
+from .resilience import LatencyTracker
+from .response_parser import ResponseParseError
+
+DEFAULT_PROFILE = "default"
+
+logger = logging.getLogger(__name__)
+
+
+def profile_config(base: AIConfig, overrides: Dict[str, Any]) -> AIConfig:
+    """在主配置上覆盖档位字段；不认识的字段忽略并警告。"""
+    known = {f.name for f in dataclasses.fields(base)}
+    unknown = sorted(set(overrides) - known)
+    if unknown:
+        logger.warning(f"模型档位中的未知字段已忽略: {', '.join(unknown)}")
+    return dataclasses.replace(base, **{k: v for k, v in overrides.items() if k in known})
+
+
+class ModelRouter:
+    """按调用类型选择档位，必要时升级到更强的档位。"""
+
+    def __init__(self, base_client: AIClient, profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+                 routes: Optional[Dict[str, str]] = None, escalation: Optional[Dict[str, str]] = None,
+                 min_confidence: float = 0.5):
+        self.clients: Dict[str, AIClient] = {DEFAULT_PROFILE: base_client}
+        base_config = getattr(base_client, "config", None)
+        for name, overrides in (profiles or {}).items():
+            if name == DEFAULT_PROFILE or base_config is None:
+                continue
+            self.clients[name] = AIClient(profile_config(base_config, overrides or {}))
+        self.routes = self._checked(routes, "routes")
+        self.escalation = self._checked(escalation, "escalation")
+        self.min_confidence = min_confidence
+        self.last_profile = DEFAULT_PROFILE
+        self._latency = {name: LatencyTracker() for name in self.clients}
+        self._counts = {name: {"calls": 0, "errors": 0, "escalations": 0} for name in self.clients}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_client(cls, client: AIClient) -> "ModelRouter":
+        """从 AIClient 的配置（profiles / routes / escalation / min_confidence）创建路由。"""
+        cfg = getattr(client, "config", None)
+        return cls(
+            client,
+            profiles=getattr(cfg, "profiles", None),
+            routes=getattr(cfg, "routes", None),
+            escalation=getattr(cfg, "escalation", None),
+            min_confidence=getattr(cfg, "min_confidence", 0.5),
+        )
+
+    def _checked(self, mapping: Optional[Dict[str, str]], what: str) -> Dict[str, str]:
+        result = {}
+        for call_type, profile in (mapping or {}).items():
+            if profile not in self.clients:
+                logger.warning(f"ai.{what} 中 {call_type} 指向未定义的档位 {profile}，改用 {DEFAULT_PROFILE}")
+                profile = DEFAULT_PROFILE
+            result[call_type] = profile
+        return result
+
+    def route(self, call_type: str) -> str:
+        return self.routes.get(call_type, DEFAULT_PROFILE)
+
+    def client(self, profile: str) -> AIClient:
+        return self.clients[profile]
+
+    @property
+    def last_usage(self) -> Dict[str, int]:
+        """最近一次实际发出请求的档位的 usage。"""
+        return getattr(self.clients[self.last_profile], "last_usage", None) or {}
+
+    def _escalation_target(self, call_type: str, profile: str) -> Optional[str]:
+        target = self.escalation.get(call_type)
+        return target if target and target != profile else None
+
+    def _run(self, profile: str, call_type: str, send: Callable[[AIClient], str],
+             parse: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        self.last_profile = profile
+        start = time.perf_counter()
+        try:
+            text = send(self.clients[profile])
+        except Exception:
+            with self._lock:
+                self._counts[profile]["errors"] += 1
+            raise
+        self._latency[profile].add(time.perf_counter() - start)
+        with self._lock:
+            self._counts[profile]["calls"] += 1
+        logger.debug(f"{call_type}@{profile} 响应: {text}")
+        return parse(text)
+
+    def call(self, call_type: str, send: Callable[[AIClient], str],
+             parse: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        用 call_type 对应的档位发送请求并解析。
+        - send(client)：用给定档位的客户端发出请求，返回模型文本
+        - parse(text)：解析为字典，无法解析时抛出 ResponseParseError
+        """
+        profile = self.route(call_type)
+        target = self._escalation_target(call_type, profile)
+        try:
+            data = self._run(profile, call_type, send, parse)
+        except ResponseParseError as e:
+            if target is None:
+                raise
+            reason = f"响应无法解析（{e}）"
+        else:
+            confidence = data.get("confidence")
+            if target is None or not isinstance(confidence, (int, float)) or confidence >= self.min_confidence:
+                return data
+            reason = f"置信度 {confidence:.2f} 低于 {self.min_confidence:g}"
+        logger.info(f"{call_type}：档位 {profile} {reason}，升级到 {target}")
+        with self._lock:
+            self._counts[profile]["escalations"] += 1
+        return self._run(target, call_type, send, parse)
+
+    def profile_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各档位的模型、调用/失败/升级次数、用量与 p50/p95 延迟（毫秒）。"""
+        stats: Dict[str, Dict[str, Any]] = {}
+        for name, client in self.clients.items():
+            p50, p95 = self._latency[name].quantile(0.5), self._latency[name].quantile(0.95)
+            stats[name] = {
+                "model": getattr(getattr(client, "config", None), "model", None),
+                **self._counts[name],
+                "usage": dict(getattr(client, "usage_stats", {}) or {}),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
+        return stats
@@ -4,16 +4,33 @@ AI策略引擎
 - 理解角色和敌人的所有信息（包括技能详情）
 - 制定最优战斗策略
 - 实时战斗决策
+- 各调用类型经 ModelRouter 选择模型档位（如决策用小模型、规划用大模型），必要时升级重试
 """
 from __future__ import annotations
 
 import base64
 import io
-import json
 import logging
 import time
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .prompts import (
+    BATTLE_DECISION,
+    DEFAULT_MAX_TOKENS,
+    GENERATE_STRATEGY,
+    SCAN_CHARACTER,
+    SCAN_ENEMY,
+    PromptRegistry,
+    compact_json,
+)
+from .response_parser import parse_json_response, response_format_for
+from .router import ModelRouter
+from src.image_recognition.probes import PixelProbeSet
+from src.image_recognition.roi import ROIRegistry
+from src.telemetry import metrics, tracing
+
+import numpy as np
 
 try:
     from PIL import Image
@@ -55,6 +72,7 @@ class BattleAction:
     character_index: Optional[int] = None  # 1-4，用于大招
     target_direction: Optional[str] = None  # "left", "right"
     reasoning: str = ""  # AI的决策理由
+    source: str = "model"  # 决策来源：model / fallback
 
 
 class AIStrategyEngine:
@@ -78,8 +96,58 @@ class AIStrategyEngine:
         self.enemies: List[EnemyInfo] = []
         self.battle_context: Dict[str, Any] = {}
         
-    def screenshot_to_base64(self, region: Optional[Tuple[int, int, int, int]] = None) -> str:
-        """截图并转为base64"""
+        # 启动时编译提示词：固定部分放在 system 中，逐字节稳定以命中服务商的提示词缓存
+        ai_config = getattr(ai_client, "config", None)
+        self.prompts = PromptRegistry(getattr(ai_config, "system_prompt", None))
+        # 各调用类型的输出上限与结构化输出要求
+        self.max_tokens = {**DEFAULT_MAX_TOKENS, **(getattr(ai_config, "max_tokens", None) or {})}
+        # 同一份策略对象在战斗中每回合复用，序列化结果按对象缓存：(策略对象, 所选方案, 序列化文本)
+        self._plan_json: Tuple[Any, str, str] = (None, "", "")
+        # 调用类型 -> 模型档位
+        self.router = ModelRouter.from_client(ai_client)
+        # 可选的会话录制器（storage.session.SessionRecorder），记录每次截图
+        self.recorder = None
+        # 可选的画面来源（replay.sources），设置后代替实时截图
+        self.screen_source = None
+        # 可选的 HUD 像素探针，每回合在决策截图上求值，结果存入 last_probes
+        self.probes: Optional[PixelProbeSet] = None
+        self.last_probes: Dict[str, bool] = {}
+        # UI 区域注册表；设置后整屏截图尺寸变化时自动重新解析，探针改用按实际尺寸换算后的坐标
+        self.roi: Optional[ROIRegistry] = None
+        # 最近一次整屏截图（PIL），last_frame 按需转为数组并缓存
+        self._last_image = None
+        self._last_frame = None
+        
+    def _call_options(self, call_type: str) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.max_tokens.get(call_type),
+            "response_format": response_format_for(call_type),
+            "call_type": call_type,
+        }
+
+    @property
+    def last_usage(self) -> Dict[str, int]:
+        return self.router.last_usage
+
+    def _ask(self, call_type: str, user_prompt: str, system: str, temperature: float,
+             images: Optional[List[str]] = None) -> Dict[str, Any]:
+        """按路由选择档位发送请求并解析为字典；图片不为 None 时走多模态接口。"""
+        options = self._call_options(call_type)
+
+        def send(client) -> str:
+            if images is not None:
+                return client.chat_vision(images, user_prompt, system_prompt=system, temperature=temperature,
+                                          **options)
+            return client.chat([{"role": "user", "content": user_prompt}], system_prompt=system,
+                               temperature=temperature, **options)
+
+        with tracing.span(call_type, "decision"):
+            return self.router.call(call_type, send, lambda text: parse_json_response(text, call_type))
+    
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None):
+        """截图，返回 PIL 图像"""
+        if self.screen_source is not None:
+            return self.screen_source.capture(region)
         global pyautogui
         if pyautogui is None:
             try:
@@ -89,16 +157,61 @@ class AIStrategyEngine:
                 raise RuntimeError("需要安装 pyautogui")
         
         if region:
-            img = pyautogui.screenshot(region=region)
-        else:
-            img = pyautogui.screenshot()
-        
-        buffered = io.BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+            return pyautogui.screenshot(region=region)
+        return pyautogui.screenshot()
+    
+    @property
+    def last_frame(self):
+        """最近一次整屏截图的 RGB 数组，没有截过图时为 None"""
+        if self._last_frame is None and self._last_image is not None:
+            self._last_frame = np.asarray(self._last_image)
+        return self._last_frame
+
+    def read_probes(self) -> Dict[str, bool]:
+        """在最近一帧上求值像素探针（没有缓存帧时先截一张）"""
+        frame = self.last_frame
+        if frame is None:
+            frame = np.asarray(self.capture())
+        probes = self._resolved_probes(frame.shape[1], frame.shape[0])
+        if probes is None or not len(probes):
+            return {}
+        return probes.check(frame)
+
+    def _resolved_probes(self, width: int, height: int) -> Optional[PixelProbeSet]:
+        """注册表中配置了探针时使用按画面尺寸换算后的坐标，否则使用 self.probes"""
+        if self.roi is not None and self.roi.has_probes:
+            self._ensure_roi(width, height)
+            return self.roi.probes
+        return self.probes
+
+    def _ensure_roi(self, width: int, height: int):
+        """画面尺寸变化时重新解析 UI 区域；有条目超出画面时只在解析时警告一次"""
+        if self.roi.ensure((width, height)) and self.roi.invalid:
+            self.logger.warning(self.roi.problems())
+
+    def screenshot_to_base64(self, region: Optional[Tuple[int, int, int, int]] = None) -> str:
+        """截图并转为base64"""
+        with tracing.span("screenshot_to_base64", "capture", region=region) as s:
+            t0 = time.perf_counter()
+            with tracing.span("capture", "capture"):
+                img = self.capture(region)
+            metrics.FRAMES_CAPTURED.inc()
+            if region is None:
+                self._last_image, self._last_frame = img, None
+                if self.roi is not None:
+                    self._ensure_roi(*img.size)
+            if self.recorder is not None:
+                self.recorder.record_frame(img, capture_ms=(time.perf_counter() - t0) * 1000.0)
+            
+            with tracing.span("png_encode", "capture"):
+                buffered = io.BytesIO()
+                img.save(buffered, format="PNG")
+                data = base64.b64encode(buffered.getvalue()).decode()
+            s.set(bytes=len(data))
+            return data
     
     def scan_character_with_ai(self, name: str, element: str, path: str, 
-                               ui_regions: Dict[str, Any]) -> CharacterInfo:
+                               ui_regions: Union[ROIRegistry, Dict[str, Any]]) -> CharacterInfo:
         """
         使用AI扫描角色信息
         1. 截取角色面板
@@ -106,105 +219,50 @@ class AIStrategyEngine:
         3. AI分析所有截图，提取完整信息
         """
         self.logger.info(f"开始扫描角色：{name}")
+        rois = ROIRegistry.coerce(ui_regions)
         
         # 截取基础属性面板
-        char_region = ui_regions.get("character_stats", [100, 100, 400, 300])
-        stats_img = self.screenshot_to_base64(tuple(char_region))
+        stats_img = self.screenshot_to_base64(rois.region("character_stats"))
         
         # 扫描技能
-        skill_buttons = ui_regions.get("skill_buttons", [])
+        skill_buttons = rois.points("skill_buttons")
+        skill_region = rois.region("skill_detail_region")
+        detail_button = rois.point("detail_button")
         skill_images = []
         
         for i, (x, y) in enumerate(skill_buttons):
             self.logger.info(f"扫描技能 {i+1}/{len(skill_buttons)}")
             
             # 点击技能按钮
-            self.ctrl.move_to(x, y, duration=0.2)
+            self.ctrl.move_to(x, y)
             self.ctrl.click()
-            time.sleep(0.5)
+            tracing.sleep(0.5, "scan.skill_open")
             
             # 截取粗略描述
-            skill_region = ui_regions.get("skill_detail_region", [600, 200, 600, 600])
-            brief_img = self.screenshot_to_base64(tuple(skill_region))
+            brief_img = self.screenshot_to_base64(skill_region)
             skill_images.append(("brief", brief_img))
             
             # 如果有详情按钮，点击查看详细描述
-            detail_button = ui_regions.get("detail_button")
             if detail_button:
-                self.ctrl.move_to(detail_button[0], detail_button[1], duration=0.2)
+                self.ctrl.move_to(detail_button[0], detail_button[1])
                 self.ctrl.click()
-                time.sleep(0.5)
-                detail_img = self.screenshot_to_base64(tuple(skill_region))
+                tracing.sleep(0.5, "scan.detail_open")
+                detail_img = self.screenshot_to_base64(skill_region)
                 skill_images.append(("detail", detail_img))
             
             # 关闭面板
             self.ctrl.press_key('esc')
-            time.sleep(0.3)
+            tracing.sleep(0.3, "scan.close")
         
         # 让AI分析所有截图
-        prompt = f"""
-请分析《崩坏：星穹铁道》角色"{name}"的信息。
-
-角色基本信息：
-- 名称：{name}
-- 元素：{element}
-- 命途：{path}
-
-我会提供以下截图：
-1. 角色属性面板（包含攻击、生命、防御、速度、暴击等所有数值）
-2. 每个技能的粗略描述和详细描述
-
-请提取以下信息并以JSON格式输出：
-{{
-    "stats": {{
-        "atk": 数值,
-        "hp": 数值,
-        "def": 数值,
-        "spd": 数值,
-        "crit_rate": 数值（小数，如0.50表示50%）,
-        "crit_dmg": 数值（小数，如1.20表示120%）,
-        "break_effect": 数值,
-        "energy_regen": 数值,
-        "effect_hit": 数值,
-        "effect_res": 数值
-    }},
-    "skills": [
-        {{
-            "name": "技能名称",
-            "type": "basic/skill/ultimate/talent/technique",
-            "brief_description": "简短描述",
-            "detailed_description": "详细描述（包含所有数值、倍率、效果）",
-            "energy_cost": 能量消耗（如果是大招）,
-            "cooldown": 冷却时间（如果有）,
-            "effects": ["效果1", "效果2", ...]
-        }}
-    ]
-}}
-
-注意：
-1. 仔细阅读所有数值，包括百分比
-2. 技能描述要完整，包括所有倍率和特殊效果
-3. 不要遗漏任何重要信息
-4. 如果某些信息不确定，可以标注为null
-"""
+        system, prompt = self.prompts.render(SCAN_CHARACTER, name=name, element=element, path=path)
         
         # 发送所有图片给AI
         all_images = [stats_img] + [img for _, img in skill_images]
         
         try:
-            response = self.ai.chat_vision(all_images, prompt, temperature=0.1)
-            self.logger.debug(f"AI响应: {response}")
-            
-            # 解析JSON响应
-            # 尝试提取JSON（有些模型会在代码块中返回）
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response.strip()
-            
-            data = json.loads(json_str)
+            # 解析JSON响应（兼容代码块与前后说明文字）
+            data = self._ask(SCAN_CHARACTER, prompt, system, 0.1, images=all_images)
             
             char_info = CharacterInfo(
                 name=name,
@@ -232,47 +290,16 @@ class AIStrategyEngine:
             self.logger.error(f"AI分析角色信息失败: {e}")
             raise
     
-    def scan_enemy_with_ai(self, name: str, ui_regions: Dict[str, Any]) -> EnemyInfo:
+    def scan_enemy_with_ai(self, name: str, ui_regions: Union[ROIRegistry, Dict[str, Any]]) -> EnemyInfo:
         """使用AI扫描敌人信息"""
         self.logger.info(f"开始扫描敌人：{name}")
         
-        enemy_region = ui_regions.get("enemy_panel", [1000, 100, 400, 300])
-        enemy_img = self.screenshot_to_base64(tuple(enemy_region))
+        enemy_img = self.screenshot_to_base64(ROIRegistry.coerce(ui_regions).region("enemy_panel"))
         
-        prompt = f"""
-请分析《崩坏：星穹铁道》敌人"{name}"的信息。
-
-请提取以下信息并以JSON格式输出：
-{{
-    "level": 等级,
-    "stats": {{
-        "hp": 生命值,
-        "def": 防御力,
-        "spd": 速度,
-        "toughness": 韧性值
-    }},
-    "weaknesses": ["弱点元素1", "弱点元素2", ...],
-    "resistances": {{"元素": 抗性值（小数）}},
-    "buffs": ["增益/机制描述1", "增益/机制描述2", ...]
-}}
-
-注意：
-1. 弱点元素包括：Physical, Fire, Ice, Lightning, Wind, Quantum, Imaginary
-2. 抗性为负数表示易伤，正数表示抗性
-3. buffs包括特殊机制、环境增益等
-"""
+        system, prompt = self.prompts.render(SCAN_ENEMY, name=name)
         
         try:
-            response = self.ai.chat_vision([enemy_img], prompt, temperature=0.1)
-            
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response.strip()
-            
-            data = json.loads(json_str)
+            data = self._ask(SCAN_ENEMY, prompt, system, 0.1, images=[enemy_img])
             
             enemy_info = EnemyInfo(
                 name=name,
@@ -349,107 +376,17 @@ class AIStrategyEngine:
         }
         
         allow_reroll = preferences.get("allow_reroll", True)
-        reroll_settings = preferences.get("reroll_settings", {})
         
-        prompt = f"""
-你是《崩坏：星穹铁道》的顶级战斗策略专家。
-
-战斗模式：{mode_descriptions.get(mode, mode)}
-用户偏好：{"允许凹本" if allow_reroll else "不凹本，追求稳定"}
-
-角色队伍：
-{json.dumps(context["characters"], ensure_ascii=False, indent=2)}
-
-敌人信息：
-{json.dumps(context["enemies"], ensure_ascii=False, indent=2)}
-
-请根据以上信息，制定最优战斗策略。注意：
-
-1. **深入分析**：
-   - 计算每个角色的实际伤害（考虑属性、暴击、增伤等）
-   - 分析速度轮次，确定行动顺序
-   - 考虑弱点击破、能量恢复、buff/debuff时机
-   - 评估敌人的威胁和最优击杀顺序
-
-2. **按键说明**：
-   - 1-4：释放对应位置角色的大招（终结技）
-   - Q：普通攻击
-   - E：战技
-   - 左右方向键或鼠标点击：选择目标
-   - 注意：每个角色的战技效果不同，不要固化思维！有的是增益，有的是攻击，有的是控制
-
-3. **制定方案**：
-   请提供至少2个方案供玩家选择：
-
-   **方案A（稳定）**：
-   - 不依赖凹本，追求稳定通关
-   - 详细步骤：第X回合，角色Y使用Z技能，目标W
-   - 预计回合数
-   
-   **方案B（极限）**：
-   - 追求最少回合数，可以包含凹本操作
-   - 如果允许凹本，说明凹点条件：
-     * 需要哪个角色被攻击
-     * 什么时候被攻击（第几回合，敌人哪个技能）
-     * 目的是什么（回能、触发反击等）
-     * 如果不满足条件，是否重开
-   - 详细步骤
-   - 预计回合数
-
-4. **输出格式**（JSON）：
-{{
-    "analysis": {{
-        "damage_calculation": "伤害计算详情",
-        "turn_order": "行动顺序分析",
-        "synergy": "队伍协同分析",
-        "key_points": ["关键点1", "关键点2", ...]
-    }},
-    "plan_a": {{
-        "name": "稳定方案",
-        "description": "方案描述",
-        "expected_rounds": 预计回合数,
-        "steps": [
-            {{
-                "round": 1,
-                "actions": [
-                    {{
-                        "character": "角色名",
-                        "action": "释放大招1" 或 "普攻Q" 或 "战技E",
-                        "target": "目标描述" 或 "切换目标（左/右）",
-                        "reasoning": "理由"
-                    }}
-                ]
-            }}
-        ]
-    }},
-    "plan_b": {{
-        "name": "极限方案",
-        "description": "方案描述",
-        "expected_rounds": 预计回合数,
-        "requires_reroll": true/false,
-        "reroll_condition": {{
-            "target_character": "被攻击角色",
-            "trigger_timing": "触发时机",
-            "purpose": "目的",
-            "max_retries": 最大重试次数
-        }},
-        "steps": [...]
-    }},
-    "recommendation": "推荐方案A还是B，以及理由"
-}}
-"""
+        system, prompt = self.prompts.render(
+            GENERATE_STRATEGY,
+            mode=mode_descriptions.get(mode, mode),
+            preference="允许凹本" if allow_reroll else "不凹本，追求稳定",
+            characters=compact_json(context["characters"]),
+            enemies=compact_json(context["enemies"]),
+        )
         
         try:
-            response = self.ai.chat([{"role": "user", "content": prompt}], temperature=0.2)
-            
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response.strip()
-            
-            strategy = json.loads(json_str)
+            strategy = self._ask(GENERATE_STRATEGY, prompt, system, 0.2)
             
             # 保存策略
             self.memory.save("current_strategy", strategy)
@@ -460,6 +397,14 @@ class AIStrategyEngine:
             self.logger.error(f"生成策略失败: {e}")
             raise
     
+    def _serialize_plan(self, strategy: Dict[str, Any], selected_plan: str, plan: Dict[str, Any]) -> str:
+        """记忆缓存命中时返回同一个策略对象，按对象与所选方案复用序列化结果。"""
+        cached, name, text = self._plan_json
+        if cached is not strategy or name != selected_plan:
+            text = compact_json(plan)
+            self._plan_json = (strategy, selected_plan, text)
+        return text
+    
     def make_battle_decision(self, current_round: int, executed_actions: List[Dict]) -> BattleAction:
         """
         实时战斗决策
@@ -473,43 +418,25 @@ class AIStrategyEngine:
         """
         # 截取当前战斗画面
         battle_img = self.screenshot_to_base64()
+        if self.probes is not None or self.roi is not None and self.roi.has_probes:
+            with tracing.span("pixel_probes", "capture"):
+                self.last_probes = self.read_probes()
+            self.logger.debug(f"像素探针：{self.last_probes}")
         
         # 获取当前策略
         strategy = self.memory.load("current_strategy") or {}
         selected_plan = self.battle_context.get("selected_plan", "plan_a")
         plan = strategy.get(selected_plan, {})
         
-        prompt = f"""
-当前战斗状态：
-- 回合数：{current_round}
-- 已执行动作：{json.dumps(executed_actions, ensure_ascii=False)}
-- 原定策略：{json.dumps(plan, ensure_ascii=False)}
-
-请查看当前战斗画面，分析：
-1. 当前轮到谁行动
-2. 各角色和敌人的状态（生命、能量、buff/debuff）
-3. 是否需要调整策略
-
-然后决定下一步动作，输出JSON格式：
-{{
-    "action_type": "ultimate" | "skill" | "basic_attack" | "switch_target_left" | "switch_target_right" | "wait",
-    "character_index": 1-4（如果是大招）,
-    "target_direction": "left" | "right"（如果是切换目标）,
-    "reasoning": "决策理由"
-}}
-"""
+        system, prompt = self.prompts.render(
+            BATTLE_DECISION,
+            plan=self._serialize_plan(strategy, selected_plan, plan),
+            round=current_round,
+            actions=compact_json(executed_actions),
+        )
         
         try:
-            response = self.ai.chat_vision([battle_img], prompt, temperature=0.1)
-            
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response.strip()
-            
-            decision = json.loads(json_str)
+            decision = self._ask(BATTLE_DECISION, prompt, system, 0.1, images=[battle_img])
             
             return BattleAction(
                 action_type=decision.get("action_type", "wait"),
@@ -520,4 +447,4 @@ class AIStrategyEngine:
             
         except Exception as e:
             self.logger.error(f"AI决策失败: {e}，使用默认动作")
-            return BattleAction(action_type="basic_attack", reasoning="AI决策失败，默认普攻")
+            return BattleAction(action_type="basic_attack", reasoning="AI决策失败，默认普攻", source="fallback")
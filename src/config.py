@@ -23,6 +23,29 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "timeout": 60,
         "endpoint": None,   # 仅 custom_http 使用
         "headers": {},      # 仅 custom_http 使用
+        "response_format": "json_schema",  # 结构化输出：json_schema | json_object | none，网关不支持时自动降级
+        "max_tokens": {},   # 按调用类型覆盖输出上限，如 {"battle_decision": 200}
+        # 重试/熔断/对冲，未写的字段使用默认值
+        "resilience": {
+            "max_attempts": 3,
+            "base_delay": 0.5,
+            "max_delay": 8.0,
+            "failure_threshold": 5,
+            "reset_timeout": 30.0,
+            "hedge": True,           # 超过该端点 p95 延迟仍未返回时再发一次请求
+            "hedge_quantile": 0.95,
+            "hedge_min_samples": 20,
+            "hedge_min_delay": 1.0,
+        },
+        # 主端点失败或熔断时按顺序尝试，如 [{"base_url": "https://api.deepseek.com/v1", "model": "deepseek-chat", "api_key": "..."}]
+        "fallbacks": [],
+        # 模型档位：覆盖主配置的 model/base_url/api_key/timeout，如 {"fast": {"model": "gpt-4o-mini"}, "smart": {"model": "gpt-4o"}}
+        "profiles": {},
+        # 调用类型 -> 档位（scan_character / scan_enemy / generate_strategy / battle_decision），未列出的用主配置
+        "routes": {},
+        # 调用类型 -> 升级档位：响应无法解析或 confidence 低于 min_confidence 时用它重试一次
+        "escalation": {},
+        "min_confidence": 0.5,
     },
     # OCR 与扫描配置（可在 UI 中编辑）
     "ocr": {
@@ -44,14 +67,76 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "enemy_panel": [1000, 100, 400, 300],
         "detail_button": None
     },
+    # ui_regions 与 pixel_probes 坐标所对应的分辨率 [宽, 高]；实际截图尺寸不同时按两个轴的比例换算，
+    # 为 None 时按填写的坐标原样使用
+    "ui_reference_resolution": None,
+    # HUD 像素探针：名称 -> {"x", "y", "color": [R, G, B], "tolerance"}，每回合在决策截图上一次性求值，
+    # 如 {"ult_ready_1": {"x": 1710, "y": 905, "color": [255, 230, 120], "tolerance": 40}}
+    "pixel_probes": {},
+    # 记忆存储：json 为每个键一个文件（data/memory），sqlite 为单个 WAL 数据库（data/memory.db），memory 不落盘
+    "storage": {
+        "backend": "json",
+        "path": None,
+        "cache_ttl": 0.5,  # 读缓存在该秒数内不再校验文件/数据库是否被其它进程修改
+        "write_behind": True,  # json 后端：save 立即返回，由后台线程原子落盘
+        "format": "json",  # json | msgpack
+        "compress": None,  # None | zstd | zlib，超过 compress_threshold 字节的数据才压缩
+        "compress_threshold": 4096,
+    },
+    # 战斗遥测：每个动作的耗时/token/决策来源追加写入 data/battle_log，可导出为 Parquet/NumPy
+    "telemetry": {
+        "battle_log": True,
+        "path": None,
+        # 会话录制：截图帧、模型请求/响应、键鼠输入与动作写入 data/sessions/<时间>，可用于回放
+        "record_session": False,
+        "session_path": None,
+        "frame_scale": 4,         # 帧缩小倍数
+        "keyframe_interval": 30,  # 每隔多少帧存一个关键帧，其余存差值
+        # 追踪各阶段耗时（截图/编码/模型请求/解析/按键），停止时导出 Chrome trace JSON，可用 Perfetto 打开
+        "trace": False,
+        "trace_path": None,        # 默认 data/traces/trace-<时间>.json
+        "trace_max_events": 500000,  # 环形缓冲区大小，超出后丢弃最早的事件
+        # 指标：metrics_port 设置后在 http://127.0.0.1:<端口>/metrics 提供 Prometheus 文本
+        "metrics_port": None,
+        "metrics_host": "127.0.0.1",
+        "metrics_snapshot_path": None,     # 默认 data/metrics/snapshot.json（同时写 snapshot.prom）
+        "metrics_snapshot_interval": 60,   # 秒，0 表示不写快照
+        # 性能剖析：定期写 tracemalloc 快照差值与调用栈采样热点到 data/profiles/<时间>/；
+        # 运行中也可发送 profile_signal（Linux 默认 SIGUSR1，Windows 为 SIGBREAK 即 Ctrl+Break）开关
+        "profile": False,
+        "profile_path": None,       # 默认 data/profiles
+        "profile_interval": 300,    # 秒，每隔多久写一次结果
+        "profile_sample_hz": 50,    # 调用栈采样频率
+        "profile_signal": None,     # None 表示使用平台默认信号，"" 表示不安装
+        "prices": {},  # 模型 -> {"input", "output", "cached"} 每百万 token 价格，用于估算花费
+    },
     # 运行模式：plan_only 为 true 时仅生成策略与保存记忆，不启动自动战斗
     "run": {
-        "plan_only": False
+        "plan_only": False,
+        # 离线回放：source 为会话目录（data/sessions/...）或截图目录，设置后 main.py 只回放不进入实时战斗
+        "replay": {
+            "source": None,
+            "backend": "recorded",  # recorded | mock | live
+            "ticks": None,          # 决策次数，默认与录制的动作数相同
+        },
     },
     # 输入与键位
     "input": {
         "enable_inputs": False,
         "preferred_ult_index": 1,
+        # 输入后端：pyautogui | pynput | xtest（Linux X11）| uinput（Linux，需 /dev/uinput 权限）| recording（不发送）
+        "backend": "pyautogui",
+        "backend_options": {},    # 传给后端的参数，如 uinput 的 {"screen_size": [1920, 1080]}
+        "pause": 0.02,            # pyautogui 每次调用后的停顿（秒），其默认 0.1 秒
+        "move_duration": 0.05,    # 鼠标移动动画时长（秒）
+        # 异步输入执行器：每个动作的按键整批在后台线程发送，并测量从按键到画面变化的延迟
+        "executor": True,
+        "min_key_interval": 0.05,  # 相邻按键之间的最小间隔（秒）
+        "reaction_region": None,   # 检测画面变化的区域 [x, y, w, h]，None 为全屏
+        "reaction_timeout": 1.0,   # 超过该时间画面仍未变化则不记录延迟
+        # 宏：名称 -> 步骤（键位动作名 / 按键 / "wait:秒" / "click:x,y"），与内置动作同名时替换该动作的按键，
+        # 如 {"ultimate_3": ["ultimate_3", "target_right", "confirm"]}
+        "macros": {},
         "keybinds": {
             "attack": "q",
             "single_skill": "e",
@@ -77,6 +162,14 @@ DEFAULT_CONFIG: Dict[str, Any] = {
             "max_retries": 5,
         },
     },
+    # 队伍搜索：从 roster 中为当前敌人挑选最优 4 人队伍
+    "team_search": {
+        "top_k": 5,
+        "refine": 64,      # 粗筛后进入模拟精排的候选数
+        "trials": 2000,    # 每支候选队伍的模拟次数
+        "workers": None,   # 进程数，None 为 CPU 核数
+        "required": [],    # 必须上场的角色名
+    },
     "roster": [],  # 用户的角色与装备信息
     "enemy": {},   # 敌人/关卡信息
 }
@@ -105,10 +198,22 @@ def load_config() -> Dict[str, Any]:
             ui_regions = DEFAULT_CONFIG["ui_regions"].copy()
             ui_regions.update(cfg.get("ui_regions", {}))
             cfg["ui_regions"] = ui_regions
+            # storage 子项合并
+            storage = DEFAULT_CONFIG["storage"].copy()
+            storage.update(cfg.get("storage", {}) or {})
+            cfg["storage"] = storage
+            # telemetry 子项合并
+            telemetry = DEFAULT_CONFIG["telemetry"].copy()
+            telemetry.update(cfg.get("telemetry", {}) or {})
+            cfg["telemetry"] = telemetry
             # preferences 子项也做合并，避免缺项
             pref = DEFAULT_CONFIG["preferences"].copy()
             pref.update(cfg.get("preferences", {}))
             cfg["preferences"] = pref
+            # team_search 子项也做合并
+            ts = DEFAULT_CONFIG["team_search"].copy()
+            ts.update(cfg.get("team_search", {}) or {})
+            cfg["team_search"] = ts
             # run 子项也做合并
             run = DEFAULT_CONFIG["run"].copy()
             run.update(cfg.get("run", {}))
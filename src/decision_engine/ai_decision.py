@@ -6,10 +6,12 @@ AI驱动的战斗决策引擎
 from __future__ import annotations
 
 import logging
+import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
 from src.ai.strategy_engine import AIStrategyEngine, BattleAction
+from src.telemetry import metrics, tracing
 
 
 @dataclass
@@ -20,28 +22,61 @@ class BattleState:
     battle_data: Dict[str, Any]  # 识别到的当前战斗数据
 
 
+def action_steps(action: BattleAction) -> Optional[List[str]]:
+    """动作对应的输入步骤（键位动作名），交给 InputExecutor 作为一个批次发送；
+    input.macros 中的同名宏可以扩展这些步骤"""
+    if action.action_type == "ultimate":
+        return [f"ultimate_{action.character_index}"] if action.character_index in (1, 2, 3, 4) else None
+    return {
+        "skill": ["skill"],
+        "basic_attack": ["basic_attack"],
+        "switch_target_left": ["target_left"],
+        "switch_target_right": ["target_right"],
+    }.get(action.action_type)
+
+
 class AIBattleDecision:
     """AI驱动的战斗决策类"""
     
-    def __init__(self, ai_strategy_engine: AIStrategyEngine, logger: Optional[logging.Logger] = None):
+    # wait 动作的等待时间（秒），回放时设为 0
+    wait_seconds = 0.5
+    
+    def __init__(self, ai_strategy_engine: AIStrategyEngine, logger: Optional[logging.Logger] = None,
+                 battle_log=None):
         """
         Args:
             ai_strategy_engine: AI策略引擎
             logger: 日志记录器
+            battle_log: 可选的 BattleLog，记录每个动作与每场战斗的遥测数据
         """
         self.ai_engine = ai_strategy_engine
         self.logger = logger or logging.getLogger(__name__)
+        self.battle_log = battle_log
         
         # 战斗状态
         self.current_round = 0
         self.executed_actions: List[Dict[str, Any]] = []
         self.battle_started = False
+        self.battle_id = 0
+        self.battle_start_ts = 0.0
+        # 最近一次决策的遥测（耗时、token），在 execute_action 时连同执行结果一并写入
+        self._pending: Dict[str, Any] = {}
+        # 可选的会话录制器（storage.session.SessionRecorder）
+        self.recorder = None
+        # 可选的输入执行器（game_control.executor.InputExecutor），设置后按键整批异步发送
+        self.executor = None
     
     def start_battle(self):
         """开始新战斗"""
         self.current_round = 0
         self.executed_actions = []
         self.battle_started = True
+        self.battle_start_ts = time.time()
+        self.battle_id = time.time_ns() // 1000
+        self._pending = {}
+        if self.recorder is not None:
+            self.recorder.record_event("battle_start", battle_id=self.battle_id)
+        tracing.instant("battle_start", "battle", battle_id=self.battle_id)
         self.logger.info("战斗开始")
     
     def end_battle(self, result: str):
@@ -49,14 +84,29 @@ class AIBattleDecision:
         self.battle_started = False
         self.logger.info(f"战斗结束：{result}")
         
-        # 保存战斗记录供学习
+        # 保存战斗记录供学习；enemy 供 SQLite 存储按敌人建索引
+        enemies = getattr(self.ai_engine, "enemies", None) or []
+        enemy = enemies[0].name if enemies else None
         battle_record = {
             "rounds": self.current_round,
             "actions": self.executed_actions,
-            "result": result
+            "result": result,
+            "enemy": enemy,
         }
         self.ai_engine.memory.save(f"battle_record_{int(time.time())}", battle_record)
+        if self.recorder is not None:
+            self.recorder.record_event("battle_end", battle_id=self.battle_id, rounds=self.current_round, result=result)
+        tracing.instant("battle_end", "battle", battle_id=self.battle_id, rounds=self.current_round, result=result)
+        metrics.BATTLES.inc(result=result)
+        metrics.TURNS_PER_BATTLE.observe(self.current_round)
+        metrics.BATTLE_ROUND.set(0)
+        if self.battle_log is not None:
+            self.battle_log.log_battle(
+                self.battle_id, self.battle_start_ts, rounds=self.current_round,
+                actions=len(self.executed_actions), result=result, enemy=enemy,
+            )
     
+    @tracing.traced(cat="decision")
     def make_decision(self) -> BattleAction:
         """
         做出战斗决策
@@ -68,14 +118,24 @@ class AIBattleDecision:
             self.start_battle()
         
         self.current_round += 1
+        metrics.BATTLE_ROUND.set(self.current_round)
         self.logger.info(f"第 {self.current_round} 回合，AI正在分析...")
         
+        t0 = time.perf_counter()
         try:
             # 让AI策略引擎分析当前状况并做决策
             action = self.ai_engine.make_battle_decision(
                 current_round=self.current_round,
                 executed_actions=self.executed_actions
             )
+            usage = getattr(self.ai_engine, "last_usage", None) or {}
+            elapsed = time.perf_counter() - t0
+            metrics.DECISION_LATENCY.observe(elapsed)
+            self._pending = {
+                "decide_ms": elapsed * 1000.0,
+                "tokens_in": usage.get("prompt_tokens"),
+                "tokens_out": usage.get("completion_tokens"),
+            }
             
             # 记录动作
             action_record = {
@@ -83,7 +143,8 @@ class AIBattleDecision:
                 "action_type": action.action_type,
                 "character_index": action.character_index,
                 "target_direction": action.target_direction,
-                "reasoning": action.reasoning
+                "reasoning": action.reasoning,
+                "source": action.source,
             }
             self.executed_actions.append(action_record)
             
@@ -93,10 +154,14 @@ class AIBattleDecision:
             
         except Exception as e:
             self.logger.error(f"AI决策失败：{e}，使用保守策略")
+            elapsed = time.perf_counter() - t0
+            metrics.DECISION_LATENCY.observe(elapsed)
+            self._pending = {"decide_ms": elapsed * 1000.0}
             # 失败时返回保守的默认动作
             return BattleAction(
                 action_type="basic_attack",
-                reasoning="AI决策失败，使用保守策略（普攻）"
+                reasoning="AI决策失败，使用保守策略（普攻）",
+                source="fallback",
             )
     
     def execute_action(self, action: BattleAction, game_controller):
@@ -109,34 +174,60 @@ class AIBattleDecision:
         """
         self.logger.info(f"执行动作：{action.action_type} - {action.reasoning}")
         
-        try:
-            if action.action_type == "ultimate":
-                if action.character_index:
-                    game_controller.use_ultimate(action.character_index)
-                else:
-                    self.logger.warning("大招动作缺少角色索引")
+        ts = time.time()
+        t0 = time.perf_counter()
+        ok = True
+        with tracing.span("execute_action", "input", action_type=action.action_type):
+            try:
+                steps = action_steps(action) if self.executor is not None else None
+                if steps:
+                    batch = self.executor.run_macro(steps)
+                    if batch.error:
+                        raise RuntimeError(batch.error)
+
+                elif action.action_type == "ultimate":
+                    if action.character_index:
+                        game_controller.use_ultimate(action.character_index)
+                    else:
+                        self.logger.warning("大招动作缺少角色索引")
             
-            elif action.action_type == "skill":
-                game_controller.use_skill()
+                elif action.action_type == "skill":
+                    game_controller.use_skill()
             
-            elif action.action_type == "basic_attack":
-                game_controller.use_basic_attack()
+                elif action.action_type == "basic_attack":
+                    game_controller.use_basic_attack()
             
-            elif action.action_type == "switch_target_left":
-                game_controller.select_target_left()
+                elif action.action_type == "switch_target_left":
+                    game_controller.select_target_left()
             
-            elif action.action_type == "switch_target_right":
-                game_controller.select_target_right()
+                elif action.action_type == "switch_target_right":
+                    game_controller.select_target_right()
             
-            elif action.action_type == "wait":
-                self.logger.info("等待...")
-                time.sleep(0.5)
+                elif action.action_type == "wait":
+                    self.logger.info("等待...")
+                    tracing.sleep(self.wait_seconds, "wait_action")
             
-            else:
-                self.logger.warning(f"未知动作类型：{action.action_type}")
+                else:
+                    self.logger.warning(f"未知动作类型：{action.action_type}")
         
-        except Exception as e:
-            self.logger.error(f"执行动作失败：{e}")
+            except Exception as e:
+                ok = False
+                self.logger.error(f"执行动作失败：{e}")
+        
+        exec_ms = (time.perf_counter() - t0) * 1000.0
+        metrics.ACTIONS.inc(action_type=action.action_type, source=action.source)
+        pending, self._pending = self._pending, {}
+        if self.battle_log is not None:
+            self.battle_log.log_action(
+                self.battle_id, seq=len(self.executed_actions), round=self.current_round,
+                action_type=action.action_type, character_index=action.character_index,
+                source=action.source, exec_ms=exec_ms, ok=ok, ts=ts, **pending,
+            )
+        if self.recorder is not None:
+            self.recorder.record_action(
+                self.battle_id, self.current_round, action.action_type, action.character_index,
+                action.source, action.reasoning, exec_ms=exec_ms, ok=ok, **pending,
+            )
 
 
 # 为了兼容性，保留一个简化的接口
@@ -163,5 +254,3 @@ def make_ai_decision(ai_engine: AIStrategyEngine, battle_state: BattleState) ->
         "reasoning": action.reasoning
     }
 
-
-import time
@@ -0,0 +1,421 @@
+"""
+可插拔的键鼠输入后端
+- pyautogui：默认后端，兼容性最好，但每次调用都有 PAUSE 停顿与 failsafe 检查
+- pynput：直接调用系统输入接口（Windows SendInput / macOS Quartz / Linux Xlib），没有额外停顿
+- xtest：Linux X11 下通过 XTest 扩展注入事件（需 python-xlib）
+- uinput：Linux 下创建虚拟输入设备（需 python-evdev 与 /dev/uinput 写权限），Wayland 下也可用
+- recording：不发送任何事件，只记录调用，供回放、压测与基准测试使用
+所有后端在发送按键前都经过同一个安全白名单（is_key_safe），不安全的按键抛出 ValueError
+"""
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+SAFE_KEYS = {
+    # 字母
+    *list("abcdefghijklmnopqrstuvwxyz"),
+    # 数字
+    *list("0123456789"),
+    # 常用功能键
+    "space", "enter", "esc", "tab", "backspace",
+    "up", "down", "left", "right",
+    # F1-F12
+    *[f"f{i}" for i in range(1, 13)],
+}
+
+# 鼠标移动动画的步进间隔（秒）
+MOVE_STEP_SECONDS = 0.01
+
+
+def is_key_safe(key: Optional[str], safe_keys: Iterable[str] = SAFE_KEYS) -> bool:
+    """拒绝包含 ctrl/alt/win/command 等组合的键，只允许白名单中的键或单个可打印字符"""
+    if not key:
+        return False
+    k = key.lower().strip()
+    if any(x in k for x in ["ctrl", "alt", "win", "command", "+"]):
+        return False
+    return k in safe_keys or (len(k) == 1 and k.isprintable())
+
+
+class InputBackend(ABC):
+    """输入后端基类：子类必须实现 _key_down/_key_up 与鼠标操作，缺少任一个时在构造时即报 TypeError；
+    按键的白名单检查在这里统一完成"""
+
+    name = "base"
+
+    def _check(self, key: str) -> str:
+        if not is_key_safe(key):
+            raise ValueError(f"不安全的按键：{key}")
+        return key.lower().strip()
+
+    # ---- 键盘 ----
+    def press(self, key: str):
+        key = self._check(key)
+        self._key_down(key)
+        self._key_up(key)
+
+    def key_down(self, key: str):
+        self._key_down(self._check(key))
+
+    def key_up(self, key: str):
+        self._key_up(self._check(key))
+
+    def hold(self, key: str, duration: float):
+        key = self._check(key)
+        self._key_down(key)
+        try:
+            time.sleep(max(0.0, duration))
+        finally:
+            self._key_up(key)
+
+    def write(self, text: str, interval: float = 0.0):
+        for ch in text:
+            self.press(ch)
+            if interval > 0:
+                time.sleep(interval)
+
+    @abstractmethod
+    def _key_down(self, key: str):
+        """按下（不松开）已通过白名单检查的键"""
+
+    @abstractmethod
+    def _key_up(self, key: str):
+        """松开已通过白名单检查的键"""
+
+    # ---- 鼠标 ----
+    @abstractmethod
+    def position(self) -> Tuple[int, int]:
+        """当前鼠标位置"""
+
+    @abstractmethod
+    def _move(self, x: int, y: int):
+        """把鼠标直接移动到 (x, y)"""
+
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        """移动到 (x, y)；duration > 0 时按 MOVE_STEP_SECONDS 线性插值"""
+        steps = int(duration / MOVE_STEP_SECONDS) if duration > 0 else 0
+        if steps > 1:
+            x0, y0 = self.position()
+            for i in range(1, steps):
+                self._move(round(x0 + (x - x0) * i / steps), round(y0 + (y - y0) * i / steps))
+                time.sleep(MOVE_STEP_SECONDS)
+        self._move(x, y)
+
+    @abstractmethod
+    def click(self, button: str = "left", clicks: int = 1):
+        """在当前位置点击 clicks 次"""
+
+    @abstractmethod
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        """按住 button 从当前位置拖动 (dx, dy)"""
+
+    def close(self):
+        pass
+
+
+class PyAutoGUIBackend(InputBackend):
+    """pyautogui 后端；pause 为每次调用后的停顿，None 保持 pyautogui 默认的 0.1 秒"""
+
+    name = "pyautogui"
+
+    def __init__(self, pause: Optional[float] = None):
+        self.pause = pause
+        self._pyautogui = None
+
+    def _pg(self):
+        if self._pyautogui is None:
+            import pyautogui
+            self._pyautogui = pyautogui
+        if self.pause is not None:
+            self._pyautogui.PAUSE = self.pause
+        return self._pyautogui
+
+    def press(self, key: str):
+        self._pg().press(self._check(key))
+
+    def _key_down(self, key: str):
+        self._pg().keyDown(key)
+
+    def _key_up(self, key: str):
+        self._pg().keyUp(key)
+
+    def write(self, text: str, interval: float = 0.0):
+        for ch in text:
+            self._check(ch)
+        self._pg().write(text, interval=interval)
+
+    def position(self) -> Tuple[int, int]:
+        return tuple(self._pg().position())
+
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        self._pg().moveTo(x, y, duration=duration)
+
+    def _move(self, x: int, y: int):
+        self._pg().moveTo(x, y)
+
+    def click(self, button: str = "left", clicks: int = 1):
+        self._pg().click(button=button, clicks=clicks)
+
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        self._pg().drag(dx, dy, duration, button=button)
+
+
+class PynputBackend(InputBackend):
+    """pynput 后端：没有 pyautogui 的停顿与 failsafe 检查"""
+
+    name = "pynput"
+
+    def __init__(self):
+        try:
+            from pynput import keyboard, mouse
+        except ImportError:
+            raise RuntimeError("需要安装 pynput")
+        self._keyboard = keyboard.Controller()
+        self._mouse = mouse.Controller()
+        self._Key = keyboard.Key
+        self._KeyCode = keyboard.KeyCode
+        self._buttons = {"left": mouse.Button.left, "right": mouse.Button.right, "middle": mouse.Button.middle}
+        self._cache: Dict[str, Any] = {}
+
+    def _resolve(self, key: str):
+        code = self._cache.get(key)
+        if code is None:
+            # pynput 的 Key 枚举名与白名单一致（esc/enter/space/tab/backspace/up/.../f1-f12）
+            code = getattr(self._Key, key, None) if len(key) > 1 else self._KeyCode.from_char(key)
+            if code is None:
+                raise ValueError(f"pynput 不支持的按键：{key}")
+            self._cache[key] = code
+        return code
+
+    def _key_down(self, key: str):
+        self._keyboard.press(self._resolve(key))
+
+    def _key_up(self, key: str):
+        self._keyboard.release(self._resolve(key))
+
+    def position(self) -> Tuple[int, int]:
+        x, y = self._mouse.position
+        return int(x), int(y)
+
+    def _move(self, x: int, y: int):
+        self._mouse.position = (x, y)
+
+    def click(self, button: str = "left", clicks: int = 1):
+        self._mouse.click(self._buttons[button], clicks)
+
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        x, y = self.position()
+        self._mouse.press(self._buttons[button])
+        try:
+            self.move_to(x + dx, y + dy, duration)
+        finally:
+            self._mouse.release(self._buttons[button])
+
+
+# 白名单键名 -> X11 keysym 名称
+_X11_KEYSYMS = {
+    "space": "space", "enter": "Return", "esc": "Escape", "tab": "Tab", "backspace": "BackSpace",
+    "up": "Up", "down": "Down", "left": "Left", "right": "Right",
+    **{f"f{i}": f"F{i}" for i in range(1, 13)},
+}
+_X11_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class XTestBackend(InputBackend):
+    """X11 XTest 后端（python-xlib），事件直接由 X 服务器注入"""
+
+    name = "xtest"
+
+    def __init__(self, display: Optional[str] = None):
+        try:
+            from Xlib import X, XK
+            from Xlib import display as xdisplay
+            from Xlib.ext import xtest
+        except ImportError:
+            raise RuntimeError("需要安装 python-xlib")
+        self._X, self._XK, self._xtest = X, XK, xtest
+        try:
+            self._display = xdisplay.Display(display)
+        except Exception as e:
+            raise RuntimeError(f"无法连接 X 显示：{e}")
+        self._root = self._display.screen().root
+        self._cache: Dict[str, int] = {}
+
+    def _keycode(self, key: str) -> int:
+        code = self._cache.get(key)
+        if code is None:
+            keysym = self._XK.string_to_keysym(_X11_KEYSYMS.get(key, key))
+            code = self._display.keysym_to_keycode(keysym) if keysym else 0
+            if not code:
+                raise ValueError(f"XTest 无法映射按键：{key}")
+            self._cache[key] = code
+        return code
+
+    def _fake(self, event_type: int, detail: int = 0, **kw):
+        self._xtest.fake_input(self._display, event_type, detail, **kw)
+        self._display.flush()
+
+    def _key_down(self, key: str):
+        self._fake(self._X.KeyPress, self._keycode(key))
+
+    def _key_up(self, key: str):
+        self._fake(self._X.KeyRelease, self._keycode(key))
+
+    def position(self) -> Tuple[int, int]:
+        p = self._root.query_pointer()
+        return p.root_x, p.root_y
+
+    def _move(self, x: int, y: int):
+        self._fake(self._X.MotionNotify, x=x, y=y)
+
+    def click(self, button: str = "left", clicks: int = 1):
+        for _ in range(clicks):
+            self._fake(self._X.ButtonPress, _X11_BUTTONS[button])
+            self._fake(self._X.ButtonRelease, _X11_BUTTONS[button])
+
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        x, y = self.position()
+        self._fake(self._X.ButtonPress, _X11_BUTTONS[button])
+        try:
+            self.move_to(x + dx, y + dy, duration)
+        finally:
+            self._fake(self._X.ButtonRelease, _X11_BUTTONS[button])
+
+    def close(self):
+        self._display.close()
+
+
+class UInputBackend(InputBackend):
+    """Linux uinput 后端（python-evdev）：创建一个带绝对坐标轴的虚拟键鼠设备。
+    键码对应物理按键位置，与键盘布局无关；screen_size 为绝对坐标范围（通常是屏幕分辨率）
+    """
+
+    name = "uinput"
+
+    def __init__(self, screen_size: Tuple[int, int] = (1920, 1080), device_name: str = "srab-input"):
+        try:
+            from evdev import AbsInfo, UInput, ecodes
+        except ImportError:
+            raise RuntimeError("需要安装 evdev（python-evdev）")
+        self._e = ecodes
+        self._codes: Dict[str, int] = {k: getattr(ecodes, f"KEY_{k.upper()}") for k in SAFE_KEYS
+                                       if hasattr(ecodes, f"KEY_{k.upper()}")}
+        self._buttons = {"left": ecodes.BTN_LEFT, "right": ecodes.BTN_RIGHT, "middle": ecodes.BTN_MIDDLE}
+        width, height = screen_size
+        caps = {
+            ecodes.EV_KEY: sorted(set(self._codes.values())) + list(self._buttons.values()),
+            ecodes.EV_ABS: [(ecodes.ABS_X, AbsInfo(0, 0, width - 1, 0, 0, 0)),
+                            (ecodes.ABS_Y, AbsInfo(0, 0, height - 1, 0, 0, 0))],
+        }
+        try:
+            self._ui = UInput(caps, name=device_name)
+        except OSError as e:
+            raise RuntimeError(f"无法打开 /dev/uinput（需要写权限）：{e}")
+        self._pos = (0, 0)
+
+    def _code(self, key: str) -> int:
+        code = self._codes.get(key)
+        if code is None:
+            raise ValueError(f"uinput 不支持的按键：{key}")
+        return code
+
+    def _emit(self, ev_type: int, code: int, value: int):
+        self._ui.write(ev_type, code, value)
+        self._ui.syn()
+
+    def _key_down(self, key: str):
+        self._emit(self._e.EV_KEY, self._code(key), 1)
+
+    def _key_up(self, key: str):
+        self._emit(self._e.EV_KEY, self._code(key), 0)
+
+    def position(self) -> Tuple[int, int]:
+        # 虚拟设备无法读取系统指针位置，返回本设备最后一次设置的位置
+        return self._pos
+
+    def _move(self, x: int, y: int):
+        self._ui.write(self._e.EV_ABS, self._e.ABS_X, x)
+        self._ui.write(self._e.EV_ABS, self._e.ABS_Y, y)
+        self._ui.syn()
+        self._pos = (x, y)
+
+    def click(self, button: str = "left", clicks: int = 1):
+        for _ in range(clicks):
+            self._emit(self._e.EV_KEY, self._buttons[button], 1)
+            self._emit(self._e.EV_KEY, self._buttons[button], 0)
+
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        x, y = self._pos
+        self._emit(self._e.EV_KEY, self._buttons[button], 1)
+        try:
+            self.move_to(x + dx, y + dy, duration)
+        finally:
+            self._emit(self._e.EV_KEY, self._buttons[button], 0)
+
+    def close(self):
+        self._ui.close()
+
+
+class RecordingBackend(InputBackend):
+    """不发送事件的后端，按顺序记录 (操作, 参数...)；长按与移动动画不等待"""
+
+    name = "recording"
+
+    def __init__(self):
+        self.events: List[Tuple[Any, ...]] = []
+        self._pos = (0, 0)
+
+    @property
+    def keys(self) -> List[str]:
+        """按下过的键（press 与 hold），按发送顺序"""
+        return [ev[1] for ev in self.events if ev[0] in ("press", "hold")]
+
+    def press(self, key: str):
+        self.events.append(("press", self._check(key)))
+
+    def hold(self, key: str, duration: float):
+        self.events.append(("hold", self._check(key), duration))
+
+    def _key_down(self, key: str):
+        self.events.append(("key_down", key))
+
+    def _key_up(self, key: str):
+        self.events.append(("key_up", key))
+
+    def write(self, text: str, interval: float = 0.0):
+        for ch in text:
+            self._check(ch)
+        self.events.append(("write", text))
+
+    def position(self) -> Tuple[int, int]:
+        return self._pos
+
+    def move_to(self, x: int, y: int, duration: float = 0.0):
+        self._move(x, y)
+
+    def _move(self, x: int, y: int):
+        self.events.append(("move", x, y))
+        self._pos = (x, y)
+
+    def click(self, button: str = "left", clicks: int = 1):
+        self.events.append(("click", button, clicks))
+
+    def drag(self, dx: int, dy: int, duration: float = 0.0, button: str = "left"):
+        self.events.append(("drag", dx, dy, button))
+        self._pos = (self._pos[0] + dx, self._pos[1] + dy)
+
+
+BACKENDS: Dict[str, Type[InputBackend]] = {
+    cls.name: cls for cls in (PyAutoGUIBackend, PynputBackend, XTestBackend, UInputBackend, RecordingBackend)
+}
+
+
+def create_backend(name: Optional[str] = None, **options: Any) -> InputBackend:
+    """按名称创建输入后端；依赖缺失或设备不可用时抛出 RuntimeError"""
+    name = (name or "pyautogui").lower()
+    cls = BACKENDS.get(name)
+    if cls is None:
+        raise ValueError(f"不支持的输入后端: {name}，可选 {', '.join(BACKENDS)}")
+    return cls(**options)
@@ -1,18 +1,17 @@
 """
 星穹铁道AI自动战斗系统 - 游戏控制模块
-负责模拟鼠标键盘操作（带安全开关与可配置键位）
+负责模拟鼠标键盘操作（带安全开关与可配置键位），实际发送由可替换的输入后端完成（见 backends.py）
 """
 
 from __future__ import annotations
 
-import time
-from typing import Tuple, Dict, Optional
+from typing import Tuple, Dict, List, Optional
 import logging
 
+from .backends import SAFE_KEYS, InputBackend, PyAutoGUIBackend, RecordingBackend, is_key_safe
+
 # Lazy import to avoid display issues
 _pyautogui = None
-_pynput_mouse = None
-_pynput_keyboard = None
 
 def _get_pyautogui():
     global _pyautogui
@@ -21,14 +20,6 @@ def _get_pyautogui():
         _pyautogui = pyautogui
     return _pyautogui
 
-def _get_pynput():
-    global _pynput_mouse, _pynput_keyboard
-    if _pynput_mouse is None or _pynput_keyboard is None:
-        from pynput import mouse, keyboard
-        _pynput_mouse = mouse
-        _pynput_keyboard = keyboard
-    return _pynput_mouse, _pynput_keyboard
-
 
 class GameController:
     """游戏控制核心类
@@ -36,19 +27,10 @@ class GameController:
     - 支持通过 config 提供的 keybinds 自定义键位
     - 内置安全开关：未开启 enable_inputs 时不发送任何按键事件
     - 简单安全白名单：忽略包含 ctrl/alt/win/command 等组合键，避免危险操作
+    - backend 为输入后端（默认 pyautogui），可换成 pynput / xtest / uinput / recording
     """
 
-    SAFE_KEYS = {
-        # 字母
-        *list("abcdefghijklmnopqrstuvwxyz"),
-        # 数字
-        *list("0123456789"),
-        # 常用功能键
-        "space", "enter", "esc", "tab", "backspace",
-        "up", "down", "left", "right",
-        # F1-F12
-        *[f"f{i}" for i in range(1, 13)],
-    }
+    SAFE_KEYS = SAFE_KEYS
 
     DEFAULT_BINDS = {
         "basic_attack": "q",  # 普通攻击
@@ -65,13 +47,19 @@ class GameController:
         "cancel": "backspace",
     }
 
-    def __init__(self, keybinds: Optional[Dict[str, str]] = None, enable_inputs: bool = False):
+    def __init__(self, keybinds: Optional[Dict[str, str]] = None, enable_inputs: bool = False,
+                 pause: Optional[float] = None, move_duration: float = 0.2, backend: Optional[InputBackend] = None):
         self.logger = logging.getLogger(__name__)
         self.screen_width = None
         self.screen_height = None
         self.current_mouse_pos = (0, 0)
         self.enable_inputs = enable_inputs
         self.keybinds: Dict[str, str] = {**self.DEFAULT_BINDS, **(keybinds or {})}
+        self.backend: InputBackend = backend or PyAutoGUIBackend(pause)
+        # 鼠标移动动画时长
+        self.move_duration = move_duration
+        # 可选的会话录制器（storage.session.SessionRecorder），记录每次键鼠操作
+        self.recorder = None
     
     def _ensure_screen_size(self):
         """Lazy initialization of screen size"""
@@ -80,70 +68,73 @@ class GameController:
             self.screen_width, self.screen_height = pyautogui.size()
 
     # ---- 设置与安全 ----
-    def update_settings(self, keybinds: Optional[Dict[str, str]] = None, enable_inputs: Optional[bool] = None):
+    def update_settings(self, keybinds: Optional[Dict[str, str]] = None, enable_inputs: Optional[bool] = None,
+                        pause: Optional[float] = None, move_duration: Optional[float] = None,
+                        backend: Optional[InputBackend] = None):
+        if backend is not None:
+            self.backend = backend
+        if pause is not None and isinstance(self.backend, PyAutoGUIBackend):
+            # pyautogui 每次调用后的停顿，其默认 0.1 秒
+            self.backend.pause = float(pause)
+        if move_duration is not None:
+            self.move_duration = float(move_duration)
         if keybinds is not None:
             self.keybinds = {**self.DEFAULT_BINDS, **keybinds}
         if enable_inputs is not None:
             self.enable_inputs = bool(enable_inputs)
-        self.logger.info(f"输入{'已启用' if self.enable_inputs else '未启用'}，键位: {self.keybinds}")
+        self.logger.info(f"输入{'已启用' if self.enable_inputs else '未启用'}（{self.backend.name}），键位: {self.keybinds}")
 
     def _is_key_safe(self, key: str) -> bool:
-        if not key:
-            return False
-        k = key.lower().strip()
-        # 拒绝包含危险组合的键
-        if any(x in k for x in ["ctrl", "alt", "win", "command", "+"]):
-            return False
-        # 允许 SAFE_KEYS 或者单字符（如 'z'）
-        return k in self.SAFE_KEYS or (len(k) == 1 and k.isprintable())
+        # 允许 SAFE_KEYS 或者单字符（如 'z'），拒绝包含危险组合的键；后端发送前会再检查一次
+        return is_key_safe(key, self.SAFE_KEYS)
 
     # ---- 鼠标 ----
-    def move_to(self, x: int, y: int, duration: float = 0.2):
-        pyautogui = _get_pyautogui()
-        pyautogui.moveTo(x, y, duration=duration)
+    def move_to(self, x: int, y: int, duration: Optional[float] = None):
+        if self.recorder is not None:
+            self.recorder.record_input("move_to", x=x, y=y)
+        self.backend.move_to(x, y, self.move_duration if duration is None else duration)
         self.current_mouse_pos = (x, y)
 
     def click(self, button: str = "left"):
-        pyautogui = _get_pyautogui()
-        pyautogui.click(button=button)
+        if self.recorder is not None:
+            self.recorder.record_input("click", button=button)
+        self.backend.click(button)
 
     def right_click(self):
         self.click("right")
 
     def double_click(self):
-        pyautogui = _get_pyautogui()
-        pyautogui.doubleClick()
+        self.backend.click(clicks=2)
 
     def drag(self, start_x: int, start_y: int, end_x: int, end_y: int, duration: float = 0.6):
-        pyautogui = _get_pyautogui()
-        pyautogui.drag(end_x - start_x, end_y - start_y, duration, button='left')
+        self.backend.drag(end_x - start_x, end_y - start_y, duration)
 
     # ---- 键盘 ----
     def press_key(self, key: str):
+        if self.recorder is not None:
+            self.recorder.record_input("key", key=key, sent=self.enable_inputs and self._is_key_safe(key))
         if not self.enable_inputs:
             self.logger.debug(f"[输入未启用] 忽略按键: {key}")
             return
         if not self._is_key_safe(key):
             self.logger.warning(f"[安全拦截] 忽略不安全按键: {key}")
             return
-        pyautogui = _get_pyautogui()
-        pyautogui.press(key)
+        self.backend.press(key)
 
     def hold_key(self, key: str, duration: float = 0.1):
+        if self.recorder is not None:
+            self.recorder.record_input("hold", key=key, duration=duration,
+                                       sent=self.enable_inputs and self._is_key_safe(key))
         if not self.enable_inputs or not self._is_key_safe(key):
             self.logger.debug(f"[输入未启用/不安全] 忽略长按: {key}")
             return
-        pyautogui = _get_pyautogui()
-        pyautogui.keyDown(key)
-        time.sleep(max(0.0, duration))
-        pyautogui.keyUp(key)
+        self.backend.hold(key, duration)
 
     def type_text(self, text: str, interval: float = 0.05):
         if not self.enable_inputs:
             self.logger.debug("[输入未启用] 忽略文本输入")
             return
-        pyautogui = _get_pyautogui()
-        pyautogui.write(text, interval=interval)
+        self.backend.write(text, interval)
 
     # ---- 语义动作 ----
     def press_action(self, action: str, default_key: Optional[str] = None):
@@ -201,9 +192,22 @@ class GameController:
         return pyautogui.screenshot()
 
     def get_mouse_position(self) -> Tuple[int, int]:
-        pyautogui = _get_pyautogui()
-        return pyautogui.position()
+        return self.backend.position()
 
     def get_pixel_color(self, x: int, y: int):
+        # 每次调用都截一整屏；检测多个 HUD 像素请用 image_recognition.probes.PixelProbeSet
         pyautogui = _get_pyautogui()
         return pyautogui.pixel(x, y)
+
+
+class NullController(GameController):
+    """不发送任何键鼠事件的控制器（RecordingBackend），供回放与无界面压测使用。
+    仍经过键位映射与安全白名单，实际会发送的按键依次记录在 sent_keys 中。
+    """
+
+    def __init__(self, keybinds: Optional[Dict[str, str]] = None):
+        super().__init__(keybinds=keybinds, enable_inputs=True, backend=RecordingBackend())
+
+    @property
+    def sent_keys(self) -> List[str]:
+        return self.backend.keys
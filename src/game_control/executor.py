@@ -0,0 +1,259 @@
+"""
+异步输入执行器
+- 独立线程从队列中取出输入批次，按计划时间依次发送，调用方提交后即可返回
+- 宏（如 "ultimate_3 → target_right → confirm"）编译为一个批次一次提交，中间不会插入其他输入
+- 相邻按键/点击之间保证最小间隔（min_key_interval），等待时先 sleep 再短暂自旋，误差在 1ms 内
+- 发送后可选地轮询画面缩略图，测量从发出第一个输入到画面变化（游戏响应）的延迟，记入 metrics.INPUT_REACTION
+- 实际发送仍经由 GameController（键位映射、输入开关、安全白名单与会话录制不变）
+"""
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from src.telemetry import metrics, tracing
+
+# 距离目标时间不足该值时改为自旋等待（Windows 默认定时器精度约 15ms）
+SPIN_THRESHOLD = 0.002
+# 画面缩略图宽度（像素），用于检测变化
+THUMB_WIDTH = 64
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InputEvent:
+    """一个输入事件。delay 为距上一个事件的最小间隔（秒），实际间隔不小于 min_key_interval"""
+    kind: str  # key | hold | click | move | wait
+    key: Optional[str] = None
+    x: Optional[int] = None
+    y: Optional[int] = None
+    duration: float = 0.0
+    delay: float = 0.0
+
+
+@dataclass
+class InputBatch:
+    """一次提交的输入批次，发送与测量结果在执行器线程中填写"""
+    events: List[InputEvent]
+    name: str = ""
+    submitted_at: float = field(default_factory=time.perf_counter)
+    issued_at: Optional[float] = None    # 第一个事件发出的时间（perf_counter）
+    dispatch_ms: Optional[float] = None  # 从第一个到最后一个事件发出的耗时
+    reaction_ms: Optional[float] = None  # 从第一个事件发出到画面变化，未检测到时为 None
+    error: Optional[str] = None
+    dispatched: threading.Event = field(default_factory=threading.Event, repr=False)
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout: Optional[float] = None, reaction: bool = False) -> bool:
+        """等待批次发送完成；reaction=True 时等到画面响应测量结束"""
+        return (self.done if reaction else self.dispatched).wait(timeout)
+
+
+Step = Union[str, InputEvent]
+
+
+def sleep_until(deadline: float):
+    """等待到 perf_counter() >= deadline"""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > SPIN_THRESHOLD:
+            time.sleep(remaining - SPIN_THRESHOLD)
+
+
+def frame_thumbnail(img: Any) -> np.ndarray:
+    """把 PIL 图像或 numpy 数组缩为灰度小图（float32），用于比较画面是否变化"""
+    if hasattr(img, "convert"):
+        w, h = img.size
+        step = max(1, w // THUMB_WIDTH)
+        img = img.convert("L").reduce(step) if step > 1 else img.convert("L")
+        return np.asarray(img, dtype=np.float32)
+    arr = np.asarray(img)
+    step = max(1, arr.shape[1] // THUMB_WIDTH)
+    arr = arr[::step, ::step]
+    if arr.ndim == 3:
+        arr = arr.mean(axis=2)
+    return arr.astype(np.float32)
+
+
+class InputExecutor:
+    """输入执行器：submit/run_macro 把步骤编译为批次放入队列，由后台线程按时发送"""
+
+    def __init__(self, controller, min_key_interval: float = 0.05, macros: Optional[Dict[str, Sequence[str]]] = None,
+                 frame_source: Optional[Callable[[], Any]] = None, reaction_timeout: float = 1.0,
+                 poll_interval: float = 0.02, change_threshold: float = 4.0):
+        """
+        Args:
+            controller: GameController，实际发送输入
+            min_key_interval: 相邻两个输入之间的最小间隔（秒）
+            macros: 宏名 -> 步骤列表，步骤可以是键位动作名、按键、其他宏名、"wait:秒" 或 "click:x,y"
+            frame_source: 返回当前画面（PIL 图像或 numpy 数组）的函数，为 None 时不测量响应延迟
+            reaction_timeout: 等待画面变化的最长时间（秒）
+            poll_interval: 轮询画面的间隔（秒）
+            change_threshold: 缩略图平均灰度差超过该值视为画面已变化
+        """
+        self.controller = controller
+        self.min_key_interval = max(0.0, float(min_key_interval))
+        self.macros: Dict[str, List[str]] = {k: list(v) for k, v in (macros or {}).items()}
+        self.frame_source = frame_source
+        self.reaction_timeout = reaction_timeout
+        self.poll_interval = poll_interval
+        self.change_threshold = change_threshold
+        self._queue: "queue.Queue[Optional[InputBatch]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._last_dispatch = 0.0
+        self.last_batch: Optional[InputBatch] = None
+        self._current: Optional[InputBatch] = None
+
+    # ---- 编译 ----
+    def compile(self, steps: Sequence[Step], _expanding: frozenset = frozenset()) -> List[InputEvent]:
+        """把步骤列表展开为事件列表。宏内部引用自身名字时按键位动作处理，
+        因此可以用同名宏扩展内置动作，如 "ultimate_3": ["ultimate_3", "target_right", "confirm"]"""
+        events: List[InputEvent] = []
+        pending_delay = 0.0
+        for step in steps:
+            if isinstance(step, InputEvent):
+                new = [step]
+            elif step in self.macros and step not in _expanding:
+                new = self.compile(self.macros[step], _expanding | {step})
+            elif step.startswith("wait:"):
+                pending_delay += float(step[5:])
+                continue
+            elif step.startswith("click:"):
+                x, y = (int(v) for v in step[6:].split(","))
+                new = [InputEvent("click", x=x, y=y)]
+            else:
+                key = self.controller.keybinds.get(step, step)
+                new = [InputEvent("key", key=key)]
+            if pending_delay and new:
+                new[0] = replace(new[0], delay=max(new[0].delay, pending_delay))
+                pending_delay = 0.0
+            events.extend(new)
+        if pending_delay:
+            events.append(InputEvent("wait", delay=pending_delay))
+        return events
+
+    # ---- 提交 ----
+    def submit(self, steps: Sequence[Step], name: str = "") -> InputBatch:
+        batch = InputBatch(self.compile(steps), name=name or "+".join(s if isinstance(s, str) else s.kind for s in steps))
+        self.start()
+        self._queue.put(batch)
+        return batch
+
+    def run_macro(self, name_or_steps: Union[str, Sequence[Step]], timeout: Optional[float] = 5.0) -> InputBatch:
+        """提交并等待发送完成（不等待画面响应）"""
+        steps = [name_or_steps] if isinstance(name_or_steps, str) else name_or_steps
+        batch = self.submit(steps)
+        if not batch.wait(timeout):
+            logger.warning(f"输入批次 {batch.name} 在 {timeout}s 内未发送完成")
+        return batch
+
+    # ---- 线程 ----
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> "InputExecutor":
+        if not self.running:
+            self._thread = threading.Thread(target=self._run, name="input-executor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        if self.running:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            watching = False
+            self._current = batch
+            try:
+                watching = self._execute(batch)
+            except Exception as e:
+                batch.error = str(e)
+                logger.error(f"执行输入批次 {batch.name} 失败：{e}")
+            finally:
+                batch.dispatched.set()
+                if not watching:
+                    batch.done.set()
+                self.last_batch = batch
+
+    def _execute(self, batch: InputBatch) -> bool:
+        """发送批次；开始测量响应延迟时返回 True（由测量线程设置 done）"""
+        measure = self.frame_source is not None and getattr(self.controller, "enable_inputs", False)
+        baseline = self._thumb() if measure else None
+        watching = False
+        with tracing.span("input_batch", "input", batch=batch.name, events=len(batch.events)):
+            for ev in batch.events:
+                gap = self.min_key_interval if ev.kind != "wait" else 0.0
+                sleep_until(self._last_dispatch + max(gap, ev.delay))
+                now = time.perf_counter()
+                if batch.issued_at is None and ev.kind != "wait":
+                    batch.issued_at = now
+                self._dispatch(ev)
+                # 长按与带移动的点击本身有耗时，间隔从发送结束算起
+                self._last_dispatch = time.perf_counter()
+                if baseline is not None and not watching and batch.issued_at is not None:
+                    # 第一个输入发出后立即开始轮询画面，与后续按键并行
+                    threading.Thread(target=self._measure_reaction, args=(batch, baseline),
+                                     name="input-reaction", daemon=True).start()
+                    watching = True
+        if batch.issued_at is not None:
+            batch.dispatch_ms = (time.perf_counter() - batch.issued_at) * 1000.0
+            metrics.INPUT_DISPATCH.observe(batch.dispatch_ms / 1000.0)
+        return watching
+
+    def _dispatch(self, ev: InputEvent):
+        ctrl = self.controller
+        if ev.kind == "key":
+            ctrl.press_key(ev.key)
+        elif ev.kind == "hold":
+            ctrl.hold_key(ev.key, ev.duration)
+        elif ev.kind == "click":
+            if ev.x is not None and ev.y is not None:
+                ctrl.move_to(ev.x, ev.y)
+            ctrl.click()
+        elif ev.kind == "move":
+            ctrl.move_to(ev.x, ev.y)
+        elif ev.kind != "wait":
+            raise ValueError(f"未知输入事件类型：{ev.kind}")
+
+    # ---- 响应延迟 ----
+    def _thumb(self) -> Optional[np.ndarray]:
+        try:
+            return frame_thumbnail(self.frame_source())
+        except Exception as e:
+            logger.debug(f"获取画面失败，跳过响应测量：{e}")
+            return None
+
+    def _measure_reaction(self, batch: InputBatch, baseline: np.ndarray):
+        """轮询画面直到与发送前不同；超时或下一批次开始发送时放弃"""
+        deadline = batch.issued_at + self.reaction_timeout
+        try:
+            while time.perf_counter() < deadline:
+                if self._current is not batch:
+                    return
+                t = time.perf_counter()
+                thumb = self._thumb()
+                if thumb is None:
+                    return
+                if thumb.shape == baseline.shape and float(np.abs(thumb - baseline).mean()) > self.change_threshold:
+                    batch.reaction_ms = (t - batch.issued_at) * 1000.0
+                    metrics.INPUT_REACTION.observe(batch.reaction_ms / 1000.0)
+                    return
+                sleep_until(t + self.poll_interval)
+        finally:
+            batch.done.set()
@@ -7,10 +7,14 @@ from .recognizer import ImageRecognizer
 from .ocr import OCR, OCRConfig, parse_basic_stats, parse_skill_text
 from .ai_vision_ocr import AIVisionOCR
 from .scanner import UIRegions, CharacterScanner, EnemyScanner
+from .probes import PixelProbe, PixelProbeSet
+from .roi import ROIRegistry, ResolvedRegion
 
 __all__ = [
     'ImageRecognizer',
     'OCR', 'OCRConfig', 'parse_basic_stats', 'parse_skill_text',
     'AIVisionOCR',
     'UIRegions', 'CharacterScanner', 'EnemyScanner',
+    'PixelProbe', 'PixelProbeSet',
+    'ROIRegistry', 'ResolvedRegion',
 ]
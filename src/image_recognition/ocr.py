@@ -17,6 +17,8 @@ from typing import Dict, Optional, Tuple, Any
 import numpy as np
 import cv2
 
+from src.telemetry import tracing
+
 # Lazy import to avoid display issues
 _pyautogui = None
 
@@ -68,6 +70,7 @@ class OCR:
             img = cv2.GaussianBlur(img, (self.cfg.blur, self.cfg.blur), 0)
         return img
 
+    @tracing.traced(cat="ocr")
     def image_to_text(self, image: np.ndarray) -> str:
         if pytesseract is None:
             return "[pytesseract 未安装：无法识别]"
@@ -105,6 +108,7 @@ _CH_KV = {
 }
 
 
+@tracing.traced(cat="parse")
 def parse_basic_stats(text: str) -> Dict[str, float]:
     txt = text.replace("\n", " ")
     result: Dict[str, float] = {}
@@ -129,6 +133,7 @@ _SKILL_NAME_PAT = re.compile(r"^([\u4e00-\u9fa5A-Za-z0-9·・\-\s]{2,})", re.M)
 _PERCENT_PAT = re.compile(r"([0-9]+(?:\.[0-9]+)?)\s*%")
 
 
+@tracing.traced(cat="parse")
 def parse_skill_text(text: str) -> Dict[str, Any]:
     data: Dict[str, Any] = {"raw": text}
     m = _SKILL_NAME_PAT.search(text)
@@ -0,0 +1,88 @@
+"""
+HUD 像素探针
+- 一组命名的像素点（x, y, 期望颜色, 容差），如大招就绪的光效、当前行动角色的标记
+- 在最近一帧画面上一次性求值：NumPy 高级索引一次取出所有像素，每个探针返回与期望颜色的距离与是否匹配，
+  几个到几十个探针耗时在微秒级；代替逐点调用 pyautogui.pixel（每次都要截一整屏）
+- 距离为各通道差的最大值，与 pyautogui.pixelMatchesColor 的 tolerance 语义一致
+- 配置（config.json 的 pixel_probes）：
+    {"ult_ready_1": {"x": 1710, "y": 905, "color": [255, 230, 120], "tolerance": 40}, ...}
+  也可以写成列表：[{"name": "ult_ready_1", "x": ..., ...}]
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_TOLERANCE = 30
+
+
+@dataclass(frozen=True)
+class PixelProbe:
+    name: str
+    x: int
+    y: int
+    color: Tuple[int, int, int]  # RGB
+    tolerance: int = DEFAULT_TOLERANCE
+
+
+class PixelProbeSet:
+    """探针集合；坐标与颜色在构造时整理为数组，求值时不再做任何 Python 层循环"""
+
+    def __init__(self, probes: Iterable[PixelProbe]):
+        self.probes: List[PixelProbe] = list(probes)
+        names = [p.name for p in self.probes]
+        if len(set(names)) != len(names):
+            raise ValueError("像素探针名称重复")
+        self.names: List[str] = names
+        self._ys = np.array([p.y for p in self.probes], dtype=np.intp)
+        self._xs = np.array([p.x for p in self.probes], dtype=np.intp)
+        self._colors = np.array([p.color for p in self.probes], dtype=np.int16).reshape(-1, 3)
+        self._tolerance = np.array([p.tolerance for p in self.probes], dtype=np.int16)
+        # 已校验过的画面尺寸 (height, width)
+        self._checked: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def from_config(cls, cfg: Union[Dict[str, Any], Sequence[Dict[str, Any]], None]) -> "PixelProbeSet":
+        items = cfg.items() if isinstance(cfg, dict) else ((c.get("name"), c) for c in (cfg or []))
+        probes = []
+        for name, c in items:
+            if not name:
+                raise ValueError("像素探针缺少 name")
+            color = tuple(int(v) for v in c["color"])
+            if len(color) != 3:
+                raise ValueError(f"像素探针 {name} 的 color 必须是 [R, G, B]")
+            probes.append(PixelProbe(str(name), int(c["x"]), int(c["y"]), color,
+                                     int(c.get("tolerance", DEFAULT_TOLERANCE))))
+        return cls(probes)
+
+    def __len__(self) -> int:
+        return len(self.probes)
+
+    def validate(self, shape: Tuple[int, ...]):
+        """检查所有探针都落在 shape=(height, width, ...) 的画面内"""
+        height, width = int(shape[0]), int(shape[1])
+        bad = [p.name for p in self.probes if not (0 <= p.x < width and 0 <= p.y < height)]
+        if bad:
+            raise ValueError(f"像素探针超出画面 {width}x{height}：{', '.join(bad)}")
+        self._checked = (height, width)
+
+    def distances(self, frame: np.ndarray, bgr: bool = False) -> np.ndarray:
+        """每个探针的像素与期望颜色的距离（各通道差的最大值），frame 为 HxWx3(4) 的 RGB 数组"""
+        if self._checked != frame.shape[:2]:
+            self.validate(frame.shape)
+        pixels = frame[self._ys, self._xs, :3].astype(np.int16)
+        if bgr:
+            pixels = pixels[:, ::-1]
+        return np.abs(pixels - self._colors).max(axis=1)
+
+    def evaluate(self, frame: np.ndarray, bgr: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 (是否匹配的布尔数组, 距离数组)，顺序与 names 相同"""
+        dist = self.distances(frame, bgr)
+        return dist <= self._tolerance, dist
+
+    def check(self, frame: np.ndarray, bgr: bool = False) -> Dict[str, bool]:
+        """名称 -> 是否匹配"""
+        matches, _ = self.evaluate(frame, bgr)
+        return dict(zip(self.names, matches.tolist()))
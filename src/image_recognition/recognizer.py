@@ -6,9 +6,11 @@
 import cv2
 import numpy as np
 import time
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional, Union
 import logging
 
+from .roi import ROIRegistry, ResolvedRegion
+
 # Lazy import to avoid display issues
 _pyautogui = None
 
@@ -25,7 +27,9 @@ class ImageRecognizer:
     def __init__(self):
         self.screen_width = None
         self.screen_height = None
-        self.templates = {}  # 存储模板图像
+        self.templates = {}  # 存储模板图像（按 UI 参考分辨率采集）
+        self.roi: Optional[ROIRegistry] = None  # 设置后可按区域名匹配，模板按实际分辨率缩放
+        self._scaled_templates: Dict[Tuple[str, Tuple[int, int]], np.ndarray] = {}
         self.logger = logging.getLogger(__name__)
     
     def _ensure_screen_size(self):
@@ -45,19 +49,43 @@ class ImageRecognizer:
         screenshot = pyautogui.screenshot()
         return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
 
-    def find_template(self, template_name: str, threshold: float = 0.8) -> Tuple[bool, Tuple[int, int]]:
-        """查找模板图像位置"""
+    def _template(self, template_name: str) -> np.ndarray:
+        """按 ROI 注册表的缩放比例缩放后的模板，同一尺寸只缩放一次"""
+        template = self.templates[template_name]
+        if self.roi is None or self.roi.scale == (1.0, 1.0):
+            return template
+        key = (template_name, self.roi.size)
+        scaled = self._scaled_templates.get(key)
+        if scaled is None:
+            sx, sy = self.roi.scale
+            h, w = template.shape[:2]
+            scaled = cv2.resize(template, (max(1, round(w * sx)), max(1, round(h * sy))),
+                                interpolation=cv2.INTER_AREA)
+            self._scaled_templates[key] = scaled
+        return scaled
+
+    def find_template(self, template_name: str, threshold: float = 0.8,
+                      region: Union[ResolvedRegion, str, None] = None) -> Tuple[bool, Tuple[int, int]]:
+        """查找模板图像位置；指定 region（解析后的区域或 self.roi 中的区域名）时只在该区域内匹配，返回整屏坐标"""
         if template_name not in self.templates:
             return False, (0, 0)
 
-        template = self.templates[template_name]
         screen = self.capture_screen()
+        if self.roi is not None:
+            self.roi.ensure((screen.shape[1], screen.shape[0]))
+        template = self._template(template_name)
+        left = top = 0
+        if region is not None:
+            rect = self.roi.rect(region) if isinstance(region, str) else region
+            screen, left, top = rect.crop(screen), rect.left, rect.top
+        if screen.shape[0] < template.shape[0] or screen.shape[1] < template.shape[1]:
+            return False, (0, 0)
 
         result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
         min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
 
         if max_val >= threshold:
-            return True, max_loc
+            return True, (max_loc[0] + left, max_loc[1] + top)
         return False, (0, 0)
 
     def detect_health_bars(self) -> List[Dict]:
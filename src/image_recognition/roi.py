@@ -0,0 +1,226 @@
+"""
+与分辨率无关的 UI 区域（ROI）注册表
+- config.json 的 ui_regions 与 pixel_probes 按 ui_reference_resolution 下的像素坐标填写
+  （未设置时以首次解析时的截图尺寸为参考，即不缩放）
+- 启动时（以及截图尺寸变化、即窗口缩放时）一次性解析为实际截图尺寸下的整数坐标与切片，并校验不超出画面；
+  超出画面的条目记入 invalid，只有取用该条目时才报错，其余区域与探针照常可用
+- 截图、OCR、模板匹配与像素探针直接使用解析结果，调用处不再做 tuple(...) 或缩放换算
+- 三种条目：矩形 [left, top, width, height]、点 [x, y]、点列表 [[x, y], ...]；值为 None 的条目忽略
+- 宽高比变化时两个轴分别缩放
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .probes import PixelProbe, PixelProbeSet
+
+Size = Tuple[int, int]  # (width, height)
+Point = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class ResolvedRegion:
+    """解析后的矩形区域（实际截图像素）"""
+    name: str
+    left: int
+    top: int
+    width: int
+    height: int
+    # 对 HxW(xC) 画面数组的 (行, 列) 切片
+    slices: Tuple[slice, slice] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "slices", (slice(self.top, self.top + self.height),
+                                            slice(self.left, self.left + self.width)))
+
+    @property
+    def region(self) -> Tuple[int, int, int, int]:
+        """(left, top, width, height)，可直接传给截图与 OCR"""
+        return self.left, self.top, self.width, self.height
+
+    @property
+    def center(self) -> Point:
+        return self.left + self.width // 2, self.top + self.height // 2
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """从整帧画面中取出该区域（视图，不复制）"""
+        return frame[self.slices]
+
+
+def screen_size() -> Optional[Size]:
+    """当前屏幕尺寸；没有图形环境或未安装 pyautogui 时返回 None"""
+    try:
+        import pyautogui
+        w, h = pyautogui.size()
+        return int(w), int(h)
+    except Exception:
+        return None
+
+
+class ROIRegistry:
+    """ui_regions 的解析结果；region/rect/point/points 按名称取值，未解析时按参考分辨率解析"""
+
+    def __init__(self, regions: Optional[Dict[str, Any]] = None, reference: Optional[Sequence[int]] = None,
+                 probes: Optional[PixelProbeSet] = None):
+        self.reference: Optional[Size] = (int(reference[0]), int(reference[1])) if reference else None
+        self._raw: Dict[str, Any] = {k: v for k, v in (regions or {}).items() if v is not None}
+        self._ref_probes = probes
+        self.size: Optional[Size] = None
+        # 实际尺寸 / 参考分辨率，模板等按参考分辨率采集的素材据此缩放
+        self.scale: Tuple[float, float] = (1.0, 1.0)
+        self.probes: Optional[PixelProbeSet] = None
+        self._rects: Dict[str, ResolvedRegion] = {}
+        self._points: Dict[str, Point] = {}
+        self._point_lists: Dict[str, List[Point]] = {}
+        # 上次解析时超出画面的条目：名称 -> 解析后的坐标说明；像素探针记在 "pixel_probes" 下
+        self.invalid: Dict[str, str] = {}
+        for name, value in self._raw.items():
+            self._kind(name, value)  # 载入时即检查格式
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "ROIRegistry":
+        probes = cfg.get("pixel_probes")
+        return cls(cfg.get("ui_regions"), cfg.get("ui_reference_resolution"),
+                   PixelProbeSet.from_config(probes) if probes else None)
+
+    @classmethod
+    def coerce(cls, ui_regions: Union["ROIRegistry", Dict[str, Any], None]) -> "ROIRegistry":
+        """兼容直接传 ui_regions 字典的调用方：缺少的条目用默认配置补齐"""
+        if isinstance(ui_regions, ROIRegistry):
+            return ui_regions
+        from src.config import DEFAULT_CONFIG
+        return cls({**DEFAULT_CONFIG["ui_regions"], **(ui_regions or {})})
+
+    @staticmethod
+    def _kind(name: str, value: Any) -> str:
+        try:
+            if len(value) == 4 and all(isinstance(v, (int, float)) for v in value):
+                return "rect"
+            if len(value) == 2 and all(isinstance(v, (int, float)) for v in value):
+                return "point"
+            if all(len(p) == 2 for p in value):
+                return "points"
+        except TypeError:
+            pass
+        raise ValueError(f"UI 区域 {name} 格式不正确：{value!r}，应为 [左, 上, 宽, 高]、[x, y] 或 [[x, y], ...]")
+
+    # ---- 解析 ----
+    def resolve(self, size: Sequence[int]) -> "ROIRegistry":
+        """按实际截图尺寸 (width, height) 解析全部条目；超出画面的条目记入 invalid 而不是整体失败"""
+        width, height = int(size[0]), int(size[1])
+        if self.reference is None:
+            self.reference = (width, height)
+        sx, sy = width / self.reference[0], height / self.reference[1]
+
+        def point(x: float, y: float) -> Point:
+            return int((x + 0.5) * sx), int((y + 0.5) * sy)
+
+        def inside(p: Point) -> bool:
+            return 0 <= p[0] < width and 0 <= p[1] < height
+
+        rects: Dict[str, ResolvedRegion] = {}
+        points: Dict[str, Point] = {}
+        lists: Dict[str, List[Point]] = {}
+        invalid: Dict[str, str] = {}
+        for name, value in self._raw.items():
+            kind = self._kind(name, value)
+            if kind == "rect":
+                l, t, w, h = value
+                left, top = round(l * sx), round(t * sy)
+                r = ResolvedRegion(name, left, top, round((l + w) * sx) - left, round((t + h) * sy) - top)
+                if r.width > 0 and r.height > 0 and r.left >= 0 and r.top >= 0 \
+                        and r.left + r.width <= width and r.top + r.height <= height:
+                    rects[name] = r
+                else:
+                    invalid[name] = str(list(r.region))
+            elif kind == "point":
+                p = point(*value)
+                if inside(p):
+                    points[name] = p
+                else:
+                    invalid[name] = str(p)
+            else:
+                pts = [point(*p) for p in value]
+                bad = [p for p in pts if not inside(p)]
+                if bad:
+                    invalid[name] = ", ".join(map(str, bad))
+                else:
+                    lists[name] = pts
+        # 探针单独校验：超出画面的探针去掉并记录，其余照常求值
+        probes = None
+        if self._ref_probes is not None:
+            scaled = [PixelProbe(p.name, *point(p.x, p.y), p.color, p.tolerance) for p in self._ref_probes.probes]
+            bad = [p.name for p in scaled if not inside((p.x, p.y))]
+            if bad:
+                invalid["pixel_probes"] = ", ".join(bad)
+            probes = PixelProbeSet(p for p in scaled if inside((p.x, p.y)))
+            probes.validate((height, width))
+        self._rects, self._points, self._point_lists, self.probes = rects, points, lists, probes
+        self.size, self.scale, self.invalid = (width, height), (sx, sy), invalid
+        return self
+
+    def problems(self) -> Optional[str]:
+        """上次解析中超出画面的条目说明，全部有效时为 None"""
+        if not self.invalid or self.size is None:
+            return None
+        return (f"UI 区域超出 {self.size[0]}x{self.size[1]} 画面（参考分辨率 {self.reference[0]}x{self.reference[1]}）："
+                + "；".join(f"{k}={v}" for k, v in self.invalid.items()))
+
+    def ensure(self, size: Sequence[int]) -> bool:
+        """截图尺寸与上次解析不同时重新解析，返回是否重新解析"""
+        if self.size is not None and self.size[0] == size[0] and self.size[1] == size[1]:
+            return False
+        self.resolve(size)
+        return True
+
+    def _resolved(self):
+        if self.size is None:
+            self.resolve(self.reference or screen_size() or (1920, 1080))
+
+    def _check_valid(self, name: str):
+        if name in self.invalid:
+            raise ValueError(f"UI 区域 {name}={self.invalid[name]} 超出 {self.size[0]}x{self.size[1]} 画面，"
+                             f"请检查 ui_regions 与 ui_reference_resolution")
+
+    # ---- 取值 ----
+    def rect(self, name: str) -> ResolvedRegion:
+        self._resolved()
+        self._check_valid(name)
+        try:
+            return self._rects[name]
+        except KeyError:
+            raise ValueError(f"未配置的 UI 区域：{name}") from None
+
+    def region(self, name: str) -> Tuple[int, int, int, int]:
+        return self.rect(name).region
+
+    def point(self, name: str) -> Optional[Point]:
+        self._resolved()
+        self._check_valid(name)
+        return self._points.get(name)
+
+    def points(self, name: str) -> List[Point]:
+        self._resolved()
+        self._check_valid(name)
+        return self._point_lists.get(name, [])
+
+    @property
+    def has_probes(self) -> bool:
+        return self._ref_probes is not None and len(self._ref_probes) > 0
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._raw
+
+    def ui_regions(self):
+        """OCR 扫描器使用的 UIRegions"""
+        from .scanner import UIRegions
+        return UIRegions(
+            character_stats=self.region("character_stats"),
+            skill_buttons=self.points("skill_buttons"),
+            skill_detail_region=self.region("skill_detail_region"),
+            enemy_panel=self.region("enemy_panel"),
+            detail_button=self.point("detail_button"),
+        )
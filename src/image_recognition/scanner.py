@@ -12,11 +12,11 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
-import time
 import logging
 
 from .ocr import OCR, OCRConfig, parse_basic_stats, parse_skill_text
 from src.game_control.controller import GameController
+from src.telemetry import tracing
 
 
 @dataclass
@@ -54,9 +54,9 @@ class CharacterScanner:
         for (x, y) in ui.skill_buttons:
             # 点击技能按钮，先读取“粗略描述”，再（可选）点击“详情”读取更详细描述
             try:
-                self.ctrl.move_to(x, y, duration=0.2)
+                self.ctrl.move_to(x, y)
                 self.ctrl.click()
-                time.sleep(delay)
+                tracing.sleep(delay, "scan.skill_open")
 
                 # 先读取粗略描述（通常为技能面板初始文本区域）
                 brief_txt = self.ocr.ocr_region(ui.skill_detail_region)
@@ -67,9 +67,9 @@ class CharacterScanner:
 
                 # 若提供了“详情”按钮坐标，则点击后读取更详细描述
                 if ui.detail_button:
-                    self.ctrl.move_to(ui.detail_button[0], ui.detail_button[1], duration=0.2)
+                    self.ctrl.move_to(ui.detail_button[0], ui.detail_button[1])
                     self.ctrl.click()
-                    time.sleep(delay)
+                    tracing.sleep(delay, "scan.detail_open")
                     detail_txt = self.ocr.ocr_region(ui.skill_detail_region)
                     detail_parsed = parse_skill_text(detail_txt)
 
@@ -82,7 +82,7 @@ class CharacterScanner:
 
                 # 关闭详情/面板（若有）
                 self.ctrl.press_key('esc')
-                time.sleep(0.2)
+                tracing.sleep(0.2, "scan.close")
             except Exception as e:
                 self.logger.warning(f"扫描技能失败：{e}")
         return results
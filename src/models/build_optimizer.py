@@ -0,0 +1,275 @@
+"""
+遗器 / 光锥配装优化
+- 输入：角色配置（base_stats 等）与库存（按部位的遗器列表、光锥列表）
+- 目标：期望伤害（damage）、速度阈值（spd）或等效生命（ehp），可附加最低属性约束
+- 每个部位的遗器整理为按 RELIC_STAT_FIELDS 列索引的数组表，先做帕累托支配剪枝，
+  再用分支定界（默认）或集束搜索选出每个部位一件遗器和一把光锥
+
+属性公式与 Character.compute 保持一致；所有目标和约束对各词条单调不减，
+因此“当前已选 + 剩余部位逐词条最大值”即为合法上界。
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .character import RELIC_STAT_FIELDS, character_from_config
+
+RELIC_SLOTS = ("head", "hands", "body", "feet", "sphere", "rope")
+LIGHT_CONE_SLOT = "light_cone"
+TARGETS = ("damage", "spd", "ehp")
+# spd 目标：先满足速度（阈值内每点速度的权重远大于伤害），再比较期望伤害
+SPD_WEIGHT = 1e6
+
+_IDX = {name: i for i, name in enumerate(RELIC_STAT_FIELDS)}
+
+# 各衍生指标依赖的词条，用于判断支配关系时只比较相关列
+_METRIC_STATS: Dict[str, Tuple[str, ...]] = {
+    "atk": ("atk_percent", "atk_flat"),
+    "hp": ("hp_percent", "hp_flat"),
+    "def": ("def_percent", "def_flat"),
+    "spd": ("speed",),
+    "crit_rate": ("crit_rate",),
+    "crit_dmg": ("crit_dmg",),
+    "energy_regen": ("energy_regen",),
+    "break_effect": ("break_effect",),
+    "effect_hit": ("effect_hit",),
+    "ehp": ("hp_percent", "hp_flat", "def_percent", "def_flat"),
+    "damage": ("atk_percent", "atk_flat", "crit_rate", "crit_dmg"),
+}
+
+
+@dataclass
+class BuildResult:
+    target: str
+    score: float
+    relics: Dict[str, Dict[str, Any]]  # 部位 -> 选中的遗器
+    light_cone: Optional[Dict[str, Any]]
+    computed: Dict[str, float]
+    method: str
+    search_space: int  # 剪枝前的组合总数
+    candidates_evaluated: int  # 计算过上界或得分的（部分）配装数
+    complete_evaluated: int  # 完整配装的得分计算次数
+    elapsed: float
+    pruned_pieces: Dict[str, int] = field(default_factory=dict)  # 各部位被支配剪掉的件数
+
+
+def _stat_vector(stats: Dict[str, Any]) -> np.ndarray:
+    vec = np.zeros(len(RELIC_STAT_FIELDS))
+    for k, v in (stats or {}).items():
+        if k in _IDX:
+            vec[_IDX[k]] = float(v or 0.0)
+    return vec
+
+
+def _metrics(base: Dict[str, float], x: np.ndarray) -> Dict[str, np.ndarray]:
+    """x: (m, D) 汇总后的词条数组；返回与 Character.compute 一致的衍生指标。"""
+    atk = base["atk"] * (1 + x[:, _IDX["atk_percent"]]) + x[:, _IDX["atk_flat"]]
+    hp = base["hp"] * (1 + x[:, _IDX["hp_percent"]]) + x[:, _IDX["hp_flat"]]
+    defense = base["def"] * (1 + x[:, _IDX["def_percent"]]) + x[:, _IDX["def_flat"]]
+    crit_rate = np.minimum(1.0, x[:, _IDX["crit_rate"]])
+    crit_dmg = x[:, _IDX["crit_dmg"]]
+    return {
+        "atk": atk,
+        "hp": hp,
+        "def": defense,
+        "spd": base["spd"] + x[:, _IDX["speed"]],
+        "crit_rate": crit_rate,
+        "crit_dmg": crit_dmg,
+        "energy_regen": x[:, _IDX["energy_regen"]],
+        "break_effect": x[:, _IDX["break_effect"]],
+        "effect_hit": x[:, _IDX["effect_hit"]],
+        "ehp": hp * (1.0 + defense / 1000.0),
+        "damage": atk * (1.0 + crit_rate * crit_dmg),
+    }
+
+
+class _Objective:
+    def __init__(self, base: Dict[str, float], target: str, constraints: Dict[str, float],
+                 spd_breakpoint: Optional[float]):
+        self.base = base
+        self.target = target
+        self.constraints = constraints
+        self.spd_breakpoint = spd_breakpoint
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """返回得分；不满足约束的行为 -inf。"""
+        m = _metrics(self.base, x)
+        if self.target == "damage":
+            score = m["damage"]
+        elif self.target == "ehp":
+            score = m["ehp"]
+        else:
+            spd = m["spd"] if self.spd_breakpoint is None else np.minimum(m["spd"], self.spd_breakpoint)
+            score = spd * SPD_WEIGHT + m["damage"]
+        ok = np.ones(len(x), dtype=bool)
+        for key, lo in self.constraints.items():
+            ok &= m[key] >= lo
+        return np.where(ok, score, -np.inf)
+
+    def relevant_columns(self) -> List[int]:
+        names = set(_METRIC_STATS["spd"] + _METRIC_STATS["damage"]) if self.target == "spd" \
+            else set(_METRIC_STATS[self.target])
+        for key in self.constraints:
+            names.update(_METRIC_STATS[key])
+        return sorted(_IDX[n] for n in names)
+
+
+def _pareto_keep(table: np.ndarray, cols: List[int]) -> np.ndarray:
+    """返回未被同部位其它遗器支配的行下标（相关列全部不差且至少一列更好；完全相同只保留第一件）。"""
+    sub = table[:, cols]
+    ge = (sub[None, :, :] >= sub[:, None, :]).all(axis=2)  # ge[i, j]: j 各列都不差于 i
+    gt = (sub[None, :, :] > sub[:, None, :]).any(axis=2)
+    n = len(sub)
+    earlier = np.tri(n, k=-1, dtype=bool)  # earlier[i, j]: j < i
+    dominated = (ge & (gt | earlier)).any(axis=1)
+    return np.flatnonzero(~dominated)
+
+
+def optimize_build(
+    character_cfg: Dict[str, Any],
+    inventory: Dict[str, Any],
+    target: str = "damage",
+    constraints: Optional[Dict[str, float]] = None,
+    spd_breakpoint: Optional[float] = None,
+    method: str = "bnb",
+    beam_width: int = 64,
+) -> BuildResult:
+    """
+    为单个角色选出最优配装。
+    - inventory: {"relics": [{"slot": "head", "stats": {...}, ...}], "light_cones": [{"name", "stats", ...}]}
+    - constraints: 最低属性约束，如 {"spd": 134, "crit_rate": 0.6}，键为衍生指标名
+    - spd_breakpoint: target="spd" 时的速度阈值，达到后改为比较期望伤害
+    - method: "bnb" 分支定界（精确）或 "beam" 集束搜索（近似，宽度 beam_width）
+    """
+    start = time.perf_counter()
+    if target not in TARGETS:
+        raise ValueError(f"不支持的优化目标: {target}")
+    if method not in ("bnb", "beam"):
+        raise ValueError(f"不支持的搜索方法: {method}")
+    constraints = dict(constraints or {})
+    for key in constraints:
+        if key not in _METRIC_STATS:
+            raise ValueError(f"不支持的约束: {key}")
+
+    base_cfg = character_cfg.get("base_stats", {}) or {}
+    base = {k: float(base_cfg.get(k, 0) or 0) for k in ("atk", "hp", "def", "spd")}
+    objective = _Objective(base, target, constraints, spd_breakpoint)
+    unconstrained = _Objective(base, target, {}, spd_breakpoint)
+
+    # 整理各部位的数组表；未出现在库存中的部位不参与
+    pieces: Dict[str, List[Dict[str, Any]]] = {}
+    for piece in inventory.get("relics", []) or []:
+        slot = piece.get("slot")
+        if slot not in RELIC_SLOTS:
+            raise ValueError(f"未知的遗器部位: {slot}")
+        pieces.setdefault(slot, []).append(piece)
+    light_cones = inventory.get("light_cones", []) or []
+    if light_cones:
+        pieces[LIGHT_CONE_SLOT] = light_cones
+
+    slots = [s for s in (*RELIC_SLOTS, LIGHT_CONE_SLOT) if pieces.get(s)]
+    search_space = int(np.prod([len(pieces[s]) for s in slots])) if slots else 1
+
+    cols = objective.relevant_columns()
+    tables: List[np.ndarray] = []
+    kept: List[np.ndarray] = []
+    pruned: Dict[str, int] = {}
+    for s in slots:
+        table = np.array([_stat_vector(p.get("stats", p)) for p in pieces[s]])
+        keep = _pareto_keep(table, cols)
+        pruned[s] = len(table) - len(keep)
+        # 单件得分（不计约束）高的排在前面，使分支定界尽早找到好的下界
+        solo = unconstrained(table[keep])
+        keep = keep[np.argsort(-solo, kind="stable")]
+        tables.append(table[keep])
+        kept.append(keep)
+
+    dim = len(RELIC_STAT_FIELDS)
+    # 库存未提供光锥时，角色配置中已装备的光锥作为固定加成
+    fixed = np.zeros(dim)
+    if not light_cones and character_cfg.get("light_cone"):
+        fixed = _stat_vector(character_cfg["light_cone"].get("stats") or {})
+
+    # suffix[k]: 第 k 个部位起各词条的最大可能值之和
+    suffix = np.zeros((len(slots) + 1, dim))
+    for k in range(len(slots) - 1, -1, -1):
+        suffix[k] = suffix[k + 1] + tables[k].max(axis=0)
+
+    counters = {"nodes": 0, "complete": 0}
+    best: Dict[str, Any] = {"score": -np.inf, "choice": None}
+
+    if not slots:
+        score = float(objective(fixed[None, :])[0])
+        best.update(score=score, choice=[])
+        counters["complete"] = 1
+    elif method == "bnb":
+        last = len(slots) - 1
+
+        def dfs(k: int, cur: np.ndarray, choice: List[int]):
+            child = cur + tables[k]
+            bound = objective(child + suffix[k + 1])
+            counters["nodes"] += len(child)
+            if k == last:
+                counters["complete"] += len(child)
+                j = int(np.argmax(bound))
+                if bound[j] > best["score"]:
+                    best.update(score=float(bound[j]), choice=choice + [j])
+                return
+            for j in np.argsort(-bound, kind="stable"):
+                if not bound[j] > best["score"]:
+                    break
+                dfs(k + 1, child[j], choice + [int(j)])
+
+        dfs(0, fixed, [])
+    else:
+        beams = fixed[None, :]
+        choices = np.zeros((1, 0), dtype=np.int64)
+        for k, table in enumerate(tables):
+            child = (beams[:, None, :] + table[None, :, :]).reshape(-1, dim)
+            child_choice = np.concatenate([
+                np.repeat(choices, len(table), axis=0),
+                np.tile(np.arange(len(table)), len(beams))[:, None],
+            ], axis=1)
+            bound = objective(child + suffix[k + 1])
+            counters["nodes"] += len(child)
+            top = np.argsort(-bound, kind="stable")[:beam_width]
+            top = top[np.isfinite(bound[top])]
+            beams, choices = child[top], child_choice[top]
+            if len(beams) == 0:
+                break
+        counters["complete"] = len(beams)
+        if len(beams):
+            best.update(score=float(objective(beams[:1])[0]), choice=[int(j) for j in choices[0]])
+
+    if best["choice"] is None:
+        raise ValueError("库存中没有满足约束的配装")
+
+    chosen = {s: pieces[s][int(kept[k][j])] for k, (s, j) in enumerate(zip(slots, best["choice"]))}
+    relic_sum = np.zeros(dim)
+    for s in RELIC_SLOTS:
+        if s in chosen:
+            relic_sum += _stat_vector(chosen[s].get("stats", chosen[s]))
+    light_cone = chosen.get(LIGHT_CONE_SLOT) or character_cfg.get("light_cone")
+    character = character_from_config({
+        **character_cfg,
+        "relics": {name: float(relic_sum[i]) for i, name in enumerate(RELIC_STAT_FIELDS)},
+        "light_cone": light_cone,
+    })
+
+    return BuildResult(
+        target=target,
+        score=round(best["score"], 4),
+        relics={s: p for s, p in chosen.items() if s != LIGHT_CONE_SLOT},
+        light_cone=light_cone,
+        computed=character.computed,
+        method=method,
+        search_space=search_space,
+        candidates_evaluated=counters["nodes"],
+        complete_evaluated=counters["complete"],
+        elapsed=round(time.perf_counter() - start, 4),
+        pruned_pieces=pruned,
+    )
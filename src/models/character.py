@@ -3,7 +3,7 @@
 """
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Dict, List, Optional
 
 
@@ -23,6 +23,10 @@ class RelicStats:
     energy_regen: float = 0.0
 
 
+# 遗器/光锥词条的固定顺序，供数组化计算（如配装优化）按列索引
+RELIC_STAT_FIELDS = tuple(f.name for f in fields(RelicStats))
+
+
 @dataclass
 class LightCone:
     name: str
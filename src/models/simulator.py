@@ -0,0 +1,262 @@
+"""
+蒙特卡洛战斗模拟器
+- 基于行动值（AV）时间轴逐步推进：角色与敌人按速度轮流行动
+- 模拟暴击判定、能量获取与终结技、战技点、弱点击破与击破延迟、敌方回合回复韧性
+- 在 NumPy 中对上万次试验做向量化计算，输出回合数分布（均值 / P50 / P90）
+
+说明：技能倍率、能量与韧性削减均为占位常量（未接入具体技能数据），
+用于比较队伍与方案的相对优劣，而非精确复现游戏内数值。
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 行动值：距离 10000 / 速度；首轮 150 AV，之后每轮 100 AV
+AV_DISTANCE = 10000.0
+FIRST_CYCLE_AV = 150.0
+CYCLE_AV = 100.0
+
+# 技能倍率（占位）：普攻 / 战技 / 终结技
+BASIC_MULT = 1.0
+SKILL_MULT = 2.0
+ULT_MULT = 3.5
+# 非输出命途的伤害折算（辅助/生存位的攻击更多用于增益）
+SUPPORT_PATHS = {"Harmony", "Nihility", "Preservation", "Abundance"}
+SUPPORT_DMG_SCALE = 0.4
+
+# 能量：上限、开场比例、各动作回能（均受能量回复效率加成）
+MAX_ENERGY = 120.0
+START_ENERGY_RATIO = 0.5
+BASIC_ENERGY = 20.0
+SKILL_ENERGY = 30.0
+ULT_ENERGY = 5.0
+HIT_ENERGY = 10.0
+
+# 战技点
+START_SKILL_POINTS = 3
+MAX_SKILL_POINTS = 5
+
+# 韧性削减（与敌人面板韧性同单位）与击破
+BASIC_TOUGHNESS = 10.0
+SKILL_TOUGHNESS = 20.0
+ULT_TOUGHNESS = 30.0
+UNBROKEN_DMG_MULT = 0.9
+BREAK_DELAY_RATIO = 0.25
+BREAK_LEVEL_MULT = 3767.5533  # 80 级击破基础系数
+BREAK_ELEMENT_MULT = {
+    "Physical": 2.0, "Fire": 2.0, "Wind": 1.5,
+    "Ice": 1.0, "Lightning": 1.0, "Quantum": 0.5, "Imaginary": 0.5,
+}
+DEFAULT_RESISTANCE = 0.2
+
+
+@dataclass
+class SimulationResult:
+    """回合数分布。counts[k] 为第 k 回合结束战斗的试验数（k 从 1 开始，0 号位不用）。"""
+    trials: int
+    max_rounds: int
+    counts: np.ndarray
+    clear_rate: float  # 在 max_rounds 内击杀的比例，其余按 max_rounds 计
+
+    def _pmf(self) -> np.ndarray:
+        return self.counts / max(1, self.trials)
+
+    @staticmethod
+    def _quantile(pmf: np.ndarray, q: float) -> int:
+        cdf = np.cumsum(pmf)
+        return int(np.searchsorted(cdf, q - 1e-12))
+
+    @property
+    def mean(self) -> float:
+        pmf = self._pmf()
+        return float((np.arange(len(pmf)) * pmf).sum())
+
+    @property
+    def p50(self) -> int:
+        return self._quantile(self._pmf(), 0.5)
+
+    @property
+    def p90(self) -> int:
+        return self._quantile(self._pmf(), 0.9)
+
+    def with_rerolls(self, max_retries: int) -> "SimulationResult":
+        """凹本：最多重开 max_retries 次并保留最好的一局，即 (max_retries + 1) 次独立试验取最小值。"""
+        attempts = max(1, int(max_retries) + 1)
+        cdf = np.cumsum(self._pmf())
+        best_cdf = 1.0 - (1.0 - np.clip(cdf, 0.0, 1.0)) ** attempts
+        pmf = np.diff(np.concatenate(([0.0], best_cdf)))
+        return SimulationResult(
+            trials=self.trials,
+            max_rounds=self.max_rounds,
+            counts=pmf * self.trials,
+            clear_rate=float(1.0 - (1.0 - self.clear_rate) ** attempts),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trials": self.trials,
+            "mean": round(self.mean, 3),
+            "p50": self.p50,
+            "p90": self.p90,
+            "clear_rate": round(self.clear_rate, 4),
+            "distribution": {
+                str(k): round(float(c) / max(1, self.trials), 4)
+                for k, c in enumerate(self.counts) if k > 0 and c > 0
+            },
+        }
+
+
+def _team_arrays(characters: List[Dict[str, Any]], enemy: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    weaknesses = set(enemy.get("weaknesses", []) or [])
+    resistances = enemy.get("resistances", {}) or {}
+
+    def col(key: str, default: float = 0.0) -> np.ndarray:
+        return np.array([float(c.get(key, default) or default) for c in characters], dtype=np.float64)
+
+    elements = [c.get("element") or "" for c in characters]
+    is_weak = np.array([e in weaknesses for e in elements], dtype=bool)
+    res = np.array([
+        float(resistances.get(e, 0.0 if e in weaknesses else DEFAULT_RESISTANCE) or 0.0) for e in elements
+    ])
+    dmg_scale = np.array([
+        SUPPORT_DMG_SCALE if (c.get("path") or "") in SUPPORT_PATHS else 1.0 for c in characters
+    ])
+    spd = col("spd", 100.0)
+    spd[spd <= 0] = 100.0
+    return {
+        "atk": col("atk"),
+        "crit_rate": np.clip(col("crit_rate"), 0.0, 1.0),
+        "crit_dmg": col("crit_dmg"),
+        "spd": spd,
+        "energy_mult": 1.0 + col("energy_regen"),
+        "break_effect": col("break_effect"),
+        "level": col("level", 80.0),
+        "is_weak": is_weak,
+        "res_mult": 1.0 - res,
+        "dmg_scale": dmg_scale,
+        "break_elem": np.array([BREAK_ELEMENT_MULT.get(e, 1.0) for e in elements]),
+    }
+
+
+def simulate_battle(
+    characters: List[Dict[str, Any]],
+    enemy: Dict[str, Any],
+    trials: int = 10000,
+    max_rounds: int = 20,
+    seed: Optional[int] = None,
+) -> SimulationResult:
+    """
+    对单个敌人进行 trials 次战斗模拟，返回回合数分布。
+    characters: 每项包含 atk/crit_rate/crit_dmg/spd/energy_regen/break_effect，可选 element/path/level
+    enemy: 包含 hp/def/spd/toughness/level/weaknesses/resistances
+    """
+    if not characters:
+        raise ValueError("模拟需要至少一名角色")
+    if float(enemy.get("hp", 0) or 0) <= 0:
+        raise ValueError("模拟需要敌人生命值 hp > 0")
+    rng = np.random.default_rng(seed)
+    team = _team_arrays(characters, enemy)
+    n_chars = len(characters)
+    enemy_idx = n_chars
+    rows = np.arange(trials)
+
+    hp_max = float(enemy.get("hp", 0) or 0)
+    toughness_max = float(enemy.get("toughness", 0) or 0)
+    enemy_spd = float(enemy.get("spd", 0) or 0) or 100.0
+    enemy_level = float(enemy.get("level", 90) or 90)
+    enemy_def = float(enemy.get("def", 0) or 0) or (200.0 + 10.0 * enemy_level)
+
+    # 防御区：(200 + 10 * 角色等级) / (敌方防御 + 200 + 10 * 角色等级)
+    atk_side = 200.0 + 10.0 * team["level"]
+    def_mult = atk_side / (enemy_def + atk_side)
+    hit_base = team["atk"] * team["dmg_scale"] * def_mult * team["res_mult"]
+    break_dmg = (
+        BREAK_LEVEL_MULT * team["break_elem"] * (0.5 + toughness_max / 40.0)
+        * (1.0 + team["break_effect"]) * def_mult * team["res_mult"]
+    )
+    can_break = team["is_weak"] & (toughness_max > 0)
+
+    av = AV_DISTANCE / np.concatenate((team["spd"], [enemy_spd]))
+    next_t = np.tile(av, (trials, 1))
+    hp = np.full(trials, hp_max)
+    toughness = np.full(trials, toughness_max)
+    broken = np.zeros(trials, dtype=bool)
+    energy = np.full((trials, n_chars), MAX_ENERGY * START_ENERGY_RATIO)
+    skill_points = np.full(trials, START_SKILL_POINTS)
+    kill_t = np.full(trials, np.inf)
+    alive = hp > 0
+    time_cap = FIRST_CYCLE_AV + CYCLE_AV * (max_rounds - 1)
+
+    def deal(mask: np.ndarray, ci: np.ndarray, mult: np.ndarray, toughness_cut: np.ndarray):
+        nonlocal broken
+        crit = rng.random(trials) < team["crit_rate"][ci]
+        dmg = hit_base[ci] * mult * (1.0 + crit * team["crit_dmg"][ci])
+        dmg = dmg * np.where(broken, 1.0, UNBROKEN_DMG_MULT)
+        np.subtract(hp, dmg, out=hp, where=mask)
+        cut = mask & can_break[ci] & ~broken
+        np.subtract(toughness, toughness_cut, out=toughness, where=cut)
+        newly = cut & (toughness <= 0)
+        if newly.any():
+            broken = broken | newly
+            toughness[newly] = 0.0
+            hp[newly] -= break_dmg[ci[newly]]
+            next_t[newly, enemy_idx] += BREAK_DELAY_RATIO * av[enemy_idx]
+
+    while True:
+        actor = next_t.argmin(axis=1)
+        t = next_t[rows, actor]
+        active = alive & (t < time_cap)
+        if not active.any():
+            break
+        is_enemy = actor == enemy_idx
+
+        # 敌方回合：若处于击破状态则恢复韧性；随机攻击一名角色为其回能
+        em = active & is_enemy
+        if em.any():
+            recover = em & broken
+            toughness[recover] = toughness_max
+            broken = broken & ~em
+            target = rng.integers(0, n_chars, size=trials)
+            gain = HIT_ENERGY * team["energy_mult"][target]
+            energy[rows[em], target[em]] = np.minimum(MAX_ENERGY, energy[rows[em], target[em]] + gain[em])
+
+        # 角色回合：能量满则先释放终结技，再按战技点决定战技或普攻
+        cm = active & ~is_enemy
+        if cm.any():
+            ci = np.minimum(actor, n_chars - 1)
+            ult = cm & (energy[rows, ci] >= MAX_ENERGY)
+            if ult.any():
+                deal(ult, ci, np.full(trials, ULT_MULT), np.full(trials, ULT_TOUGHNESS))
+                energy[rows[ult], ci[ult]] = ULT_ENERGY * team["energy_mult"][ci[ult]]
+            use_skill = cm & (skill_points >= 1)
+            skill_points = np.clip(skill_points + np.where(use_skill, -1, np.where(cm, 1, 0)), 0, MAX_SKILL_POINTS)
+            deal(
+                cm, ci,
+                np.where(use_skill, SKILL_MULT, BASIC_MULT),
+                np.where(use_skill, SKILL_TOUGHNESS, BASIC_TOUGHNESS),
+            )
+            gain = np.where(use_skill, SKILL_ENERGY, BASIC_ENERGY) * team["energy_mult"][ci]
+            energy[rows[cm], ci[cm]] = np.minimum(MAX_ENERGY, energy[rows[cm], ci[cm]] + gain[cm])
+
+        next_t[rows[active], actor[active]] += av[actor[active]]
+        dead = alive & (hp <= 0)
+        kill_t[dead] = t[dead]
+        alive &= ~dead
+
+    cleared = np.isfinite(kill_t)
+    rounds = np.full(trials, max_rounds, dtype=np.int64)
+    late = np.maximum(0.0, kill_t[cleared] - FIRST_CYCLE_AV)
+    rounds[cleared] = np.where(
+        kill_t[cleared] < FIRST_CYCLE_AV, 1, 2 + np.floor(late / CYCLE_AV).astype(np.int64)
+    )
+    rounds = np.clip(rounds, 1, max_rounds)
+    counts = np.bincount(rounds, minlength=max_rounds + 1).astype(np.float64)
+    return SimulationResult(
+        trials=trials,
+        max_rounds=max_rounds,
+        counts=counts,
+        clear_rate=float(cleared.mean()),
+    )
@@ -0,0 +1,358 @@
+"""
+角色 / 敌人的列式（struct-of-arrays）表示
+- RosterTable / EnemyTable 以固定列序的 NumPy 数组保存数值属性，字符串与少量杂项按行保存
+- 与配置字典（roster / enemy）可无损互转：未知字段保存在 extras 中原样写回；
+  输入的键、键序与数值的原始类型记在 extras["_layout"] 中，写回时按原样输出，不补出输入里没有的键
+- compute() 对所有行一次性向量化计算，公式与 Character.compute / Enemy.compute 一致
+
+用于队伍搜索、战斗模拟、配装优化等批量场景；单个角色的交互式计算仍使用 dataclass。
+"""
+from __future__ import annotations
+
+import copy
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .character import RELIC_STAT_FIELDS
+
+BASE_STAT_FIELDS = ("atk", "hp", "def", "spd")
+ENEMY_STAT_FIELDS = ("hp", "def", "spd", "toughness")
+ELEMENTS = ("Physical", "Fire", "Ice", "Lightning", "Wind", "Quantum", "Imaginary")
+
+_CHARACTER_KEYS = {"name", "path", "element", "level", "eidolon", "base_stats", "relics", "light_cone", "skill_levels"}
+_ENEMY_KEYS = {"name", "level", "weaknesses", "resistances", "buffs", "notes", "base_stats"}
+_R = {name: i for i, name in enumerate(RELIC_STAT_FIELDS)}
+_B = {name: i for i, name in enumerate(BASE_STAT_FIELDS)}
+_E = {name: i for i, name in enumerate(ENEMY_STAT_FIELDS)}
+
+
+def _row(values: Dict[str, Any], fields: Sequence[str]) -> List[float]:
+    return [float(values.get(k, 0.0) or 0.0) for k in fields]
+
+
+def _types(values: Dict[str, Any]) -> Dict[str, type]:
+    """记录字典的键序与各值的原始类型，供 _restore 写回。"""
+    return {k: type(v) for k, v in values.items()}
+
+
+def _restore(values: Dict[str, Any], types: Dict[str, type]) -> Dict[str, Any]:
+    """只输出 types 中的键并按其顺序排列；数值列里的 float 还原为输入时的 int / bool / None。"""
+    out = {}
+    for k, t in types.items():
+        v = values[k]
+        if t is type(None) and not v:
+            v = None
+        elif t in (int, bool) and isinstance(v, float) and v.is_integer():
+            v = t(v)
+        elif t is float and isinstance(v, int):
+            v = float(v)
+        out[k] = v
+    return out
+
+
+def _ordered(items: Sequence[str], order: Sequence[str]) -> List[str]:
+    """按 order 中的先后排列 items；不在 order 中的保持原有相对顺序，排在最后。"""
+    rank = {k: n for n, k in enumerate(order)}
+    return sorted(items, key=lambda k: rank.get(k, len(rank)))
+
+
+class RosterTable:
+    """
+    角色池的列式表：
+    - base: (n, 4) 按 BASE_STAT_FIELDS；relics / lc_stats: (n, D) 按 RELIC_STAT_FIELDS
+    - lc_meta[i] 为 None 表示未装备光锥，否则为光锥除 stats 外的字段（name/level/superimpose 等）
+    """
+    __slots__ = ("names", "paths", "elements", "level", "eidolon", "base", "relics",
+                 "lc_stats", "lc_meta", "skill_levels", "extras")
+
+    def __init__(self, names: List[str], paths: List[str], elements: List[str], level: np.ndarray,
+                 eidolon: np.ndarray, base: np.ndarray, relics: np.ndarray, lc_stats: np.ndarray,
+                 lc_meta: List[Optional[Dict[str, Any]]], skill_levels: List[Dict[str, int]],
+                 extras: List[Dict[str, Any]]):
+        self.names = names
+        self.paths = paths
+        self.elements = elements
+        self.level = level
+        self.eidolon = eidolon
+        self.base = base
+        self.relics = relics
+        self.lc_stats = lc_stats
+        self.lc_meta = lc_meta
+        self.skill_levels = skill_levels
+        self.extras = extras
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_configs(cls, cfgs: Sequence[Dict[str, Any]]) -> "RosterTable":
+        names, paths, elements, level, eidolon = [], [], [], [], []
+        base, relics, lc_stats, lc_meta, skill_levels, extras = [], [], [], [], [], []
+        for cfg in cfgs:
+            names.append(cfg.get("name", "unknown"))
+            paths.append(cfg.get("path", "unknown"))
+            elements.append(cfg.get("element", "unknown"))
+            level.append(cfg.get("level", 80))
+            eidolon.append(cfg.get("eidolon", 0))
+            base_cfg = cfg.get("base_stats", {}) or {}
+            base.append(_row(base_cfg, BASE_STAT_FIELDS))
+            relics_cfg = cfg.get("relics", {}) or {}
+            relics.append(_row(relics_cfg, RELIC_STAT_FIELDS))
+            lc_cfg = cfg.get("light_cone")
+            if lc_cfg:
+                lc_stats.append(_row(lc_cfg.get("stats") or {}, RELIC_STAT_FIELDS))
+                lc_meta.append({
+                    **{k: copy.deepcopy(v) for k, v in lc_cfg.items() if k != "stats"},
+                    "name": lc_cfg.get("name", ""),
+                    "level": lc_cfg.get("level", 80),
+                    "superimpose": lc_cfg.get("superimpose", 1),
+                })
+            else:
+                lc_stats.append([0.0] * len(RELIC_STAT_FIELDS))
+                lc_meta.append(None)
+            skill_levels.append(dict(cfg.get("skill_levels", {}) or {}))
+            extra = {k: copy.deepcopy(v) for k, v in cfg.items() if k not in _CHARACTER_KEYS}
+            base_extra = {k: v for k, v in base_cfg.items() if k not in _B}
+            relic_extra = {k: v for k, v in relics_cfg.items() if k not in _R}
+            if base_extra:
+                extra["_base_stats"] = base_extra
+            if relic_extra:
+                extra["_relics"] = relic_extra
+            extra["_layout"] = {
+                "keys": _types(cfg),
+                "base_stats": _types(base_cfg),
+                "relics": _types(relics_cfg),
+                "light_cone": _types(lc_cfg) if lc_cfg else None,
+                "lc_stats": _types(lc_cfg.get("stats") or {}) if lc_cfg else None,
+            }
+            extras.append(extra)
+        dim = len(RELIC_STAT_FIELDS)
+        return cls(
+            names=names,
+            paths=paths,
+            elements=elements,
+            level=np.array(level, dtype=np.int64),
+            eidolon=np.array(eidolon, dtype=np.int64),
+            base=np.array(base, dtype=np.float64).reshape(-1, len(BASE_STAT_FIELDS)),
+            relics=np.array(relics, dtype=np.float64).reshape(-1, dim),
+            lc_stats=np.array(lc_stats, dtype=np.float64).reshape(-1, dim),
+            lc_meta=lc_meta,
+            skill_levels=skill_levels,
+            extras=extras,
+        )
+
+    def to_config(self, i: int) -> Dict[str, Any]:
+        extra = dict(self.extras[i])
+        base_extra = extra.pop("_base_stats", {})
+        relic_extra = extra.pop("_relics", {})
+        layout = extra.pop("_layout", None)
+        lc = None
+        if self.lc_meta[i] is not None:
+            lc = {
+                **self.lc_meta[i],
+                "stats": {k: float(self.lc_stats[i, j]) for j, k in enumerate(RELIC_STAT_FIELDS)},
+            }
+        cfg = {
+            "name": self.names[i],
+            "path": self.paths[i],
+            "element": self.elements[i],
+            "level": int(self.level[i]),
+            "eidolon": int(self.eidolon[i]),
+            "base_stats": {**{k: float(self.base[i, j]) for j, k in enumerate(BASE_STAT_FIELDS)}, **base_extra},
+            "relics": {**{k: float(self.relics[i, j]) for j, k in enumerate(RELIC_STAT_FIELDS)}, **relic_extra},
+            "light_cone": lc,
+            "skill_levels": dict(self.skill_levels[i]),
+            **extra,
+        }
+        if layout is None:
+            return cfg
+        # 按输入的键、键序与数值类型写回；输入中没有的键（如未填写的遗器属性、光锥）不补出
+        cfg["base_stats"] = _restore(cfg["base_stats"], layout["base_stats"])
+        cfg["relics"] = _restore(cfg["relics"], layout["relics"])
+        if lc is not None and layout["light_cone"] is not None:
+            lc["stats"] = _restore(lc["stats"], layout["lc_stats"])
+            cfg["light_cone"] = _restore(lc, layout["light_cone"])
+        return _restore(cfg, layout["keys"])
+
+    def to_configs(self) -> List[Dict[str, Any]]:
+        return [self.to_config(i) for i in range(len(self))]
+
+    def take(self, indices: Sequence[int]) -> "RosterTable":
+        """按行下标取子表（如一支 4 人队伍）。"""
+        idx = np.asarray(indices, dtype=np.int64)
+        return RosterTable(
+            names=[self.names[i] for i in idx],
+            paths=[self.paths[i] for i in idx],
+            elements=[self.elements[i] for i in idx],
+            level=self.level[idx],
+            eidolon=self.eidolon[idx],
+            base=self.base[idx],
+            relics=self.relics[idx],
+            lc_stats=self.lc_stats[idx],
+            lc_meta=[self.lc_meta[i] for i in idx],
+            skill_levels=[self.skill_levels[i] for i in idx],
+            extras=[self.extras[i] for i in idx],
+        )
+
+    def compute(self) -> Dict[str, np.ndarray]:
+        """向量化的 Character.compute：返回 {指标: (n,) 数组}，取整位数相同。"""
+        b, r, s = self.base, self.relics, self.lc_stats
+        base_atk, base_hp, base_def = b[:, _B["atk"]], b[:, _B["hp"]], b[:, _B["def"]]
+
+        atk = base_atk * (1 + r[:, _R["atk_percent"]]) + r[:, _R["atk_flat"]]
+        hp = base_hp * (1 + r[:, _R["hp_percent"]]) + r[:, _R["hp_flat"]]
+        defense = base_def * (1 + r[:, _R["def_percent"]]) + r[:, _R["def_flat"]]
+        speed = b[:, _B["spd"]] + r[:, _R["speed"]]
+        crit_rate = np.minimum(1.0, r[:, _R["crit_rate"]])
+
+        # 叠加光锥属性（未装备光锥的行为 0）
+        atk = atk + (base_atk * s[:, _R["atk_percent"]] + s[:, _R["atk_flat"]])
+        hp = hp + (base_hp * s[:, _R["hp_percent"]] + s[:, _R["hp_flat"]])
+        defense = defense + (base_def * s[:, _R["def_percent"]] + s[:, _R["def_flat"]])
+        speed = speed + s[:, _R["speed"]]
+        crit_rate = np.minimum(1.0, crit_rate + s[:, _R["crit_rate"]])
+        crit_dmg = r[:, _R["crit_dmg"]] + s[:, _R["crit_dmg"]]
+        energy_regen = r[:, _R["energy_regen"]] + s[:, _R["energy_regen"]]
+        break_effect = r[:, _R["break_effect"]] + s[:, _R["break_effect"]]
+
+        crit_factor = 1.0 + crit_rate * crit_dmg
+        ehp = hp * (1.0 + defense / 1000.0)
+        burst_ceiling = atk * crit_factor * 2.0
+        return {
+            "atk": np.round(atk, 2),
+            "hp": np.round(hp, 2),
+            "def": np.round(defense, 2),
+            "spd": np.round(speed, 2),
+            "crit_rate": np.round(crit_rate, 4),
+            "crit_dmg": np.round(crit_dmg, 4),
+            "energy_regen": np.round(energy_regen, 4),
+            "break_effect": np.round(break_effect, 4),
+            "crit_factor": np.round(crit_factor, 4),
+            "ehp": np.round(ehp, 2),
+            "burst_ceiling": np.round(burst_ceiling, 2),
+        }
+
+    def computed_rows(self) -> List[Dict[str, Any]]:
+        """与 [{"name": c.name, **c.computed}] 相同形状的逐行结果，便于复用现有按行的接口。"""
+        cols = self.compute()
+        return [
+            {"name": name, **{k: float(v[i]) for k, v in cols.items()}}
+            for i, name in enumerate(self.names)
+        ]
+
+
+class EnemyTable:
+    """
+    敌人的列式表：
+    - base: (n, 4) 按 ENEMY_STAT_FIELDS
+    - weak: (n, 7) 按 ELEMENTS 的弱点布尔矩阵；resistances: (n, 7)，NaN 表示未填写
+    不在 ELEMENTS 中的弱点/抗性保存在 extras 中；输入的键序、弱点顺序与数值类型也记在 extras 中，
+    写回时按原样输出，输入里没有的可选键（buffs、notes 等）不会补出来。
+    """
+    __slots__ = ("names", "level", "base", "weak", "resistances", "buffs", "notes", "extras")
+
+    def __init__(self, names: List[str], level: np.ndarray, base: np.ndarray, weak: np.ndarray,
+                 resistances: np.ndarray, buffs: List[List[str]], notes: List[Optional[str]],
+                 extras: List[Dict[str, Any]]):
+        self.names = names
+        self.level = level
+        self.base = base
+        self.weak = weak
+        self.resistances = resistances
+        self.buffs = buffs
+        self.notes = notes
+        self.extras = extras
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def from_configs(cls, cfgs: Sequence[Dict[str, Any]]) -> "EnemyTable":
+        names, level, base, weak, res, buffs, notes, extras = [], [], [], [], [], [], [], []
+        for cfg in cfgs:
+            names.append(cfg.get("name", "unknown"))
+            level.append(cfg.get("level", 90))
+            base_cfg = cfg.get("base_stats", {}) or {}
+            base.append(_row(base_cfg, ENEMY_STAT_FIELDS))
+            weaknesses = cfg.get("weaknesses", []) or []
+            resistances = cfg.get("resistances", {}) or {}
+            weak.append([e in weaknesses for e in ELEMENTS])
+            res.append([float(resistances[e]) if e in resistances else np.nan for e in ELEMENTS])
+            buffs.append(list(cfg.get("buffs", []) or []))
+            notes.append(cfg.get("notes"))
+            extra = {k: copy.deepcopy(v) for k, v in cfg.items() if k not in _ENEMY_KEYS}
+            other_weak = [w for w in weaknesses if w not in ELEMENTS]
+            other_res = {k: v for k, v in resistances.items() if k not in ELEMENTS}
+            other_base = {k: v for k, v in base_cfg.items() if k not in _E}
+            if other_weak:
+                extra["_weaknesses"] = other_weak
+            if other_res:
+                extra["_resistances"] = other_res
+            if other_base:
+                extra["_base_stats"] = other_base
+            extra["_layout"] = {
+                "keys": _types(cfg),
+                "weaknesses": list(weaknesses),
+                "resistances": _types(resistances),
+                "base_stats": _types(base_cfg),
+            }
+            extras.append(extra)
+        n_elem = len(ELEMENTS)
+        return cls(
+            names=names,
+            level=np.array(level, dtype=np.int64),
+            base=np.array(base, dtype=np.float64).reshape(-1, len(ENEMY_STAT_FIELDS)),
+            weak=np.array(weak, dtype=bool).reshape(-1, n_elem),
+            resistances=np.array(res, dtype=np.float64).reshape(-1, n_elem),
+            buffs=buffs,
+            notes=notes,
+            extras=extras,
+        )
+
+    def to_config(self, i: int) -> Dict[str, Any]:
+        extra = dict(self.extras[i])
+        other_weak = extra.pop("_weaknesses", [])
+        other_res = extra.pop("_resistances", {})
+        other_base = extra.pop("_base_stats", {})
+        layout = extra.pop("_layout", None)
+        cfg = {
+            "name": self.names[i],
+            "level": int(self.level[i]),
+            "weaknesses": [e for j, e in enumerate(ELEMENTS) if self.weak[i, j]] + list(other_weak),
+            "resistances": {
+                **{e: float(self.resistances[i, j]) for j, e in enumerate(ELEMENTS)
+                   if not np.isnan(self.resistances[i, j])},
+                **other_res,
+            },
+            "buffs": list(self.buffs[i]),
+            "notes": self.notes[i],
+            "base_stats": {**{k: float(self.base[i, j]) for j, k in enumerate(ENEMY_STAT_FIELDS)}, **other_base},
+            **extra,
+        }
+        if layout is None:
+            return cfg
+        # 按输入的键序与弱点顺序写回；输入中没有的可选键不补出，构建后新增的弱点/抗性排在最后
+        cfg["weaknesses"] = _ordered(cfg["weaknesses"], layout["weaknesses"])
+        res_types = layout["resistances"]
+        cfg["resistances"] = _restore(cfg["resistances"], {
+            k: res_types.get(k, float) for k in _ordered(cfg["resistances"], res_types)})
+        cfg["base_stats"] = _restore(cfg["base_stats"], layout["base_stats"])
+        return _restore(cfg, layout["keys"])
+
+    def to_configs(self) -> List[Dict[str, Any]]:
+        return [self.to_config(i) for i in range(len(self))]
+
+    def compute(self) -> Dict[str, np.ndarray]:
+        """向量化的 Enemy.compute。"""
+        hp, defense, spd, toughness = (self.base[:, _E[k]] for k in ENEMY_STAT_FIELDS)
+        threat = hp * 0.001 + defense * 0.5 + spd * 0.3 + toughness * 0.2
+        other = np.array([len(x.get("_weaknesses", [])) for x in self.extras], dtype=np.int64)
+        return {
+            "hp": np.round(hp, 2),
+            "def": np.round(defense, 2),
+            "spd": np.round(spd, 2),
+            "toughness": np.round(toughness, 2),
+            "threat": np.round(threat, 2),
+            "weakness_coverage": self.weak.sum(axis=1) + other,
+        }
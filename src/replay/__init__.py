@@ -0,0 +1,7 @@
+"""
+离线回放：文件画面来源 + 录制/模拟的 AI 后端 + 不发送按键的控制器
+"""
+from .runner import RecordedAIClient, run_replay
+from .sources import FolderScreenSource, SessionScreenSource
+
+__all__ = ["FolderScreenSource", "SessionScreenSource", "RecordedAIClient", "run_replay"]
@@ -0,0 +1,280 @@
+"""
+离线回放
+- 用文件画面来源（录制的会话或截图目录）代替实时截图，用不发送按键的 NullController 代替键鼠，
+  AI 后端可选：
+  - recorded：按调用类型依次返回会话中录制的模型响应，不访问网络，用于测量本地流水线本身的开销
+  - mock：把录制的响应（截图目录时为内置响应）交给本地模拟服务，经完整的 HTTP/重试路径请求
+  - live：使用真实配置的模型，对比新模型/新提示词与录制时的决策
+- wait 动作不等待、不调用真实截图，因此回放速度远快于实时
+- 报告每秒决策数、决策延迟 p50/p99、相对录制时的加速倍数，以及与录制动作（action_type + character_index）
+  不一致的比例（分歧率）
+
+命令行：
+    python -m src.replay --source data/sessions/20250101-120000 --backend recorded
+    python -m src.replay --source screenshots/ --backend mock --ticks 200
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.ai.client import AIClient, AIConfig
+from src.ai.mock_server import MockBehavior, MockOpenAIServer
+from src.ai.prompts import BATTLE_DECISION, GENERATE_STRATEGY
+from src.ai.response_parser import parse_json_response
+from src.ai.strategy_engine import AIStrategyEngine
+from src.decision_engine.ai_decision import AIBattleDecision
+from src.game_control.controller import NullController
+from src.storage.memory import InMemoryStore
+from src.storage.session import META_FILE, SessionReader
+from src.telemetry import tracing
+
+from .sources import FolderScreenSource, SessionScreenSource
+
+BACKENDS = ("recorded", "mock", "live")
+MAX_EXAMPLES = 10
+
+logger = logging.getLogger(__name__)
+
+
+class RecordedAIClient:
+    """
+    按调用类型依次返回录制的模型响应；录制时失败的请求同样抛出异常。
+    用完后返回空文本，loop=True 时从头循环（基准测试用）。
+    """
+
+    def __init__(self, responses: Dict[str, List[Dict[str, Any]]], model: str = "recorded", loop: bool = False):
+        self.config = AIConfig(enabled=True, api_key="recorded", model=model)
+        self.logger = logging.getLogger(__name__)
+        self.last_usage: Dict[str, int] = {}
+        self.usage_stats: Dict[str, int] = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+        self.exhausted = 0
+        self.loop = loop
+        self.recorder = None
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = {k: deque(v) for k, v in responses.items()}
+
+    def is_available(self) -> bool:
+        return True
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        return {"metrics": {}, "endpoints": {}}
+
+    def _next(self, call_type: Optional[str]) -> str:
+        q = self._queues.get(call_type or "default")
+        if not q:
+            self.exhausted += 1
+            self.last_usage = {}
+            return ""
+        item = q.popleft()
+        if self.loop:
+            q.append(item)
+        self.last_usage = dict(item.get("usage") or {})
+        self.usage_stats["calls"] += 1
+        for k in ("prompt_tokens", "completion_tokens"):
+            self.usage_stats[k] += int(self.last_usage.get(k) or 0)
+        if item.get("error"):
+            raise RuntimeError(f"录制时请求失败：{item['error']}")
+        return item.get("response") or ""
+
+    def chat(self, messages: List[Dict[str, str]], system_prompt: Optional[str] = None,
+             temperature: float = 0.2, max_tokens: Optional[int] = None,
+             response_format: Optional[Dict] = None, call_type: Optional[str] = None) -> str:
+        return self._next(call_type)
+
+    def chat_vision(self, images_b64: List[str], user_prompt: str, system_prompt: Optional[str] = None,
+                    temperature: float = 0.2, max_tokens: Optional[int] = None,
+                    response_format: Optional[Dict] = None, call_type: Optional[str] = None) -> str:
+        return self._next(call_type)
+
+
+# ---- 读取会话 ----
+def is_session(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def recorded_responses(reader: SessionReader) -> Dict[str, List[Dict[str, Any]]]:
+    """调用类型 -> 按时间顺序的 {response, usage, error}。"""
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for ev in reader.events("llm"):
+        out.setdefault(ev.get("call_type") or "default", []).append(
+            {"response": ev.get("response"), "usage": ev.get("usage"), "error": ev.get("error")})
+    return out
+
+
+def decision_frames(reader: SessionReader) -> List[int]:
+    """每次战斗决策请求所用的帧号（丢失的帧用上一帧代替）。"""
+    seqs: List[int] = []
+    for ev in reader.events("llm"):
+        if ev.get("call_type") != BATTLE_DECISION:
+            continue
+        frame = None
+        for m in ev.get("messages") or []:
+            for p in m.get("content") if isinstance(m.get("content"), list) else []:
+                if isinstance(p, dict) and p.get("type") == "image_ref" and p.get("frame") is not None:
+                    frame = p["frame"]
+        if frame is None and seqs:
+            frame = seqs[-1]
+        if frame is not None:
+            seqs.append(int(frame))
+    return seqs
+
+
+def _percentile(ordered: List[float], q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+
+def run_replay(source: str, backend: str = "recorded", client: Optional[AIClient] = None,
+               ticks: Optional[int] = None, behavior: Optional[MockBehavior] = None,
+               log: Optional[logging.Logger] = None) -> Dict[str, Any]:
+    """
+    回放 source（会话目录或截图目录）并返回报告。
+    - backend=live 时需要传入 client
+    - ticks 默认为会话中录制的动作数；截图目录默认每张截图一次决策
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的回放后端：{backend}，可选 {', '.join(BACKENDS)}")
+    log = log or logger
+    reader = SessionReader(source) if is_session(source) else None
+    expected: List[Dict[str, Any]] = []
+    responses: Dict[str, List[Dict[str, Any]]] = {}
+    if reader is not None:
+        expected = list(reader.events("action"))
+        responses = recorded_responses(reader)
+        frames = decision_frames(reader)
+        screen = SessionScreenSource(reader, frames or None)
+    else:
+        screen = FolderScreenSource(source)
+    if backend == "recorded" and not responses:
+        raise ValueError("截图目录没有录制的模型响应，请使用 mock 或 live 后端")
+    if backend == "live" and client is None:
+        raise ValueError("live 后端需要传入 AIClient")
+
+    # 录制时的策略写入内存，使提示词与录制时一致
+    memory = InMemoryStore()
+    for item in responses.get(GENERATE_STRATEGY, [])[-1:]:
+        try:
+            memory.save("current_strategy", parse_json_response(item.get("response") or "", GENERATE_STRATEGY))
+        except Exception as e:
+            log.warning(f"录制的策略无法解析，使用空策略：{e}")
+
+    server = None
+    if backend == "recorded":
+        client = RecordedAIClient(responses)
+    elif backend == "mock":
+        scripted = {k: [v["response"] for v in items if v.get("response")] for k, items in responses.items()}
+        server = MockOpenAIServer(responses={k: v for k, v in scripted.items() if v},
+                                  behavior=behavior or MockBehavior(latency_ms=0.0)).start()
+        client = AIClient(AIConfig(enabled=True, api_key="mock", base_url=server.base_url))
+
+    controller = NullController()
+    engine = AIStrategyEngine(client, controller, memory, logger=log)
+    engine.screen_source = screen
+    decision = AIBattleDecision(engine, logger=log)
+    decision.wait_seconds = 0.0
+
+    n = ticks if ticks is not None else (len(expected) or len(screen))
+    latencies: List[float] = []
+    compared = diverged = fallbacks = 0
+    examples: List[Dict[str, Any]] = []
+    battle = None
+    try:
+        wall = time.perf_counter()
+        for i in range(n):
+            exp = expected[i] if i < len(expected) else None
+            if exp is not None and exp.get("battle_id") != battle:
+                if battle is not None:
+                    decision.end_battle("replay")
+                battle = exp.get("battle_id")
+                decision.start_battle()
+            t0 = time.perf_counter()
+            action = decision.make_decision()
+            latencies.append(time.perf_counter() - t0)
+            decision.execute_action(action, controller)
+            if action.source == "fallback":
+                fallbacks += 1
+            if exp is None:
+                continue
+            compared += 1
+            got = (action.action_type, action.character_index)
+            want = (exp.get("action_type"), exp.get("character_index"))
+            if got != want:
+                diverged += 1
+                if len(examples) < MAX_EXAMPLES:
+                    examples.append({"tick": i, "round": exp.get("round"), "recorded": list(want), "replayed": list(got)})
+        elapsed = time.perf_counter() - wall
+        if decision.battle_started:
+            decision.end_battle("replay")
+    finally:
+        if server is not None:
+            server.stop()
+        if reader is not None:
+            reader.close()
+
+    recorded_s = expected[-1]["ts"] - expected[0]["ts"] if len(expected) > 1 else None
+    ordered = sorted(latencies)
+    report: Dict[str, Any] = {
+        "source": source,
+        "backend": backend,
+        "ticks": len(latencies),
+        "wall_s": round(elapsed, 3),
+        "decisions_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "decision_ms": {
+            "p50": _percentile(ordered, 0.5),
+            "p99": _percentile(ordered, 0.99),
+            "max": round(ordered[-1] * 1000, 2) if ordered else None,
+        },
+        "divergence": {
+            "compared": compared,
+            "diverged": diverged,
+            "rate": round(diverged / compared, 4) if compared else None,
+            "examples": examples,
+        },
+        "fallback_decisions": fallbacks,
+        "keys_sent": len(controller.sent_keys),
+        "speedup": round(recorded_s * len(latencies) / max(1, len(expected) - 1) / elapsed, 1)
+        if recorded_s and elapsed > 0 else None,
+    }
+    if isinstance(client, RecordedAIClient):
+        report["exhausted_responses"] = client.exhausted
+    elif client is not None:
+        report["resilience"] = client.resilience_stats()["metrics"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回放：录制的会话或截图目录 → 决策流水线")
+    parser.add_argument("--source", required=True, help="会话目录（data/sessions/...）或截图目录")
+    parser.add_argument("--backend", choices=BACKENDS, default="recorded", help="live 使用 config.json 中的 ai 配置")
+    parser.add_argument("--ticks", type=int, default=None, help="决策次数，默认与录制的动作数相同")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mock 后端的模拟延迟")
+    parser.add_argument("--trace", default=None, metavar="PATH", help="导出回放过程的 Chrome trace JSON")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(levelname)s - %(message)s")
+    client = None
+    if args.backend == "live":
+        from src.ai.client import AIProviderType
+        from src.config import load_config
+        ai = {k: v for k, v in load_config()["ai"].items() if k in AIConfig.__dataclass_fields__}
+        ai["provider"] = AIProviderType(ai.get("provider", "openai_compatible"))
+        client = AIClient(AIConfig(**ai))
+    if args.trace:
+        tracing.enable()
+    report = run_replay(args.source, args.backend, client=client, ticks=args.ticks,
+                        behavior=MockBehavior(latency_ms=args.latency_ms))
+    if args.trace:
+        report["trace"] = tracing.export_chrome_trace(args.trace)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+文件画面来源
+- 代替实时截图，供回放与无界面压测使用：设置到 AIStrategyEngine.screen_source 后，
+  engine.capture() 依次返回这里的帧
+- FolderScreenSource：截图目录（png/jpg/bmp），启动时全部解码到内存，按文件名顺序循环
+- SessionScreenSource：录制的会话（storage.session），按给定帧号顺序返回缩小后的帧
+"""
+from __future__ import annotations
+
+import glob
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from src.storage.session import SessionReader
+
+try:
+    from PIL import Image
+except ImportError:  # 可选依赖
+    Image = None
+
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg", "*.bmp")
+
+
+def _crop(img, region: Optional[Tuple[int, int, int, int]], scale: int = 1):
+    if not region:
+        return img
+    left, top, width, height = (int(v) // scale for v in region)
+    right = min(img.width, left + max(1, width))
+    bottom = min(img.height, top + max(1, height))
+    return img.crop((min(left, right - 1), min(top, bottom - 1), right, bottom))
+
+
+class FolderScreenSource:
+    """按文件名顺序循环返回目录中的截图；region 按原图坐标裁剪。"""
+
+    def __init__(self, folder: str):
+        if Image is None:
+            raise RuntimeError("需要安装 pillow")
+        paths: List[str] = []
+        for pattern in IMAGE_PATTERNS:
+            paths.extend(glob.glob(os.path.join(folder, pattern)))
+        if not paths:
+            raise ValueError(f"目录中没有截图：{folder}")
+        self.paths = sorted(paths)
+        self._images = []
+        for path in self.paths:
+            with Image.open(path) as img:
+                self._images.append(img.convert("RGB"))
+        self.position = 0
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def reset(self):
+        self.position = 0
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None):
+        img = self._images[self.position % len(self._images)]
+        self.position += 1
+        return _crop(img, region)
+
+
+class SessionScreenSource:
+    """
+    按帧号顺序返回录制会话中的帧（已按录制时的 scale 缩小）。
+    region 按原图坐标给出，会换算到缩小后的坐标；录制时本来就是区域截图的帧请不要再传 region。
+    被丢弃的帧用上一帧代替。
+    """
+
+    def __init__(self, reader: SessionReader, seqs: Optional[Sequence[int]] = None):
+        if Image is None:
+            raise RuntimeError("需要安装 pillow")
+        self.reader = reader
+        self.seqs = list(seqs) if seqs is not None else [int(s) for s in reader.index["seq"]]
+        if not self.seqs:
+            raise ValueError(f"会话中没有可用的帧：{reader.path}")
+        self.scale = int(reader.meta.get("scale", 1))
+        self.position = 0
+        self._last = None
+
+    def __len__(self) -> int:
+        return len(self.seqs)
+
+    def reset(self):
+        self.position = 0
+
+    def capture(self, region: Optional[Tuple[int, int, int, int]] = None):
+        arr = self.reader.frame(self.seqs[self.position % len(self.seqs)])
+        self.position += 1
+        if arr is None:
+            if self._last is None:
+                raise ValueError("会话的第一帧已丢失")
+            img = self._last
+        else:
+            img = Image.fromarray(arr[:, :, 0] if arr.shape[2] == 1 else arr)
+            self._last = img
+        return _crop(img, region, self.scale)
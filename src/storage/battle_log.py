@@ -0,0 +1,351 @@
+"""
+战斗遥测日志
+- 只追加写入，按日期分段：data/battle_log/actions-YYYYMMDD-v2.bin 与 battles-YYYYMMDD.jsonl
+- actions：每个动作一条定长二进制记录（ACTION_DTYPE，40 字节），包含时间戳、决策/执行耗时、
+  模型 token、决策来源（model / fallback）与执行结果；读取时 np.frombuffer 直接映射为列，十万场战斗也只需零点几秒
+- 每次批量写入是一个块：标记 + 条数 + CRC32 + 记录。写入中断留下的残块（无论在文件末尾还是之后又有追加）
+  读取时按 CRC 识别并跳过，从下一个块标记处重新同步；旧版（v1，无分块）分段仍可读取
+- battles：每场战斗一行紧凑 JSON（起止时间、回合数、结果、敌人），条数少且含字符串；追加前补齐残行的换行
+- 调用方只把记录放进队列，由后台写线程批量编码落盘，不阻塞战斗循环；个别记录无法编码时只丢弃该条并计入 dropped
+- load_battle_log / export_battle_log 将日志整理为 pandas DataFrame，可另存为 Parquet 或 NumPy .npz
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .serializers import JSONSerializer
+
+DEFAULT_LOG_DIR = os.path.join(os.getcwd(), "data", "battle_log")
+ACTION_PATTERN = "actions-*.bin"
+BATTLE_PATTERN = "battles-*.jsonl"
+# 分段文件头：魔数 + 格式版本
+MAGIC = b"SRBLOG\x00\x02"
+MAGIC_V1 = b"SRBLOG\x00\x01"
+# 块头：标记、记录条数、记录部分的 CRC32
+BLOCK_MARK = b"SRBK"
+BLOCK_HEADER = struct.Struct("<4sII")
+
+# 动作类型与决策来源按下标编码，未知值记为 255
+ACTION_TYPES = ("ultimate", "skill", "basic_attack", "switch_target_left", "switch_target_right", "wait")
+DECISION_SOURCES = ("model", "fallback")
+UNKNOWN_CODE = 255
+# v1 分段的来源编码为 (cache, plan, model, fallback)，读取时换算为当前编码
+_V1_SOURCE_LUT = np.full(256, UNKNOWN_CODE, dtype=np.uint8)
+_V1_SOURCE_LUT[2], _V1_SOURCE_LUT[3] = 0, 1
+
+ACTION_DTYPE = np.dtype([
+    ("battle_id", "<i8"),
+    ("ts", "<f8"),
+    ("seq", "<u2"),
+    ("round", "<u2"),
+    ("action_type", "u1"),
+    ("character_index", "i1"),  # -1 表示无
+    ("source", "u1"),
+    ("ok", "u1"),
+    ("decide_ms", "<f4"),  # NaN 表示未记录
+    ("exec_ms", "<f4"),
+    ("tokens_in", "<i4"),  # -1 表示网关未返回
+    ("tokens_out", "<i4"),
+])
+BATTLE_COLUMNS = ("battle_id", "ts_start", "ts_end", "duration", "rounds", "actions", "result", "enemy")
+
+_ACTION_CODES = {name: i for i, name in enumerate(ACTION_TYPES)}
+_SOURCE_CODES = {name: i for i, name in enumerate(DECISION_SOURCES)}
+_STOP = object()
+_JSON = JSONSerializer()
+
+
+def _opt(value: Optional[float], missing: float) -> float:
+    return missing if value is None else value
+
+
+class BattleLog:
+    """后台线程写入的战斗遥测日志。"""
+
+    def __init__(self, root: Optional[str] = None, flush_interval: float = 0.5, max_queue: int = 100000):
+        self.root = root or DEFAULT_LOG_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="battle-log-writer", daemon=True)
+        self._thread.start()
+
+    # ---- 写入接口（调用方线程） ----
+    def _put(self, item: Any):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def log_action(self, battle_id: int, seq: int, round: int, action_type: str,
+                   character_index: Optional[int] = None, source: str = "model",
+                   decide_ms: Optional[float] = None, exec_ms: Optional[float] = None,
+                   tokens_in: Optional[int] = None, tokens_out: Optional[int] = None,
+                   ok: bool = True, ts: Optional[float] = None):
+        """放入写队列后立即返回；队列满时丢弃并计数。"""
+        self._put((
+            battle_id,
+            time.time() if ts is None else ts,
+            seq,
+            round,
+            _ACTION_CODES.get(action_type, UNKNOWN_CODE),
+            _opt(character_index, -1),
+            _SOURCE_CODES.get(source, UNKNOWN_CODE),
+            bool(ok),
+            _opt(decide_ms, np.nan),
+            _opt(exec_ms, np.nan),
+            _opt(tokens_in, -1),
+            _opt(tokens_out, -1),
+        ))
+
+    def log_battle(self, battle_id: int, ts_start: float, rounds: int, actions: int, result: str,
+                   enemy: Optional[str] = None, ts_end: Optional[float] = None):
+        ts_end = time.time() if ts_end is None else ts_end
+        self._put({
+            "battle_id": battle_id, "ts_start": ts_start, "ts_end": ts_end,
+            "duration": ts_end - ts_start, "rounds": rounds, "actions": actions,
+            "result": result, "enemy": enemy,
+        })
+
+    def flush(self, timeout: Optional[float] = None):
+        """等待队列中已有的记录全部落盘。"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    # ---- 写线程 ----
+    def _segment_path(self, pattern: str) -> str:
+        return os.path.join(self.root, time.strftime(pattern))
+
+    def _encode_actions(self, actions: List[tuple]) -> Tuple[int, bytes]:
+        try:
+            return len(actions), np.array(actions, dtype=ACTION_DTYPE).tobytes()
+        except Exception:
+            pass
+        # 整批编码失败：逐条编码，只丢弃有问题的记录
+        good = []
+        for item in actions:
+            try:
+                good.append(np.array([item], dtype=ACTION_DTYPE).tobytes())
+            except Exception as e:
+                self.dropped += 1
+                self.logger.error(f"无法编码的动作记录已丢弃：{item!r}（{e}）")
+        return len(good), b"".join(good)
+
+    def _encode_battles(self, battles: List[Dict[str, Any]]) -> List[bytes]:
+        lines = []
+        for b in battles:
+            try:
+                lines.append(_JSON.dumps(b) + b"\n")
+            except Exception as e:
+                self.dropped += 1
+                self.logger.error(f"无法编码的战斗记录已丢弃：{b!r}（{e}）")
+        return lines
+
+    def _write(self, actions: List[tuple], battles: List[Dict[str, Any]]):
+        count, payload = self._encode_actions(actions) if actions else (0, b"")
+        if count:
+            with open(self._segment_path("actions-%Y%m%d-v2.bin"), "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(BLOCK_HEADER.pack(BLOCK_MARK, count, zlib.crc32(payload)) + payload)
+        lines = self._encode_battles(battles) if battles else []
+        if lines:
+            with open(self._segment_path("battles-%Y%m%d.jsonl"), "a+b") as f:
+                # 上次写入中断留下没有换行的残行时先补上换行，避免与新记录粘在同一行
+                if f.tell() > 0:
+                    f.seek(f.tell() - 1)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write(b"".join(lines))
+        self.written += count + len(lines)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            # 一次取空队列，合并成一次写入
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            actions: List[tuple] = []
+            battles: List[Dict[str, Any]] = []
+            waiters: List[threading.Event] = []
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, tuple):
+                    actions.append(item)
+                else:
+                    battles.append(item)
+            # 任何异常都不能让写线程退出，否则之后的记录全部丢失
+            try:
+                self._write(actions, battles)
+            except Exception as e:
+                self.dropped += len(actions) + len(battles)
+                self.logger.exception(f"写入战斗日志失败：{e}")
+            for w in waiters:
+                w.set()
+
+
+def _read_blocks(raw: bytes, path: str) -> List[np.ndarray]:
+    """解析 v2 分段的记录部分；CRC 不符或不完整的块跳过，从下一个块标记处重新同步。"""
+    parts = []
+    pos = expected = 0
+    torn = 0
+    while True:
+        pos = raw.find(BLOCK_MARK, pos)
+        if pos < 0:
+            break
+        if pos != expected:
+            torn += 1
+        if pos + BLOCK_HEADER.size <= len(raw):
+            _, count, crc = BLOCK_HEADER.unpack_from(raw, pos)
+            start = pos + BLOCK_HEADER.size
+            end = start + count * ACTION_DTYPE.itemsize
+            if end <= len(raw) and zlib.crc32(raw[start:end]) == crc:
+                parts.append(np.frombuffer(raw, dtype=ACTION_DTYPE, count=count, offset=start))
+                pos = expected = end
+                continue
+        pos += 1
+    if torn or expected != len(raw):
+        logging.getLogger(__name__).warning(f"日志分段 {path} 中有写入中断留下的残块，已跳过")
+    return parts
+
+
+def read_actions(root: Optional[str] = None) -> np.ndarray:
+    """读取全部 actions 分段，返回 ACTION_DTYPE 结构化数组；写入中断产生的残块会被跳过。"""
+    parts = []
+    for path in sorted(glob.glob(os.path.join(root or DEFAULT_LOG_DIR, ACTION_PATTERN))):
+        with open(path, "rb") as f:
+            magic = f.read(len(MAGIC))
+            raw = f.read()
+        if magic == MAGIC:
+            parts.extend(_read_blocks(raw, path))
+        elif magic == MAGIC_V1:
+            usable = len(raw) - len(raw) % ACTION_DTYPE.itemsize
+            arr = np.frombuffer(raw[:usable], dtype=ACTION_DTYPE).copy()
+            arr["source"] = _V1_SOURCE_LUT[arr["source"]]
+            parts.append(arr)
+        else:
+            logging.getLogger(__name__).warning(f"跳过无法识别的日志分段：{path}")
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=ACTION_DTYPE)
+
+
+def iter_battles(root: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """按时间顺序遍历战斗汇总记录；跳过写入中断产生的残行。"""
+    for path in sorted(glob.glob(os.path.join(root or DEFAULT_LOG_DIR, BATTLE_PATTERN))):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    yield _JSON.loads(line)
+                except ValueError:
+                    continue
+
+
+def _decode(codes: np.ndarray, names: Tuple[str, ...]):
+    import pandas as pd
+
+    codes = codes.astype(np.int16)
+    codes[codes >= len(names)] = -1
+    return pd.Categorical.from_codes(codes, categories=list(names))
+
+
+def load_battle_log(root: Optional[str] = None):
+    """读取日志并返回 (actions, battles) 两个 pandas DataFrame。"""
+    import pandas as pd
+
+    arr = read_actions(root)
+    actions_df = pd.DataFrame({
+        "battle_id": arr["battle_id"],
+        "seq": arr["seq"],
+        "round": arr["round"],
+        "ts": arr["ts"],
+        "action_type": _decode(arr["action_type"], ACTION_TYPES),
+        "character_index": np.where(arr["character_index"] >= 0, arr["character_index"], np.nan),
+        "source": _decode(arr["source"], DECISION_SOURCES),
+        "decide_ms": arr["decide_ms"].astype(np.float64),
+        "exec_ms": arr["exec_ms"].astype(np.float64),
+        "tokens_in": np.where(arr["tokens_in"] >= 0, arr["tokens_in"], np.nan),
+        "tokens_out": np.where(arr["tokens_out"] >= 0, arr["tokens_out"], np.nan),
+        "ok": arr["ok"].astype(bool),
+    })
+
+    battles_df = pd.DataFrame(list(iter_battles(root)), columns=list(BATTLE_COLUMNS))
+    for c in ("result", "enemy"):
+        battles_df[c] = battles_df[c].astype("category")
+    return actions_df, battles_df
+
+
+def export_battle_log(root: Optional[str] = None, out: Optional[str] = None, fmt: str = "parquet") -> Tuple[str, str]:
+    """
+    将日志导出为列式文件，返回 (actions 路径, battles 路径)。
+    - fmt="parquet"：需要 pyarrow 或 fastparquet
+    - fmt="npz"：NumPy 压缩数组，字符串列保存为 <列名>_codes + <列名>_categories
+    """
+    if fmt not in ("parquet", "npz"):
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    root = root or DEFAULT_LOG_DIR
+    out = out or os.path.join(root, "export")
+    os.makedirs(out, exist_ok=True)
+    actions_df, battles_df = load_battle_log(root)
+    paths = []
+    for name, df in (("actions", actions_df), ("battles", battles_df)):
+        path = os.path.join(out, f"{name}.{fmt}")
+        if fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            arrays = {}
+            for c in df.columns:
+                if str(df[c].dtype) == "category":
+                    arrays[f"{c}_codes"] = df[c].cat.codes.to_numpy()
+                    arrays[f"{c}_categories"] = np.asarray(df[c].cat.categories.astype(str))
+                else:
+                    arrays[c] = df[c].to_numpy()
+            np.savez_compressed(path, **arrays)
+        paths.append(path)
+    return paths[0], paths[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出战斗遥测日志为 Parquet / NumPy 列式文件")
+    parser.add_argument("--src", default=DEFAULT_LOG_DIR, help="日志目录（默认 data/battle_log）")
+    parser.add_argument("--out", default=None, help="输出目录（默认 <src>/export）")
+    parser.add_argument("--format", default="parquet", choices=("parquet", "npz"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    start = time.perf_counter()
+    actions_path, battles_path = export_battle_log(args.src, args.out, args.format)
+    logging.getLogger(__name__).info(
+        f"已导出：{actions_path}, {battles_path}（{time.perf_counter() - start:.2f}s）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,242 @@
 """
 本地记忆存储
 - 将角色、敌人、计算出的衍生数值以及策略计划落盘，便于后续加载
+- 默认每个键一个 JSON 文件；配置 storage.backend = "sqlite" 时改用 SQLiteMemoryStore
+- 进程内读缓存：save 时写穿，load 时按文件 mtime/大小校验，
+  在 cache_ttl 秒内直接返回缓存（仅一次字典查找），超过后再 stat 一次以发现其它进程（如 UI）的修改
+- 写后落盘（write_behind）：save 只登记待写数据并立即返回，由单个写线程落盘；
+  同一键在落盘前的多次 save 只写最后一次；写入先到临时文件再 os.replace，不会留下写了一半的文件；
+  落盘完成前 load 返回待写/正在写的数据；save 时保存数据的深拷贝，之后调用方再修改原字典不影响已保存的内容
+- InMemoryStore：接口相同、只存在进程内，供回放与无界面压测使用（storage.backend = "memory"）
+- 文件编码由 serializers 决定（默认紧凑 JSON，可选 msgpack 与 zstd 压缩，见 storage.format / storage.compress）；
+  切换格式后仍能读取旧的 .json 文件
 """
 from __future__ import annotations
 
-import json
+import atexit
+import copy
+import logging
 import os
+import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
+
+from .serializers import Serializer, get_serializer, load_any, serializer_from_config
 
 DEFAULT_ROOT = os.path.join(os.getcwd(), "data", "memory")
+DEFAULT_CACHE_TTL = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+def _write_atomic(path: str, blob: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
 
 
 class MemoryStore:
-    def __init__(self, root: Optional[str] = None):
+    def __init__(self, root: Optional[str] = None, cache_ttl: float = DEFAULT_CACHE_TTL,
+                 write_behind: bool = False, serializer: Optional[Serializer] = None):
         self.root = root or DEFAULT_ROOT
+        self.serializer = serializer or get_serializer()
         os.makedirs(self.root, exist_ok=True)
+        self.cache_ttl = cache_ttl
+        # name -> (mtime_ns, size, 上次校验时间, data)；缓存的数据与调用方共享，请按只读使用
+        self._cache: Dict[str, Tuple[int, int, float, Any]] = {}
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+        # 写后落盘：name -> (saved_at, data 的快照)；_inflight 为写线程已取走、尚未落盘的部分
+        self.write_behind = write_behind
+        self._pending: Dict[str, Tuple[int, Any]] = {}
+        self._inflight: Dict[str, Tuple[int, Any]] = {}
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self.write_stats = {"saves": 0, "writes": 0, "coalesced": 0, "errors": 0}
 
     def _path(self, name: str) -> str:
-        return os.path.join(self.root, f"{name}.json")
+        return os.path.join(self.root, f"{name}{self.serializer.ext}")
+
+    def _locate(self, name: str) -> Optional[Tuple[str, os.stat_result]]:
+        """返回 (路径, stat)；当前格式的文件不存在时退回旧的 .json 文件。"""
+        paths = [self._path(name)]
+        legacy = os.path.join(self.root, f"{name}.json")
+        if legacy != paths[0]:
+            paths.append(legacy)
+        for path in paths:
+            try:
+                return path, os.stat(path)
+            except FileNotFoundError:
+                continue
+        return None
 
     def save(self, name: str, data: Dict[str, Any]) -> str:
         path = self._path(name)
-        payload = {
-            "_saved_at": int(time.time()),
-            "data": data,
-        }
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
+        saved_at = int(time.time())
+        data = copy.deepcopy(data)
+        self.write_stats["saves"] += 1
+        if not self.write_behind:
+            self._write(name, saved_at, data)
+            return path
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MemoryStore 已关闭")
+            if name in self._pending:
+                self.write_stats["coalesced"] += 1
+            self._pending[name] = (saved_at, data)
+            self._cache.pop(name, None)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="memory-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+            self._cond.notify()
         return path
 
-    def load(self, name: str) -> Optional[Dict[str, Any]]:
+    def _write(self, name: str, saved_at: int, data: Any):
         path = self._path(name)
-        if not os.path.exists(path):
+        _write_atomic(path, self.serializer.dumps({"_saved_at": saved_at, "data": data}))
+        st = os.stat(path)
+        self.write_stats["writes"] += 1
+        with self._cond:
+            entry = self._inflight.get(name)
+            if entry is not None and entry[1] is data:
+                del self._inflight[name]
+            # 落盘期间又有新的 save 时，缓存留给下一次写入
+            if name not in self._pending:
+                self._cache[name] = (st.st_mtime_ns, st.st_size, time.monotonic(), data)
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # 先登记到 _inflight 再换出 _pending，不加锁的 load 任一时刻都能查到
+                self._inflight.update(self._pending)
+                batch, self._pending = self._pending, {}
+                self._writing = len(batch)
+            for name, (saved_at, data) in batch.items():
+                try:
+                    self._write(name, saved_at, data)
+                except Exception as e:
+                    self.write_stats["errors"] += 1
+                    logger.error(f"写入记忆 {name} 失败: {e}")
+                    with self._cond:
+                        if self._inflight.get(name, (None, None))[1] is data:
+                            del self._inflight[name]
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有待写数据落盘；超时返回 False。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._writing:
+                if self._writer is None or not self._writer.is_alive():
+                    # 写线程未启动或已退出时在当前线程写完
+                    self._inflight.update(self._pending)
+                    batch, self._pending = self._pending, {}
+                    for name, (saved_at, data) in batch.items():
+                        self._write(name, saved_at, data)
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        """落盘剩余数据并停止写线程。"""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer is not None:
+            self._writer.join(timeout)
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        pending = self._pending.get(name) or self._inflight.get(name)
+        if pending is not None:
+            self.cache_stats["hits"] += 1
+            return pending[1]
+        entry = self._cache.get(name)
+        now = time.monotonic()
+        if entry is not None and now - entry[2] < self.cache_ttl:
+            self.cache_stats["hits"] += 1
+            return entry[3]
+
+        found = self._locate(name)
+        if found is None:
+            self._cache.pop(name, None)
             return None
-        with open(path, "r", encoding="utf-8") as f:
-            obj = json.load(f)
-        return obj.get("data")
+        path, st = found
+        if entry is not None and (st.st_mtime_ns, st.st_size) == entry[:2]:
+            self._cache[name] = (entry[0], entry[1], now, entry[3])
+            self.cache_stats["hits"] += 1
+            return entry[3]
+
+        self.cache_stats["misses"] += 1
+        with open(path, "rb") as f:
+            blob = f.read()
+        obj = self.serializer.loads(blob) if path == self._path(name) else load_any(blob)
+        data = obj.get("data")
+        self._cache[name] = (st.st_mtime_ns, st.st_size, now, data)
+        return data
+
+    def invalidate(self, name: Optional[str] = None):
+        """丢弃指定键（或全部）的缓存，下次 load 重新读盘。"""
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+
+class InMemoryStore:
+    """不落盘的记忆存储，与 MemoryStore 接口一致。"""
+
+    def __init__(self, initial: Optional[Dict[str, Any]] = None):
+        self._data: Dict[str, Any] = dict(initial or {})
+
+    def save(self, name: str, data: Dict[str, Any]) -> str:
+        self._data[name] = data
+        return name
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        return self._data.get(name)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+    def invalidate(self, name: Optional[str] = None):
+        pass
+
+
+def create_memory_store(cfg: Optional[Dict[str, Any]] = None):
+    """按 config.storage 创建记忆存储：backend 为 "json"（默认）、"sqlite" 或 "memory"。"""
+    cfg = cfg or {}
+    backend = (cfg.get("backend") or "json").lower()
+    cache_ttl = float(cfg.get("cache_ttl", DEFAULT_CACHE_TTL))
+    if backend == "sqlite":
+        from .sqlite_store import SQLiteMemoryStore
+        return SQLiteMemoryStore(cfg.get("path"), cache_ttl=cache_ttl, serializer=serializer_from_config(cfg))
+    if backend == "json":
+        return MemoryStore(cfg.get("path"), cache_ttl=cache_ttl, write_behind=bool(cfg.get("write_behind", True)),
+                           serializer=serializer_from_config(cfg))
+    if backend == "memory":
+        return InMemoryStore()
+    raise ValueError(f"不支持的存储后端: {backend}")
@@ -0,0 +1,71 @@
+"""
+记忆迁移工具：将 data/memory 下的 JSON 文件导入 SQLite 记忆存储
+用法：python -m src.storage.migrate [--src data/memory] [--db data/memory.db] [--remove]
+- 保留原文件中的 _saved_at 时间戳
+- 可重复执行：已导入的战斗记录（同时间戳且内容相同）会被跳过
+- --remove 只删除已导入或已跳过的文件；导入失败的文件原样保留
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+from typing import Dict
+
+from .memory import DEFAULT_ROOT
+from .sqlite_store import DEFAULT_DB_PATH, SQLiteMemoryStore
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_json_dir(src_root: str, store: SQLiteMemoryStore, remove: bool = False) -> Dict[str, int]:
+    stats = {"imported": 0, "skipped": 0, "failed": 0}
+    files = sorted(glob.glob(os.path.join(src_root, "*.json")))
+    # 已写入（或已在）SQLite 中的文件，只有这些可以删除
+    done = []
+    with store.transaction():
+        for path in files:
+            name = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    obj = json.load(f)
+                data = obj.get("data")
+                if store._route(name)[0] == "battle_records" and store.load(name) == data:
+                    stats["skipped"] += 1
+                    done.append(path)
+                    continue
+                store.save(name, data, saved_at=obj.get("_saved_at"))
+                stats["imported"] += 1
+                done.append(path)
+            except Exception as e:
+                logger.error(f"导入失败 {path}: {e}")
+                stats["failed"] += 1
+    if remove:
+        for path in done:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"删除 {path} 失败: {e}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 JSON 记忆文件导入 SQLite")
+    parser.add_argument("--src", default=DEFAULT_ROOT, help="JSON 记忆目录")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite 数据库路径")
+    parser.add_argument("--remove", action="store_true", help="导入后删除原 JSON 文件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    store = SQLiteMemoryStore(args.db)
+    try:
+        stats = migrate_json_dir(args.src, store, remove=args.remove)
+    finally:
+        store.close()
+    logger.info(f"迁移完成：导入 {stats['imported']}，跳过 {stats['skipped']}，失败 {stats['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+可插拔的序列化层
+- Serializer：dumps(obj) -> bytes / loads(bytes) -> obj，供 MemoryStore、SQLiteMemoryStore 与战斗日志共用
+- 格式：json（紧凑，安装了 orjson 时用它编解码）、msgpack（需 msgpack）
+- 压缩：超过阈值的数据用 zstd（需 zstandard）或 zlib 压缩，并加 3 字节头标记编解码器，
+  读取时按头自动识别，未压缩的数据原样解析，因此可随时调整阈值或切换压缩方式
+- python -m src.storage.serializers：对 data/memory 中真实的 current_strategy 与 character_* 数据
+  对比各格式的体积与编解码耗时（没有数据时使用内置样例）
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import orjson  # type: ignore
+except Exception:  # 可选依赖
+    orjson = None  # type: ignore
+
+try:
+    import msgpack  # type: ignore
+except Exception:  # 可选依赖
+    msgpack = None  # type: ignore
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # 可选依赖
+    zstandard = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "msgpack")
+CODECS = ("zstd", "zlib")
+DEFAULT_COMPRESS_THRESHOLD = 4096
+# 压缩数据头：0xFF 不会出现在 UTF-8 JSON 开头，对 msgpack 而言只对应顶层整数 -1
+_CODEC_HEADERS = {"zstd": b"\xffZS", "zlib": b"\xffZL"}
+
+
+class Serializer(ABC):
+    """序列化器基类；子类必须实现 dumps 与 loads，缺少任一个时在构造时即报 TypeError。"""
+    name = "base"
+    ext = ".bin"
+
+    @abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        """对象 -> 字节"""
+
+    @abstractmethod
+    def loads(self, blob: bytes) -> Any:
+        """字节 -> 对象"""
+
+
+class JSONSerializer(Serializer):
+    """紧凑 JSON；orjson 不支持的类型回退到标准库。"""
+    name = "json"
+    ext = ".json"
+
+    def dumps(self, obj: Any) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                pass
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, blob: Any) -> Any:
+        if orjson is not None:
+            return orjson.loads(blob)
+        return json.loads(blob)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+    ext = ".msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("缺少 msgpack 依赖，请先安装: pip install msgpack")
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True, strict_types=False)
+
+    def loads(self, blob: bytes) -> Any:
+        return msgpack.unpackb(blob, raw=False, strict_map_key=False)
+
+
+class CompressedSerializer(Serializer):
+    """在 inner 外包一层压缩：编码结果超过 threshold 字节才压缩。"""
+
+    def __init__(self, inner: Serializer, codec: str = "zstd", threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+                 level: int = 3):
+        if codec not in CODECS:
+            raise ValueError(f"不支持的压缩方式: {codec}")
+        if codec == "zstd" and zstandard is None:
+            logger.warning("未安装 zstandard，压缩改用 zlib")
+            codec = "zlib"
+        self.inner = inner
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.name = f"{inner.name}+{codec}"
+        self.ext = inner.ext + ".z"
+        if codec == "zstd":
+            self._compress = zstandard.ZstdCompressor(level=level).compress
+        else:
+            self._compress = lambda b: zlib.compress(b, level)
+
+    def dumps(self, obj: Any) -> bytes:
+        blob = self.inner.dumps(obj)
+        if len(blob) < self.threshold:
+            return blob
+        return _CODEC_HEADERS[self.codec] + self._compress(blob)
+
+    def loads(self, blob: bytes) -> Any:
+        return self.inner.loads(decompress(blob))
+
+
+def decompress(blob: bytes) -> bytes:
+    """识别压缩头并解压；未压缩的数据原样返回。"""
+    head = bytes(blob[:3])
+    if head == _CODEC_HEADERS["zstd"]:
+        if zstandard is None:
+            raise RuntimeError("数据使用 zstd 压缩，请先安装: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(blob[3:])
+    if head == _CODEC_HEADERS["zlib"]:
+        return zlib.decompress(blob[3:])
+    return blob
+
+
+def get_serializer(fmt: str = "json", compress: Optional[str] = None,
+                   threshold: int = DEFAULT_COMPRESS_THRESHOLD) -> Serializer:
+    """按名称创建序列化器：fmt 为 json / msgpack，compress 为 None / zstd / zlib。"""
+    fmt = (fmt or "json").lower()
+    if fmt == "json":
+        ser: Serializer = JSONSerializer()
+    elif fmt == "msgpack":
+        ser = MsgpackSerializer()
+    else:
+        raise ValueError(f"不支持的序列化格式: {fmt}")
+    if compress:
+        ser = CompressedSerializer(ser, codec=compress.lower(), threshold=threshold)
+    return ser
+
+
+def serializer_from_config(cfg: Optional[Dict[str, Any]] = None) -> Serializer:
+    """从 config.storage 读取 format / compress / compress_threshold。"""
+    cfg = cfg or {}
+    return get_serializer(
+        cfg.get("format") or "json",
+        cfg.get("compress"),
+        int(cfg.get("compress_threshold", DEFAULT_COMPRESS_THRESHOLD)),
+    )
+
+
+def load_any(blob: bytes) -> Any:
+    """不知道写入格式时解码：先尝试 JSON，再尝试 msgpack（均先解压）。"""
+    raw = decompress(blob)
+    try:
+        return JSONSerializer().loads(raw)
+    except ValueError:
+        if msgpack is None:
+            raise
+        return MsgpackSerializer().loads(raw)
+
+
+# ---- 基准测试 ----
+def _sample_payloads() -> Dict[str, Any]:
+    """与 generate_strategy / scan_character_with_ai 保存结构一致的样例数据。"""
+    step = {
+        "round": 1,
+        "actions": [
+            {"character": "希儿", "action": "战技E", "target": "中间精英怪", "reasoning": "开局抢先手，触发再现状态"},
+            {"character": "布洛妮娅", "action": "战技E", "target": "希儿", "reasoning": "拉条让希儿立即再次行动"},
+            {"character": "停云", "action": "释放大招3", "target": "希儿", "reasoning": "为希儿回能并提供增伤"},
+        ],
+    }
+    plan = {
+        "name": "稳定方案",
+        "description": "以希儿为核心，布洛妮娅拉条、停云回能，三回合内击破并击杀精英怪",
+        "expected_rounds": 3,
+        "steps": [{**step, "round": r} for r in range(1, 6)],
+    }
+    strategy = {
+        "analysis": {
+            "damage_calculation": "希儿战技倍率 220%，暴击 75%/爆伤 150%，对量子弱点敌人期望伤害约 38000" * 3,
+            "turn_order": "希儿 134 速先手，布洛妮娅 160 速拉条后希儿连动两次" * 3,
+            "synergy": "布洛妮娅提供暴伤与拉条，停云回能让希儿每两回合释放一次终结技" * 3,
+            "key_points": ["优先击破中间精英", "保留战技点给布洛妮娅", "第二回合开终结技"] * 3,
+        },
+        "plan_a": plan,
+        "plan_b": {**plan, "name": "极限方案", "requires_reroll": True,
+                   "reroll_condition": {"target_character": "停云", "trigger_timing": "第一回合敌人单体攻击",
+                                        "purpose": "回能", "max_retries": 5}},
+        "recommendation": "推荐方案A：不依赖凹本，稳定三回合通关",
+    }
+    character = {
+        "name": "希儿",
+        "element": "Quantum",
+        "path": "Hunt",
+        "stats": {"atk": 3120.5, "hp": 4012.0, "def": 780.2, "spd": 134.0, "crit_rate": 0.752, "crit_dmg": 1.503,
+                  "break_effect": 0.12, "energy_regen": 1.0, "effect_hit": 0.0, "effect_res": 0.1},
+        "skills": [
+            {"name": name, "type": kind, "brief_description": "对指定敌方单体造成量子属性伤害",
+             "detailed_description": "对指定敌方单体造成等同于希儿 220% 攻击力的量子属性伤害，并使希儿速度提高 25%，持续 2 回合。" * 2,
+             "energy_cost": 120 if kind == "ultimate" else None, "cooldown": None,
+             "effects": ["量子伤害", "速度提高", "再现状态"]}
+            for name, kind in (("华月", "basic"), ("归刃", "skill"), ("乱蝶", "ultimate"),
+                               ("再现", "talent"), ("幻身", "technique"))
+        ],
+        "scanned_at": 1760000000.0,
+    }
+    return {"current_strategy": strategy, "character_希儿": character}
+
+
+def _real_payloads(root: str) -> Dict[str, Any]:
+    payloads: Dict[str, Any] = {}
+    for pattern in ("current_strategy.json", "character_*.json"):
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    payloads[os.path.basename(path)[:-5]] = json.load(f).get("data")
+            except Exception as e:
+                logger.warning(f"读取 {path} 失败: {e}")
+    return payloads
+
+
+def _time_per_call(fn: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def benchmark(payloads: Dict[str, Any], repeat: int = 200, threshold: int = 1024) -> List[Dict[str, Any]]:
+    """逐个数据、逐个格式测量编码后字节数与编解码耗时（微秒）。"""
+    baseline: Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]] = (
+        "json-indent2 (当前)",
+        lambda o: json.dumps({"_saved_at": 0, "data": o}, ensure_ascii=False, indent=2).encode("utf-8"),
+        lambda b: json.loads(b.decode("utf-8"))["data"],
+    )
+    candidates = [baseline]
+    for fmt in FORMATS:
+        for compress in (None, *CODECS):
+            try:
+                ser = get_serializer(fmt, compress, threshold=threshold)
+            except RuntimeError as e:
+                logger.warning(f"跳过 {fmt}: {e}")
+                break
+            if compress and ser.name != f"{fmt}+{compress}":
+                continue  # 缺少依赖时发生了回退，避免重复测量
+            candidates.append((ser.name, ser.dumps, ser.loads))
+
+    rows = []
+    for key, obj in payloads.items():
+        for name, dumps, loads in candidates:
+            blob = dumps(obj)
+            rows.append({
+                "payload": key,
+                "format": name,
+                "bytes": len(blob),
+                "encode_us": round(_time_per_call(lambda: dumps(obj), repeat), 1),
+                "decode_us": round(_time_per_call(lambda: loads(blob), repeat), 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比记忆数据在各序列化格式下的体积与编解码耗时")
+    parser.add_argument("--src", default=os.path.join(os.getcwd(), "data", "memory"), help="JSON 记忆目录")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--threshold", type=int, default=1024, help="压缩阈值（字节）")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s - %(message)s")
+    payloads = _real_payloads(args.src)
+    if not payloads:
+        logger.info(f"{args.src} 中没有 current_strategy / character_* 数据，使用内置样例")
+        payloads = _sample_payloads()
+    rows = benchmark(payloads, args.repeat, args.threshold)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    print(f"{'payload':<24}{'format':<22}{'bytes':>9}{'encode_us':>12}{'decode_us':>12}")
+    for r in rows:
+        print(f"{r['payload']:<24}{r['format']:<22}{r['bytes']:>9}{r['encode_us']:>12}{r['decode_us']:>12}")
+
+
+if __name__ == "__main__":
+    main()
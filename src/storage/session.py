@@ -0,0 +1,451 @@
+"""
+会话录制
+- 一次运行录制为一个目录 data/sessions/<session_id>/：
+  * frames.bin：截图帧，内存映射文件，按块扩容，关闭时截断到实际长度
+  * frames.idx：每帧一条定长记录（FRAME_DTYPE），含时间戳、偏移、长度、所属关键帧与截图耗时
+  * events.jsonl：模型请求与响应、键鼠输入、战斗动作（含决策/执行耗时）、战斗开始/结束
+  * meta.json：录制参数与统计
+- 帧先按 scale 缩小，每 keyframe_interval 帧存一个关键帧，其余帧存与关键帧的差值（uint8 回绕相减），
+  再用 zstd（未安装时 zlib）压缩；画面变化小时差值几乎全为 0，压缩后只有几 KB
+- 调用方线程只记录时间戳、分配帧号并入队，缩放、差分、压缩与写盘都在后台线程完成，
+  每个 tick 的录制开销在微秒级；队列满时丢帧并计数，不阻塞战斗循环
+- 请求中的 base64 图片替换为 {"type": "image_ref", "frame": 帧号}，指向本次请求前截取的帧
+- SessionReader 按帧号随机读取（关键帧 + 差值还原）并遍历事件，供回放使用
+"""
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import mmap
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.telemetry import metrics
+
+from .serializers import JSONSerializer
+
+try:
+    import zstandard  # type: ignore
+except Exception:  # 可选依赖
+    zstandard = None  # type: ignore
+
+DEFAULT_SESSION_DIR = os.path.join(os.getcwd(), "data", "sessions")
+FRAMES_FILE = "frames.bin"
+INDEX_FILE = "frames.idx"
+EVENTS_FILE = "events.jsonl"
+META_FILE = "meta.json"
+# 文件头：魔数 + 格式版本
+MAGIC = b"SRSESS\x00\x01"
+
+KIND_KEY = 0
+KIND_DELTA = 1
+CODECS = ("raw", "zlib", "zstd")
+
+FRAME_DTYPE = np.dtype([
+    ("seq", "<u4"),
+    ("ts", "<f8"),
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("key_seq", "<u4"),  # 差值帧所依赖的关键帧号；关键帧为自身
+    ("height", "<u2"),
+    ("width", "<u2"),
+    ("channels", "u1"),
+    ("kind", "u1"),
+    ("codec", "u1"),
+    ("capture_ms", "<f4"),  # NaN 表示未记录
+])
+
+_CHUNK = 64 << 20
+_STOP = object()
+_JSON = JSONSerializer()
+
+
+class _MappedAppender:
+    """只追加的内存映射文件：容量不足时按块扩容并重新映射。"""
+
+    def __init__(self, path: str, chunk: int = _CHUNK):
+        self.chunk = chunk
+        self._f = open(path, "w+b")
+        self._mm: Optional[mmap.mmap] = None
+        self.capacity = 0
+        self.size = 0
+        self._reserve(len(MAGIC))
+        self.append(MAGIC)
+
+    def _reserve(self, need: int):
+        if self.size + need <= self.capacity:
+            return
+        new_cap = max(self.capacity + self.chunk, self.size + need)
+        if self._mm is not None:
+            self._mm.close()
+        self._f.truncate(new_cap)
+        self._mm = mmap.mmap(self._f.fileno(), new_cap)
+        self.capacity = new_cap
+
+    def append(self, blob: bytes) -> int:
+        self._reserve(len(blob))
+        offset = self.size
+        self._mm[offset:offset + len(blob)] = blob
+        self.size += len(blob)
+        return offset
+
+    def flush(self):
+        if self._mm is not None:
+            self._mm.flush()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+        self._f.truncate(self.size)
+        self._f.close()
+
+
+def _compressor(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=1).compress
+    if codec == "zlib":
+        return lambda b: zlib.compress(b, 1)
+    return bytes
+
+
+def _decompress(codec: int, blob: bytes) -> bytes:
+    name = CODECS[codec]
+    if name == "zstd":
+        if zstandard is None:
+            raise RuntimeError("会话使用 zstd 压缩，请先安装: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if name == "zlib":
+        return zlib.decompress(blob)
+    return bytes(blob)
+
+
+def _to_array(image: Any, scale: int) -> np.ndarray:
+    """PIL 图像或 ndarray -> 缩小后的 HxWxC uint8 数组。"""
+    if isinstance(image, np.ndarray):
+        arr = image[::scale, ::scale] if scale > 1 else image
+    else:
+        if getattr(image, "mode", "RGB") not in ("RGB", "L"):
+            image = image.convert("RGB")
+        if scale > 1:
+            image = image.reduce(scale)
+        arr = np.asarray(image)
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    return np.ascontiguousarray(arr, dtype=np.uint8)
+
+
+def _image_refs(messages: List[Dict[str, Any]], frames: List[int]) -> List[Dict[str, Any]]:
+    """复制消息，把 image_url 内容替换为帧号引用：n 张图片依次对应本次请求前最后截取的 n 帧。"""
+    n = sum(1 for m in messages if isinstance(m.get("content"), list)
+            for p in m["content"] if isinstance(p, dict) and p.get("type") == "image_url")
+    tail = frames[-n:] if n else []
+    it = iter([None] * (n - len(tail)) + tail)
+    out = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, list):
+            parts = []
+            for p in content:
+                if isinstance(p, dict) and p.get("type") == "image_url":
+                    parts.append({"type": "image_ref", "frame": next(it, None)})
+                else:
+                    parts.append(p)
+            m = {**m, "content": parts}
+        out.append(m)
+    return out
+
+
+class SessionRecorder:
+    """把一次运行录制为可回放的会话目录。"""
+
+    def __init__(self, root: Optional[str] = None, session_id: Optional[str] = None, scale: int = 4,
+                 keyframe_interval: int = 30, max_queue: int = 256, meta: Optional[Dict[str, Any]] = None):
+        self.session_id = session_id or time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(root or DEFAULT_SESSION_DIR, self.session_id)
+        os.makedirs(self.path, exist_ok=True)
+        self.scale = max(1, int(scale))
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.codec = "zstd" if zstandard is not None else "zlib"
+        self.logger = logging.getLogger(__name__)
+        self.meta: Dict[str, Any] = {
+            "session_id": self.session_id, "version": 1, "started_at": time.time(),
+            "scale": self.scale, "keyframe_interval": self.keyframe_interval, "codec": self.codec,
+            **(meta or {}),
+        }
+        self.stats: Dict[str, Any] = {"frames": 0, "dropped": 0, "events": 0, "frame_bytes": 0,
+                                      "caller_ms": 0.0, "calls": 0}
+        self._seq = 0
+        self._recent_frames: List[int] = []
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._frames = _MappedAppender(os.path.join(self.path, FRAMES_FILE))
+        self._index = open(os.path.join(self.path, INDEX_FILE), "wb")
+        self._index.write(MAGIC)
+        self._events = open(os.path.join(self.path, EVENTS_FILE), "ab")
+        self._compress = _compressor(self.codec)
+        self._key: Optional[np.ndarray] = None
+        self._key_seq = 0
+        self._since_key = 0
+        self._closed = False
+        self._write_meta()
+        self._thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._thread.start()
+
+    # ---- 录制接口（调用方线程） ----
+    def _put(self, item: Any) -> bool:
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def _account(self, start: float):
+        self.stats["caller_ms"] += (time.perf_counter() - start) * 1000.0
+        self.stats["calls"] += 1
+
+    def record_frame(self, image: Any, capture_ms: Optional[float] = None) -> Optional[int]:
+        """登记一帧截图并返回帧号；队列满时丢弃并返回 None。image 入队后不应再被修改。"""
+        start = time.perf_counter()
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+        if self._put(("frame", seq, time.time(), image, capture_ms)):
+            with self._lock:
+                self._recent_frames.append(seq)
+                del self._recent_frames[:-8]
+        else:
+            self.stats["dropped"] += 1
+            metrics.FRAMES_DROPPED.inc()
+            seq = None
+        self._account(start)
+        return seq
+
+    def record_event(self, kind: str, **fields: Any):
+        start = time.perf_counter()
+        if not self._put(("event", {"type": kind, "ts": time.time(), **fields})):
+            self.stats["dropped"] += 1
+        self._account(start)
+
+    def record_llm(self, call_type: Optional[str], model: str, messages: List[Dict[str, Any]],
+                   response: Optional[str], latency_ms: float, usage: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None):
+        start = time.perf_counter()
+        with self._lock:
+            frames, self._recent_frames = self._recent_frames, []
+        # 消息中的图片替换为帧号在写线程完成，这里只传引用
+        item = ("llm", frames, {
+            "type": "llm", "ts": time.time(), "call_type": call_type, "model": model,
+            "response": response, "latency_ms": round(latency_ms, 3), "usage": usage or {}, "error": error,
+        }, messages)
+        if not self._put(item):
+            self.stats["dropped"] += 1
+        self._account(start)
+
+    def record_input(self, op: str, **args: Any):
+        self.record_event("input", op=op, **args)
+
+    def record_action(self, battle_id: int, round: int, action_type: str, character_index: Optional[int],
+                      source: str, reasoning: str = "", decide_ms: Optional[float] = None,
+                      exec_ms: Optional[float] = None, ok: bool = True, **extra: Any):
+        self.record_event(
+            "action", battle_id=battle_id, round=round, action_type=action_type,
+            character_index=character_index, source=source, reasoning=reasoning,
+            decide_ms=decide_ms, exec_ms=exec_ms, ok=ok, **extra,
+        )
+
+    def attach(self, app=None, engine=None, client=None, controller=None, decision=None):
+        """在各组件上挂载录制钩子；传入 app（StarRailAutoBattle）时自动找到其它组件。"""
+        if app is not None:
+            engine = engine or getattr(app, "ai_strategy_engine", None)
+            client = client or getattr(app, "ai_client", None)
+            controller = controller or getattr(app, "game_controller", None)
+            decision = decision or getattr(app, "ai_decision", None)
+        clients = [client] if client is not None else []
+        if engine is not None:
+            engine.recorder = self
+            router = getattr(engine, "router", None)
+            clients.extend(getattr(router, "clients", {}).values())
+        for c in clients:
+            c.recorder = self
+        for target in (controller, decision):
+            if target is not None:
+                target.recorder = self
+        return self
+
+    def flush(self, timeout: Optional[float] = None):
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._frames.close()
+        self._index.close()
+        self._events.close()
+        self.meta["ended_at"] = time.time()
+        self._write_meta()
+        calls = self.stats["calls"]
+        self.logger.info(
+            f"会话已保存：{self.path}（{self.stats['frames']} 帧，{self.stats['events']} 个事件，"
+            f"丢弃 {self.stats['dropped']}，平均录制开销 {self.stats['caller_ms'] / calls if calls else 0:.3f} ms/次）"
+        )
+
+    def _write_meta(self):
+        meta = {**self.meta, "stats": self.stats}
+        tmp = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+
+    # ---- 写线程 ----
+    def _encode_frame(self, seq: int, ts: float, image: Any, capture_ms: Optional[float]) -> np.void:
+        arr = _to_array(image, self.scale)
+        key = (self._key is None or self._key.shape != arr.shape or self._since_key >= self.keyframe_interval)
+        if key:
+            self._key, self._key_seq, self._since_key = arr, seq, 0
+            payload = arr
+        else:
+            payload = np.subtract(arr, self._key, dtype=np.uint8)
+        self._since_key += 1
+        blob = self._compress(payload.tobytes())
+        offset = self._frames.append(blob)
+        rec = np.zeros((), dtype=FRAME_DTYPE)
+        rec["seq"], rec["ts"], rec["offset"], rec["length"] = seq, ts, offset, len(blob)
+        rec["key_seq"] = self._key_seq
+        rec["height"], rec["width"], rec["channels"] = arr.shape
+        rec["kind"] = KIND_KEY if key else KIND_DELTA
+        rec["codec"] = CODECS.index(self.codec)
+        rec["capture_ms"] = np.nan if capture_ms is None else capture_ms
+        self.stats["frame_bytes"] += len(blob)
+        return rec
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                items = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            index: List[np.void] = []
+            events: List[bytes] = []
+            waiters: List[threading.Event] = []
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                    continue
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    continue
+                try:
+                    if item[0] == "frame":
+                        index.append(self._encode_frame(*item[1:]))
+                    elif item[0] == "llm":
+                        _, frames, event, messages = item
+                        event["messages"] = _image_refs(messages, frames)
+                        events.append(_JSON.dumps(event) + b"\n")
+                    else:
+                        events.append(_JSON.dumps(item[1]) + b"\n")
+                except Exception as e:
+                    self.logger.error(f"录制数据编码失败：{e}")
+            try:
+                if index:
+                    self._index.write(np.array(index, dtype=FRAME_DTYPE).tobytes())
+                    self._index.flush()
+                    self._frames.flush()
+                    self.stats["frames"] += len(index)
+                if events:
+                    self._events.write(b"".join(events))
+                    self._events.flush()
+                    self.stats["events"] += len(events)
+            except (OSError, ValueError) as e:
+                self.logger.error(f"写入会话失败：{e}")
+            for w in waiters:
+                w.set()
+
+
+class SessionReader:
+    """读取录制的会话：帧按帧号随机访问，事件按时间顺序遍历。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        with open(os.path.join(path, INDEX_FILE), "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"无法识别的会话索引：{path}")
+            raw = f.read()
+        usable = len(raw) - len(raw) % FRAME_DTYPE.itemsize
+        self.index = np.frombuffer(raw[:usable], dtype=FRAME_DTYPE)
+        self._rows = {int(s): i for i, s in enumerate(self.index["seq"])}
+        frames_path = os.path.join(path, FRAMES_FILE)
+        self._file = open(frames_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(frames_path) else None
+        self._key_cache: Optional[tuple] = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def _decode(self, rec: np.void) -> np.ndarray:
+        start = int(rec["offset"])
+        raw = _decompress(int(rec["codec"]), self._mm[start:start + int(rec["length"])])
+        shape = (int(rec["height"]), int(rec["width"]), int(rec["channels"]))
+        return np.frombuffer(raw, dtype=np.uint8).reshape(shape)
+
+    def frame(self, seq: int) -> Optional[np.ndarray]:
+        """按帧号还原缩小后的帧（HxWxC uint8）；帧被丢弃时返回 None。"""
+        row = self._rows.get(int(seq))
+        if row is None:
+            return None
+        rec = self.index[row]
+        data = self._decode(rec)
+        if int(rec["kind"]) == KIND_KEY:
+            self._key_cache = (int(rec["seq"]), data)
+            return data
+        key_seq = int(rec["key_seq"])
+        if self._key_cache is None or self._key_cache[0] != key_seq:
+            self._key_cache = (key_seq, self._decode(self.index[self._rows[key_seq]]))
+        return np.add(self._key_cache[1], data, dtype=np.uint8)
+
+    def frames(self) -> Iterator[tuple]:
+        """按录制顺序遍历 (帧号, 时间戳, 帧)。"""
+        for rec in self.index:
+            yield int(rec["seq"]), float(rec["ts"]), self.frame(int(rec["seq"]))
+
+    def events(self, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        with open(os.path.join(self.path, EVENTS_FILE), "rb") as f:
+            for line in f:
+                try:
+                    event = _JSON.loads(line)
+                except ValueError:
+                    continue
+                if kind is None or event.get("type") == kind:
+                    yield event
+
+
+def list_sessions(root: Optional[str] = None) -> List[str]:
+    """返回 root 下所有会话目录（按名称排序）。"""
+    return sorted(os.path.dirname(p) for p in glob.glob(os.path.join(root or DEFAULT_SESSION_DIR, "*", META_FILE)))
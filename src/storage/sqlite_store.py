@@ -0,0 +1,228 @@
+"""
+SQLite 记忆存储
+- 与 MemoryStore 相同的 save/load 接口，数据落在单个 WAL 模式的 SQLite 文件中
+- 按键名分表：角色/敌人扫描 -> scans，策略 -> strategies，战斗记录 -> battle_records，其余 -> kv
+- scans 按 (kind, name)、battle_records 按时间戳与敌人建索引；每次写入在事务中完成
+- 进程内读缓存：save 写穿；超过 cache_ttl 后用 PRAGMA data_version 检测其它连接的提交并整体失效
+- data 列默认存紧凑 JSON 文本；配置了 msgpack 或压缩时存为 BLOB，读取时两种都能识别
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .serializers import JSONSerializer, Serializer, get_serializer, load_any
+
+DEFAULT_DB_PATH = os.path.join(os.getcwd(), "data", "memory.db")
+
+SCAN_PREFIXES = {"character_": "character", "enemy_": "enemy"}
+BATTLE_RECORD_PREFIX = "battle_record_"
+STRATEGY_KEYS = {"current_strategy", "strategy_plan", "ai_strategy_text", "planning_summary"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    saved_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS scans (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    saved_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scans_kind_name ON scans(kind, name);
+CREATE INDEX IF NOT EXISTS idx_scans_saved_at ON scans(saved_at);
+CREATE TABLE IF NOT EXISTS strategies (
+    key TEXT PRIMARY KEY,
+    saved_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_strategies_saved_at ON strategies(saved_at);
+CREATE TABLE IF NOT EXISTS battle_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    enemy TEXT,
+    result TEXT,
+    rounds INTEGER,
+    saved_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_battle_records_ts ON battle_records(ts);
+CREATE INDEX IF NOT EXISTS idx_battle_records_enemy ON battle_records(enemy, ts);
+"""
+
+
+class SQLiteMemoryStore:
+    def __init__(self, path: Optional[str] = None, cache_ttl: float = 0.5, serializer: Optional[Serializer] = None):
+        self.path = path or DEFAULT_DB_PATH
+        self.serializer = serializer or get_serializer()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # UI 与战斗循环可能在不同线程访问，同一连接由锁串行化
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._in_tx = False
+        self.cache_ttl = cache_ttl
+        # key -> data；缓存的数据与调用方共享，请按只读使用
+        self._cache: Dict[str, Any] = {}
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._checked_at = time.monotonic()
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+    # ---- 事务 ----
+    @contextmanager
+    def transaction(self) -> Iterator["SQLiteMemoryStore"]:
+        """批量写入时包一层事务；嵌套调用复用外层事务。"""
+        with self._lock:
+            if self._in_tx:
+                yield self
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._in_tx = True
+            try:
+                yield self
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                self._cache.clear()  # 事务内写穿的缓存随回滚作废
+                raise
+            else:
+                self._conn.execute("COMMIT")
+            finally:
+                self._in_tx = False
+
+    def _validate_cache(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.cache_ttl:
+            return
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._cache.clear()
+            self._data_version = version
+        self._checked_at = now
+
+    def invalidate(self, name: Optional[str] = None):
+        """丢弃指定键（或全部）的缓存，下次 load 重新查询。"""
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(name, None)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """与 MemoryStore 接口一致；SQLite 的 save 返回前已提交，无需等待。"""
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---- 编解码 ----
+    def _encode(self, data: Any):
+        blob = self.serializer.dumps(data)
+        # 纯 JSON 以文本保存，便于用 sqlite3 命令行直接查看
+        return blob.decode("utf-8") if type(self.serializer) is JSONSerializer else blob
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return json.loads(value) if isinstance(value, str) else load_any(value)
+
+    # ---- 键名路由 ----
+    @staticmethod
+    def _route(name: str) -> Tuple[str, Optional[str], Optional[str]]:
+        """返回 (表名, kind, 名称/时间戳)。"""
+        for prefix, kind in SCAN_PREFIXES.items():
+            if name.startswith(prefix):
+                return "scans", kind, name[len(prefix):]
+        if name.startswith(BATTLE_RECORD_PREFIX) and name[len(BATTLE_RECORD_PREFIX):].isdigit():
+            return "battle_records", None, name[len(BATTLE_RECORD_PREFIX):]
+        if name in STRATEGY_KEYS:
+            return "strategies", None, None
+        return "kv", None, None
+
+    # ---- 与 MemoryStore 一致的接口 ----
+    def save(self, name: str, data: Dict[str, Any], saved_at: Optional[int] = None) -> str:
+        table, kind, sub = self._route(name)
+        saved_at = int(time.time()) if saved_at is None else int(saved_at)
+        payload = self._encode(data)
+        with self.transaction():
+            if table == "scans":
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO scans(key, kind, name, saved_at, data) VALUES (?, ?, ?, ?, ?)",
+                    (name, kind, sub, saved_at, payload),
+                )
+            elif table == "battle_records":
+                record = data if isinstance(data, dict) else {}
+                self._conn.execute(
+                    "INSERT INTO battle_records(ts, enemy, result, rounds, saved_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    (int(sub), record.get("enemy"), record.get("result"), record.get("rounds"), saved_at, payload),
+                )
+            else:
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {table}(key, saved_at, data) VALUES (?, ?, ?)",
+                    (name, saved_at, payload),
+                )
+        self._cache[name] = data
+        return f"{self.path}#{table}/{name}"
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        table, _, sub = self._route(name)
+        with self._lock:
+            self._validate_cache()
+            if name in self._cache:
+                self.cache_stats["hits"] += 1
+                return self._cache[name]
+            self.cache_stats["misses"] += 1
+            if table == "battle_records":
+                row = self._conn.execute(
+                    "SELECT data FROM battle_records WHERE ts = ? ORDER BY id DESC LIMIT 1", (int(sub),)
+                ).fetchone()
+            else:
+                row = self._conn.execute(f"SELECT data FROM {table} WHERE key = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            data = self._decode(row[0])
+            self._cache[name] = data
+            return data
+
+    # ---- 索引查询 ----
+    def find_scans(self, kind: str, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """按类型（character/enemy）与名称查询扫描结果，最近的在前。"""
+        sql = "SELECT data FROM scans WHERE kind = ?"
+        args: List[Any] = [kind]
+        if name is not None:
+            sql += " AND name = ?"
+            args.append(name)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY saved_at DESC", args).fetchall()
+        return [self._decode(r[0]) for r in rows]
+
+    def battle_records(self, since: Optional[int] = None, until: Optional[int] = None,
+                       enemy: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按时间区间与敌人查询战斗记录（时间升序），每项附带 _ts 字段。"""
+        sql = "SELECT ts, data FROM battle_records WHERE 1 = 1"
+        args: List[Any] = []
+        if since is not None:
+            sql += " AND ts >= ?"
+            args.append(int(since))
+        if until is not None:
+            sql += " AND ts < ?"
+            args.append(int(until))
+        if enemy is not None:
+            sql += " AND enemy = ?"
+            args.append(enemy)
+        sql += " ORDER BY ts, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [{**self._decode(data), "_ts": ts} for ts, data in rows]
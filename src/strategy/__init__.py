@@ -3,11 +3,13 @@
 - MaterialFarmStrategy: 刷材料，追求更少回合、更快结算
 - AbyssStrategy: 深渊/混沌回忆，结合祝福制定最少轮数与行动顺序
 - CustomStrategy: 自定义场景的通用作战框架
+- search_teams: 从完整角色池中搜索指定关卡的最优 4 人队伍
 """
 from .base import StrategyPlan, StrategyContext, Strategy, StrategyManager
 from .material_farm import MaterialFarmStrategy
 from .abyss import AbyssStrategy
 from .custom import CustomStrategy
+from .team_search import TeamCandidate, TeamSearchResult, search_teams
 
 __all__ = [
     "StrategyPlan",
@@ -17,4 +19,7 @@ __all__ = [
     "MaterialFarmStrategy",
     "AbyssStrategy",
     "CustomStrategy",
+    "TeamCandidate",
+    "TeamSearchResult",
+    "search_teams",
 ]
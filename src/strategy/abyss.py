@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 from .base import Strategy, StrategyPlan, StrategyContext
-from .utils import estimate_expected_rounds
+from .utils import estimate_expected_rounds, simulate_rounds, summarize_simulation
 
 
 class AbyssStrategy(Strategy):
@@ -33,20 +33,35 @@ class AbyssStrategy(Strategy):
         )
         steps = self._heuristic_steps(ctx)
 
+        rr = ctx.preferences.get("reroll_settings", {}) or {}
+        max_retries = rr.get("max_retries", 5)
+
         # 如选择极限方案且允许凹，追加玩家可配置的凹点偏好
         if selected == "B" and allow_reroll:
-            rr = ctx.preferences.get("reroll_settings", {}) or {}
             bait_target = rr.get("bait_target") or "指定角色"
             bait_condition = rr.get("bait_condition") or "满足指定敌方攻击条件"
-            max_retries = rr.get("max_retries", 5)
             steps.append(
                 f"凹策略（可选）：诱导 {bait_target} 吃关键一击（条件：{bait_condition}），以触发祝福/能量铺垫；最大重试 {max_retries} 次"
             )
 
-        # 深渊通常更复杂，基于刷本估计基础上加一回合作为保守估算
-        expected_rounds = max(1, estimate_expected_rounds(ctx.computed) + 1)
-        if selected == "B" and allow_reroll:
-            expected_rounds = max(1, expected_rounds - 1)
+        # 深渊容错更低，以模拟分布的 P90 作为保守估算；数据不足时回退到刷本估计 + 1 回合
+        simulation = None
+        sim = simulate_rounds(ctx)
+        if sim is not None:
+            simulation = summarize_simulation(sim, max_retries if allow_reroll else None)
+            expected_rounds = sim.p90
+            steps.append(f"模拟 {sim.trials} 局：平均 {sim.mean:.2f} 回合，P50 {sim.p50} / P90 {sim.p90}")
+            if allow_reroll:
+                rerolled = simulation["plan_b"]
+                steps.append(
+                    f"凹本收益：最多重试 {max_retries} 次时平均 {rerolled['mean']} 回合（少 {simulation['reroll_gain']} 回合），P90 {rerolled['p90']}"
+                )
+                if selected == "B":
+                    expected_rounds = rerolled["p90"]
+        else:
+            expected_rounds = max(1, estimate_expected_rounds(ctx.computed) + 1)
+            if selected == "B" and allow_reroll:
+                expected_rounds = max(1, expected_rounds - 1)
 
         plan = StrategyPlan(
             name="深渊 - 最小轮数方案",
@@ -56,5 +71,6 @@ class AbyssStrategy(Strategy):
             steps=steps,
             requires_reroll=(selected == "B" and allow_reroll),
             expected_rounds=expected_rounds,
+            simulation=simulation,
         )
         return plan
@@ -16,6 +16,7 @@ class StrategyPlan:
     steps: List[str] = field(default_factory=list)  # 执行步骤
     requires_reroll: bool = False  # 是否涉及“凹”
     expected_rounds: Optional[int] = None
+    simulation: Optional[Dict[str, Any]] = None  # 战斗模拟得到的回合分布与凹本收益
 
 
 @dataclass
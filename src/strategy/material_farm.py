@@ -6,7 +6,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 from .base import Strategy, StrategyPlan, StrategyContext
-from .utils import estimate_expected_rounds
+from .utils import estimate_expected_rounds, simulate_rounds, summarize_simulation
 
 
 class MaterialFarmStrategy(Strategy):
@@ -31,21 +31,36 @@ class MaterialFarmStrategy(Strategy):
         )
         steps = self._heuristic_steps(ctx)
 
+        rr = ctx.preferences.get("reroll_settings", {}) or {}
+        max_retries = rr.get("max_retries", 5)
+
         # 如选择极限方案且允许凹，追加玩家可配置的凹点偏好
         if selected == "B" and allow_reroll:
-            rr = ctx.preferences.get("reroll_settings", {}) or {}
             bait_target = rr.get("bait_target") or "指定角色"
             bait_condition = rr.get("bait_condition") or "满足指定敌方攻击条件"
-            max_retries = rr.get("max_retries", 5)
             steps.append(
                 f"凹策略（可选）：诱导敌方将攻击打到 {bait_target}（条件：{bait_condition}），以铺能/触发被动；最大重试 {max_retries} 次"
             )
 
-        # 基于队伍与敌人数据的粗略回合估计
-        expected_rounds = estimate_expected_rounds(ctx.computed)
-        if selected == "B" and allow_reroll:
-            # 允许适度下修一回合作为“凹”带来的收益上限
-            expected_rounds = max(1, expected_rounds - 1)
+        # 基于战斗模拟的回合分布；数据不足时回退到粗略估计
+        simulation = None
+        sim = simulate_rounds(ctx)
+        if sim is not None:
+            simulation = summarize_simulation(sim, max_retries if allow_reroll else None)
+            expected_rounds = sim.p50
+            steps.append(f"模拟 {sim.trials} 局：平均 {sim.mean:.2f} 回合，P50 {sim.p50} / P90 {sim.p90}")
+            if allow_reroll:
+                rerolled = simulation["plan_b"]
+                steps.append(
+                    f"凹本收益：最多重试 {max_retries} 次时平均 {rerolled['mean']} 回合（少 {simulation['reroll_gain']} 回合），P50 {rerolled['p50']}"
+                )
+                if selected == "B":
+                    expected_rounds = rerolled["p50"]
+        else:
+            expected_rounds = estimate_expected_rounds(ctx.computed)
+            if selected == "B" and allow_reroll:
+                # 允许适度下修一回合作为“凹”带来的收益上限
+                expected_rounds = max(1, expected_rounds - 1)
 
         plan = StrategyPlan(
             name="刷材料 - 快速周回方案",
@@ -55,5 +70,6 @@ class MaterialFarmStrategy(Strategy):
             steps=steps,
             requires_reroll=(selected == "B" and allow_reroll),
             expected_rounds=expected_rounds,
+            simulation=simulation,
         )
         return plan
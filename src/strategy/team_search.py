@@ -0,0 +1,214 @@
+"""
+队伍搜索：从完整角色池中为指定关卡挑选最优的 4 人队伍
+- 粗筛：基于 RosterTable 的列式属性，在 NumPy 中对全部 C(n, 4) 组合做向量化评分（期望输出、弱点覆盖、生存位），剪枝到少量候选
+- 精排：候选队伍用 analyze_team_enemy_synergy 与战斗模拟器评估，分发到 ProcessPoolExecutor；
+  RosterTable 的数值列（compute() 结果与等级）放在 multiprocessing.shared_memory 中，
+  各进程在初始化器里映射为只读视图，只额外传入名字/元素/命途几列字符串，不再把整支角色池的配置字典序列化到每个进程
+"""
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import combinations
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.models.combat import analyze_team_enemy_synergy
+from src.models.enemy import enemy_from_config
+from src.models.simulator import DEFAULT_RESISTANCE, SUPPORT_DMG_SCALE, SUPPORT_PATHS, simulate_battle
+from src.models.tables import RosterTable
+
+TEAM_SIZE = 4
+SUSTAIN_PATHS = {"Preservation", "Abundance"}
+# 无生存位的队伍评分折算
+NO_SUSTAIN_FACTOR = 0.85
+# 弱点覆盖带来的击破收益（粗筛用）
+WEAKNESS_BONUS = 0.5
+
+
+@dataclass
+class TeamCandidate:
+    names: List[str]
+    score: float
+    expected_rounds: Optional[float] = None
+    p90: Optional[int] = None
+    synergy: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class TeamSearchResult:
+    teams: List[TeamCandidate]
+    total_combinations: int
+    refined: int
+    elapsed: float
+
+
+# 进程池内只读共享的角色池数据（由 _init_worker 设置）
+_shared: Dict[str, Any] = {}
+
+# 共享内存中数值列的描述：(共享内存名, 形状)
+ColumnsSpec = Tuple[str, Tuple[int, ...]]
+
+
+def _init_worker(columns: Union[np.ndarray, ColumnsSpec], keys: List[str], names: List[str],
+                 elements: List[str], paths: List[str], enemy: Dict[str, Any], trials: int, seed: int):
+    """
+    columns 为 (n, len(keys) + 1) 的 float64 矩阵：前 len(keys) 列为 RosterTable.compute() 的各项，最后一列为等级。
+    在当前进程内计算时直接传数组，进程池中传 ColumnsSpec，映射共享内存为只读视图。
+    """
+    if isinstance(columns, np.ndarray):
+        cols = columns.view()
+    else:
+        shm = shared_memory.SharedMemory(name=columns[0])
+        cols = np.ndarray(columns[1], dtype=np.float64, buffer=shm.buf)
+        # 映射需与进程同寿命，保存引用以免被回收
+        _shared["shm"] = shm
+    cols.flags.writeable = False
+    _shared.update(cols=cols, keys=keys, names=names, elements=elements, paths=paths,
+                   enemy=enemy, trials=trials, seed=seed)
+
+
+def _refine_team(indices: Tuple[int, ...]) -> Tuple[Tuple[int, ...], float, int, Dict[str, Any]]:
+    cols, keys = _shared["cols"], _shared["keys"]
+    names, elements, paths = _shared["names"], _shared["elements"], _shared["paths"]
+    roster = [{"name": names[i], "element": elements[i], "path": paths[i]} for i in indices]
+    computed = [{"name": names[i], **{k: float(cols[i, j]) for j, k in enumerate(keys)}} for i in indices]
+    enemy = _shared["enemy"]
+    synergy = analyze_team_enemy_synergy(roster, computed, enemy)
+    team = [
+        {**c, "element": r["element"], "path": r["path"], "level": float(cols[i, -1])}
+        for i, r, c in zip(indices, roster, computed)
+    ]
+    sim = simulate_battle(team, enemy, trials=_shared["trials"], seed=_shared["seed"])
+    return indices, sim.mean, sim.p90, synergy
+
+
+def _coarse_scores(table: RosterTable, stats: Dict[str, np.ndarray], enemy: Dict[str, Any],
+                   combos: np.ndarray) -> np.ndarray:
+    weaknesses = set(enemy.get("weaknesses", []) or [])
+    resistances = enemy.get("resistances", {}) or {}
+
+    atk = stats["atk"]
+    cr = stats["crit_rate"]
+    cd = stats["crit_dmg"]
+    spd = np.where(stats["spd"] > 0, stats["spd"], 100.0)
+    is_weak = np.array([e in weaknesses for e in table.elements], dtype=np.float64)
+    res = np.array([
+        float(resistances.get(e, 0.0 if e in weaknesses else DEFAULT_RESISTANCE) or 0.0) for e in table.elements
+    ])
+    scale = np.array([SUPPORT_DMG_SCALE if p in SUPPORT_PATHS else 1.0 for p in table.paths])
+    sustain = np.array([p in SUSTAIN_PATHS for p in table.paths])
+
+    # 每 100 行动值的期望伤害
+    dpav = atk * (1.0 + cr * cd) * scale * (1.0 - res) * spd / 100.0
+
+    team_dpav = dpav[combos].sum(axis=1)
+    weak_ratio = is_weak[combos].mean(axis=1)
+    has_sustain = sustain[combos].any(axis=1)
+    return team_dpav * (1.0 + WEAKNESS_BONUS * weak_ratio) * np.where(has_sustain, 1.0, NO_SUSTAIN_FACTOR)
+
+
+def search_teams(
+    roster: List[Dict[str, Any]],
+    enemy_cfg: Dict[str, Any],
+    top_k: int = 5,
+    refine: int = 64,
+    required: Optional[Sequence[str]] = None,
+    trials: int = 2000,
+    workers: Optional[int] = None,
+    seed: int = 0,
+) -> TeamSearchResult:
+    """
+    在 roster（配置格式的角色列表）中搜索对 enemy_cfg 最优的 4 人队伍。
+    - refine: 粗筛后进入模拟精排的候选数量
+    - required: 必须上场的角色名
+    - workers: 进程数；None 为 CPU 核数，0/1 表示在当前进程内计算
+    返回按得分从高到低排列的 top_k 队伍。
+    """
+    start = time.perf_counter()
+    if len(roster) < TEAM_SIZE:
+        raise ValueError(f"角色池不足 {TEAM_SIZE} 人，无法组队")
+
+    table = RosterTable.from_configs(roster)
+    stats = table.compute()
+    computed = table.computed_rows()
+    enemy_obj = enemy_from_config(enemy_cfg or {})
+    enemy = {
+        **enemy_obj.computed,
+        "level": enemy_obj.level,
+        "weaknesses": enemy_obj.weaknesses,
+        "resistances": enemy_obj.resistances,
+    }
+
+    combos = np.array(list(combinations(range(len(roster)), TEAM_SIZE)), dtype=np.int32)
+    total = len(combos)
+    if required:
+        names = [r.get("name") for r in roster]
+        for name in required:
+            if name not in names:
+                raise ValueError(f"角色池中没有必选角色：{name}")
+            combos = combos[(combos == names.index(name)).any(axis=1)]
+
+    if len(combos) == 0:
+        raise ValueError("没有满足必选角色约束的队伍")
+
+    scores = _coarse_scores(table, stats, enemy, combos)
+    keep = min(len(combos), max(top_k, refine))
+    order = np.argpartition(-scores, keep - 1)[:keep] if keep < len(combos) else np.arange(len(combos))
+    candidates = [tuple(int(i) for i in combos[j]) for j in order]
+    coarse = {cand: float(scores[j]) for cand, j in zip(candidates, order)}
+
+    # 敌人无生命值时无法模拟，直接按粗筛得分排序
+    if float(enemy.get("hp", 0) or 0) <= 0:
+        teams = [
+            TeamCandidate(
+                names=[roster[i].get("name", "unknown") for i in cand],
+                score=round(coarse[cand], 4),
+                synergy=analyze_team_enemy_synergy([roster[i] for i in cand], [computed[i] for i in cand], enemy),
+            )
+            for cand in candidates
+        ]
+    else:
+        keys = list(stats)
+        columns = np.column_stack([stats[k] for k in keys] + [table.level]).astype(np.float64)
+        rest = (keys, table.names, table.elements, table.paths, enemy, trials, seed)
+        if workers is not None and workers <= 1:
+            _init_worker(columns, *rest)
+            refined = [_refine_team(cand) for cand in candidates]
+        else:
+            n_workers = min(workers or os.cpu_count() or 1, len(candidates))
+            shm = shared_memory.SharedMemory(create=True, size=columns.nbytes)
+            try:
+                np.ndarray(columns.shape, dtype=np.float64, buffer=shm.buf)[:] = columns
+                init_args = ((shm.name, columns.shape),) + rest
+                with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=init_args) as pool:
+                    chunk = max(1, len(candidates) // (n_workers * 4))
+                    refined = list(pool.map(_refine_team, candidates, chunksize=chunk))
+            finally:
+                shm.close()
+                shm.unlink()
+
+        teams = []
+        for cand, mean_rounds, p90, synergy in refined:
+            sustain = any((roster[i].get("path") or "") in SUSTAIN_PATHS for i in cand)
+            # 得分：期望回合越少越高；无生存位按同一系数折算
+            score = 100.0 / max(mean_rounds, 1e-6) * (1.0 if sustain else NO_SUSTAIN_FACTOR)
+            teams.append(TeamCandidate(
+                names=[roster[i].get("name", "unknown") for i in cand],
+                score=round(score, 4),
+                expected_rounds=round(mean_rounds, 3),
+                p90=p90,
+                synergy=synergy,
+            ))
+
+    teams.sort(key=lambda t: t.score, reverse=True)
+    return TeamSearchResult(
+        teams=teams[:top_k],
+        total_combinations=total,
+        refined=len(candidates),
+        elapsed=round(time.perf_counter() - start, 3),
+    )
@@ -1,12 +1,19 @@
 """
 策略帮助函数
-- 提供基于当前已计算数据的粗略回合数估计
-- 后续可替换为更精确的公式或学习模型
+- 基于蒙特卡洛战斗模拟给出回合数分布（均值 / P50 / P90）与凹本收益
+- 队伍或敌人数据不足以模拟时，回退到基于当前已计算数据的粗略回合数估计
 """
 from __future__ import annotations
 
 from math import ceil
-from typing import Dict
+from typing import Any, Dict, List, Optional
+
+from src.models.simulator import SimulationResult, simulate_battle
+from .base import StrategyContext
+
+# 策略规划使用固定随机种子，保证同一份配置多次规划给出相同结果
+SIM_TRIALS = 10000
+SIM_SEED = 0
 
 
 def estimate_expected_rounds(computed: Dict) -> int:
@@ -17,7 +24,7 @@ def estimate_expected_rounds(computed: Dict) -> int:
     - 对于刷材料场景，假设每回合每人至少打出一次有效命中（带有暴击期望折算）
     - 加入一个折损系数，考虑到溢伤、无效回合、能量与技能冷却等
     - 敌人只有一个时：rounds = ceil(enemy_hp / team_dpr)
-    - 该函数仅作为占位，便于策略模块给出更贴近队伍的回合预估
+    - 该函数仅作为占位，在无法进行战斗模拟时作为回退（见 simulate_rounds）
     """
     if not computed:
         return 2
@@ -43,3 +50,45 @@ def estimate_expected_rounds(computed: Dict) -> int:
 
     # 将极端值裁剪在 [1, 10] 区间以避免离谱估计影响体验
     return max(1, min(10, rounds))
+
+
+def simulate_rounds(ctx: StrategyContext, trials: int = SIM_TRIALS) -> Optional[SimulationResult]:
+    """
+    用战斗模拟器估计回合数分布。
+    - 角色数值取自 ctx.computed["characters"]，元素/命途/等级按顺序取自 ctx.roster
+    - 敌人数值取自 ctx.computed["enemy"]，等级取自 ctx.enemy
+    队伍无攻击力或敌人无生命值时返回 None，由调用方回退到 estimate_expected_rounds。
+    """
+    computed = ctx.computed or {}
+    computed_chars: List[Dict[str, Any]] = computed.get("characters", []) or []
+    enemy: Dict[str, Any] = dict(computed.get("enemy", {}) or {})
+    if not computed_chars or float(enemy.get("hp", 0) or 0) <= 0:
+        return None
+    if sum(float(c.get("atk", 0) or 0) for c in computed_chars) <= 0:
+        return None
+
+    team: List[Dict[str, Any]] = []
+    for i, c in enumerate(computed_chars):
+        raw = ctx.roster[i] if i < len(ctx.roster or []) else {}
+        team.append({
+            **c,
+            "element": raw.get("element"),
+            "path": raw.get("path"),
+            "level": raw.get("level", 80),
+        })
+    enemy.setdefault("level", (ctx.enemy or {}).get("level", 90))
+    return simulate_battle(team, enemy, trials=trials, seed=SIM_SEED)
+
+
+def summarize_simulation(sim: SimulationResult, max_retries: Optional[int] = None) -> Dict[str, Any]:
+    """
+    整理模拟结果供方案展示与落盘：
+    - plan_a：不凹本的回合分布
+    - plan_b / reroll_gain：给定最大重试次数时，凹本后的回合分布与平均回合的下降量
+    """
+    summary: Dict[str, Any] = {"plan_a": sim.to_dict()}
+    if max_retries is not None:
+        rerolled = sim.with_rerolls(max_retries)
+        summary["plan_b"] = {**rerolled.to_dict(), "max_retries": int(max_retries)}
+        summary["reroll_gain"] = round(sim.mean - rerolled.mean, 3)
+    return summary
@@ -0,0 +1,7 @@
+"""
+运行时观测：各阶段耗时的追踪 span、指标与性能剖析
+"""
+from .profiling import Profiler
+from .tracing import export_chrome_trace, span, traced
+
+__all__ = ["span", "traced", "export_chrome_trace", "Profiler"]
@@ -0,0 +1,405 @@
+"""
+进程内指标
+- Counter / Gauge / Histogram，支持标签；模块级 REGISTRY 与下方预定义的指标供各模块直接使用
+- Histogram 采用 HDR 风格的对数-线性分桶：每个 2 的幂区间再等分为 64 个子桶，分位数相对误差约 1%，
+  内存固定（约 2000 个计数），记录为 O(1)；分位数从分桶计数得出
+- render_prometheus()：Prometheus 文本格式，直方图以 summary（分位数 + _sum + _count）输出
+- MetricsServer：本地 HTTP 服务，/metrics 为 Prometheus 文本，/metrics.json 为 JSON 快照
+- SnapshotWriter：后台线程定期把快照原子写入 JSON（及同名 .prom）文件，供长时间刷本后查看
+- 配置 telemetry.prices（模型 -> 每百万 token 单价）后同时累计 API 花费
+"""
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_METRICS_DIR = os.path.join(os.getcwd(), "data", "metrics")
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# 每个 2 的幂区间的子桶数为 2 ** (SUB_BITS - 1)
+SUB_BITS = 7
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + sorted((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                    for k, v in items)
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if isinstance(v, float) and (math.isinf(v) or math.isnan(v)):
+        return "NaN" if math.isnan(v) else ("+Inf" if v > 0 else "-Inf")
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str = ""):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def _header(self, kind: Optional[str] = None) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind or self.kind}"]
+
+
+class Counter(_Metric):
+    """单调递增的计数。"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str = ""):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        if amount < 0:
+            raise ValueError("Counter 只能增加")
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def total(self, **match: Any) -> float:
+        """所有包含 match 标签的序列之和。"""
+        want = set(_label_key(match))
+        return sum(v for k, v in list(self._values.items()) if want <= set(k))
+
+    def render(self) -> List[str]:
+        return self._header() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": self.kind, "values": [{"labels": dict(k), "value": v} for k, v in sorted(self._values.items())]}
+
+
+class Gauge(Counter):
+    """可增可减的瞬时值。"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+
+class HdrHistogram:
+    """
+    单个序列的对数-线性直方图。数值先按 resolution 换算为整数刻度，
+    小于 2**SUB_BITS 的刻度精确计数，更大的数值每个 2 的幂区间分为 2**(SUB_BITS-1) 个子桶。
+    """
+    _HALF = 1 << (SUB_BITS - 1)
+
+    def __init__(self, resolution: float = 1.0, highest: float = 3600.0):
+        self.resolution = resolution
+        self.max_ticks = max(1 << SUB_BITS, int(highest / resolution))
+        self.counts = [0] * (self._index(self.max_ticks) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @classmethod
+    def _index(cls, ticks: int) -> int:
+        if ticks < (1 << SUB_BITS):
+            return ticks
+        e = ticks.bit_length() - SUB_BITS
+        return cls._HALF * e + (ticks >> e)
+
+    @classmethod
+    def _lower(cls, index: int) -> int:
+        if index < (1 << SUB_BITS):
+            return index
+        e = index // cls._HALF - 1
+        return (index - cls._HALF * e) << e
+
+    def record(self, value: float):
+        ticks = min(self.max_ticks, max(0, int(value / self.resolution)))
+        self.counts[self._index(ticks)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                # 取子桶中点，并限制在实际观测到的范围内
+                mid = (self._lower(i) + self._lower(i + 1)) / 2.0 * self.resolution
+                return min(self.max, max(self.min, mid))
+        return self.max
+
+
+class Histogram(_Metric):
+    """带标签的 HDR 直方图，Prometheus 中以 summary 形式输出。"""
+    kind = "summary"
+
+    def __init__(self, name: str, help: str = "", resolution: float = 1e-4, highest: float = 3600.0):
+        super().__init__(name, help)
+        self.resolution = resolution
+        self.highest = highest
+        self._series: Dict[LabelKey, HdrHistogram] = {}
+
+    def _get(self, labels: Dict[str, Any]) -> HdrHistogram:
+        key = _label_key(labels)
+        h = self._series.get(key)
+        if h is None:
+            h = self._series.setdefault(key, HdrHistogram(self.resolution, self.highest))
+        return h
+
+    def observe(self, value: float, **labels: Any):
+        h = self._get(labels)
+        with self._lock:
+            h.record(value)
+
+    def quantile(self, q: float, **labels: Any) -> Optional[float]:
+        h = self._series.get(_label_key(labels))
+        with self._lock:
+            return h.quantile(q) if h is not None else None
+
+    def count(self, **labels: Any) -> int:
+        h = self._series.get(_label_key(labels))
+        return h.count if h is not None else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, h in sorted(self._series.items()):
+                for q in SUMMARY_QUANTILES:
+                    v = h.quantile(q)
+                    lines.append(f"{self.name}{_fmt_labels(key, {'quantile': str(q)})} "
+                                 f"{_fmt_value(v if v is not None else math.nan)}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(h.sum)}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {h.count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        series = []
+        with self._lock:
+            for key, h in sorted(self._series.items()):
+                series.append({
+                    "labels": dict(key), "count": h.count, "sum": h.sum,
+                    "min": h.min if h.count else None, "max": h.max if h.count else None,
+                    **{f"p{q * 100:g}": h.quantile(q) for q in SUMMARY_QUANTILES},
+                })
+        return {"type": "histogram", "series": series}
+
+
+class MetricsRegistry:
+    """按名称保存指标；同名重复注册返回已有对象。"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _register(self, cls, name: str, help: str, **kw) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kw)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._register(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._register(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", resolution: float = 1e-4, highest: float = 3600.0) -> Histogram:
+        return self._register(Histogram, name, help, resolution=resolution, highest=highest)
+
+    def metrics(self) -> Iterable[_Metric]:
+        return list(self._metrics.values())
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ts": time.time(),
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "metrics": {m.name: m.snapshot() for m in self.metrics()},
+        }
+
+
+REGISTRY = MetricsRegistry()
+
+# ---- 预定义指标 ----
+DECISION_LATENCY = REGISTRY.histogram("srab_decision_latency_seconds", "每回合决策耗时（截图、编码、模型请求与解析）")
+LLM_LATENCY = REGISTRY.histogram("srab_llm_request_seconds", "模型请求耗时（含重试与对冲），按调用类型")
+LLM_ERRORS = REGISTRY.counter("srab_llm_errors_total", "最终失败的模型请求，按调用类型")
+TOKENS = REGISTRY.counter("srab_tokens_total", "模型 token 用量，direction 为 in / out / cached")
+PROMPT_CACHE_HITS = REGISTRY.counter("srab_prompt_cache_hits_total", "命中提示词缓存的请求数")
+PROMPT_CACHE_RATIO = REGISTRY.gauge("srab_prompt_cache_hit_ratio", "累计输入 token 中命中提示词缓存的比例")
+API_COST = REGISTRY.counter("srab_api_cost_total", "按 telemetry.prices 估算的 API 花费")
+UPLOAD_BYTES = REGISTRY.counter("srab_upload_bytes_total", "发往模型接口的请求体字节数")
+FRAMES_CAPTURED = REGISTRY.counter("srab_frames_captured_total", "截图次数")
+FRAMES_DROPPED = REGISTRY.counter("srab_frames_dropped_total", "会话录制队列已满而丢弃的帧")
+INPUT_DISPATCH = REGISTRY.histogram("srab_input_dispatch_seconds", "输入批次从第一个到最后一个事件发出的耗时")
+INPUT_REACTION = REGISTRY.histogram("srab_input_reaction_seconds", "从发出输入到画面变化的延迟")
+ACTIONS = REGISTRY.counter("srab_actions_total", "执行的动作，按动作类型与决策来源")
+BATTLES = REGISTRY.counter("srab_battles_total", "结束的战斗，按结果")
+TURNS_PER_BATTLE = REGISTRY.histogram("srab_turns_per_battle", "每场战斗的回合数", resolution=1.0, highest=1000.0)
+BATTLE_ROUND = REGISTRY.gauge("srab_battle_round", "当前战斗的回合数")
+
+_prices: Dict[str, Dict[str, float]] = {}
+
+
+def set_prices(prices: Optional[Dict[str, Dict[str, float]]]):
+    """prices：模型名 -> {"input", "output", "cached"}，单位为每百万 token 的价格。"""
+    _prices.clear()
+    _prices.update(prices or {})
+
+
+def record_usage(model: str, call_type: Optional[str], usage: Dict[str, Any], cached: int = 0):
+    """累计一次请求的 token 用量、缓存命中与花费。"""
+    if not usage:
+        return
+    ct = call_type or "default"
+    tokens_in = int(usage.get("prompt_tokens") or 0)
+    tokens_out = int(usage.get("completion_tokens") or 0)
+    TOKENS.inc(tokens_in, direction="in", call_type=ct)
+    TOKENS.inc(tokens_out, direction="out", call_type=ct)
+    if cached:
+        TOKENS.inc(cached, direction="cached", call_type=ct)
+        PROMPT_CACHE_HITS.inc(call_type=ct)
+    total_in = TOKENS.total(direction="in")
+    if total_in:
+        PROMPT_CACHE_RATIO.set(TOKENS.total(direction="cached") / total_in)
+    price = _prices.get(model)
+    if price:
+        cost = ((tokens_in - cached) * float(price.get("input", 0)) + cached * float(price.get("cached", price.get("input", 0)))
+                + tokens_out * float(price.get("output", 0))) / 1e6
+        API_COST.inc(cost, model=model)
+
+
+# ---- 输出 ----
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, fmt, *args):
+        logger.debug("metrics: " + fmt % args)
+
+    def do_GET(self):
+        registry = self.server.registry
+        path = self.path.split("?", 1)[0]
+        if path in ("/metrics", "/"):
+            body, ctype = registry.render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body, ctype = json.dumps(registry.snapshot(), ensure_ascii=False).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    registry: MetricsRegistry
+
+
+class MetricsServer:
+    """在本地端口提供 /metrics（Prometheus 文本）与 /metrics.json。"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd: Optional[_Server] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self) -> "MetricsServer":
+        self._httpd = _Server((self.host, self.port), _Handler)
+        self._httpd.registry = self.registry
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"指标服务已启动：{self.url}")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+def _atomic_write(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class SnapshotWriter:
+    """每隔 interval 秒把快照写入 path（JSON）与同名 .prom 文件；stop() 时再写一次。"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, path: Optional[str] = None, interval: float = 60.0):
+        self.registry = registry
+        self.path = path or os.path.join(DEFAULT_METRICS_DIR, "snapshot.json")
+        self.interval = max(1.0, float(interval))
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+
+    def start(self) -> "SnapshotWriter":
+        self._thread.start()
+        return self
+
+    def write(self):
+        _atomic_write(self.path, json.dumps(self.registry.snapshot(), ensure_ascii=False, indent=2))
+        _atomic_write(os.path.splitext(self.path)[0] + ".prom", self.registry.render_prometheus())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning(f"写入指标快照失败：{e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5.0)
+        self.write()
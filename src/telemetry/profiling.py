@@ -0,0 +1,251 @@
+"""
+长时间运行的性能剖析
+- 内存：tracemalloc 定期快照，输出占用最多的分配位置、与上一次快照的差值、与第一次快照的累计增长
+  （持续增长的位置通常就是泄漏点），累计增长最多的几处附带调用栈
+- CPU：后台线程按 sample_hz 采样所有线程的 Python 调用栈（sys._current_frames），
+  统计每个时间窗口内的热点函数（自身 / 含子调用），并输出 folded 格式的调用栈，
+  可直接用 speedscope 或 flamegraph.pl 查看；阻塞在 threading/queue/selectors 中的样本计为空闲
+- 每隔 interval 秒把上述结果写入 data/profiles/<时间>/（mem-NNNN.txt、cpu-NNNN.txt、cpu-NNNN.folded），
+  并向 summary.jsonl 追加一行机器可读的摘要
+- 可通过配置（telemetry.profile）在启动时开启，也可用信号（默认 SIGUSR1，Windows 为 Ctrl+Break）在运行中开关，
+  无需重启
+"""
+from __future__ import annotations
+
+import json
+import linecache
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_PROFILE_DIR = os.path.join(os.getcwd(), "data", "profiles")
+MAX_STACK_DEPTH = 64
+# 栈顶位于这些模块时视为线程空闲（等待锁、队列或网络）
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "socketserver.py", "ssl.py", "socket.py")
+DEFAULT_SIGNAL = "SIGUSR1" if hasattr(signal, "SIGUSR1") else "SIGBREAK"
+
+logger = logging.getLogger(__name__)
+
+FrameKey = Tuple[str, int, str]
+
+
+def _label(key: FrameKey) -> str:
+    filename, lineno, name = key
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+def _stack(frame) -> List[FrameKey]:
+    """从栈顶到栈底的 (文件, 函数首行, 函数名)。"""
+    stack: List[FrameKey] = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return stack
+
+
+def _format_stat(stat) -> str:
+    frame = stat.traceback[0]
+    size_diff = getattr(stat, "size_diff", None)
+    diff = f"  {size_diff / 1024:+10.1f} KiB ({stat.count_diff:+d})" if size_diff is not None else ""
+    return f"{stat.size / 1024:10.1f} KiB {stat.count:8d} 块{diff}  {frame.filename}:{frame.lineno}"
+
+
+class Profiler:
+    """tracemalloc 快照 + 调用栈采样，定期写入 out_dir。"""
+
+    def __init__(self, out_dir: Optional[str] = None, interval: float = 300.0, sample_hz: float = 50.0,
+                 top: int = 25, nframes: int = 8):
+        self.root = out_dir or DEFAULT_PROFILE_DIR
+        self.interval = max(1.0, float(interval))
+        self.sample_hz = max(1.0, float(sample_hz))
+        self.top = top
+        self.nframes = nframes
+        self.path: Optional[str] = None
+        self.dumps = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._started_tracemalloc = False
+        self._first: Optional[tracemalloc.Snapshot] = None
+        self._prev: Optional[tracemalloc.Snapshot] = None
+        self._reset_window()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def _reset_window(self):
+        self._window_start = time.time()
+        self._samples = 0
+        self._idle = 0
+        self._self: Counter = Counter()
+        self._cum: Counter = Counter()
+        self._folded: Counter = Counter()
+
+    # ---- 开关 ----
+    def start(self) -> "Profiler":
+        if self.running:
+            return self
+        self.path = os.path.join(self.root, time.strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(self.path, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.nframes)
+            self._started_tracemalloc = True
+        self._stop.clear()
+        self.dumps = 0
+        self._first = self._prev = self._take_snapshot()
+        self._reset_window()
+        self._threads = [
+            threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True),
+            threading.Thread(target=self._dump_loop, name="profiler-dump", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        logger.info(f"性能剖析已开启：每 {self.interval:g} 秒写入 {self.path}")
+        return self
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout=5.0)
+        self._threads = []
+        self.dump()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self._first = self._prev = None
+        logger.info(f"性能剖析已关闭，结果在 {self.path}")
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    # ---- 采样 ----
+    def _sample_loop(self):
+        period = 1.0 / self.sample_hz
+        own = {threading.get_ident()}
+        while not self._stop.wait(period):
+            own.update(t.ident for t in self._threads if t.ident is not None)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid in own:
+                    continue
+                stack = _stack(frame)
+                if not stack:
+                    continue
+                with self._lock:
+                    self._samples += 1
+                    if stack[0][0].endswith(IDLE_MODULES):
+                        self._idle += 1
+                        continue
+                    self._self[stack[0]] += 1
+                    self._cum.update(set(stack))
+                    root = names.get(tid, str(tid))
+                    self._folded[";".join([root] + [_label(k) for k in reversed(stack)])] += 1
+
+    def _dump_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.warning(f"写入性能剖析结果失败：{e}")
+
+    # ---- 输出 ----
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        # 排除剖析器自身（采样计数、格式化调用栈时 linecache 读入的源码）
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def dump(self) -> Optional[Dict[str, Any]]:
+        """立即写出一次内存与 CPU 结果，返回摘要。"""
+        if self.path is None or self._first is None or not tracemalloc.is_tracing():
+            return None
+        self.dumps += 1
+        n = self.dumps
+        snap = self._take_snapshot()
+        top = snap.statistics("lineno")[:self.top]
+        since_prev = snap.compare_to(self._prev, "lineno")[:self.top]
+        since_first = snap.compare_to(self._first, "lineno")[:self.top]
+        growth_tb = snap.compare_to(self._first, "traceback")[:3]
+        self._prev = snap
+        current, peak = tracemalloc.get_traced_memory()
+
+        with self._lock:
+            window = time.time() - self._window_start
+            samples, idle = self._samples, self._idle
+            self_top = self._self.most_common(self.top)
+            cum_top = self._cum.most_common(self.top)
+            folded = dict(self._folded)
+            self._reset_window()
+        busy = max(1, samples - idle)
+
+        mem_lines = [
+            f"# 内存快照 {n}  {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            f"# tracemalloc 当前 {current / 1e6:.1f} MB，峰值 {peak / 1e6:.1f} MB",
+            "", f"## 占用最多的分配位置（前 {self.top}）", *(_format_stat(s) for s in top),
+            "", "## 与上一次快照相比", *(_format_stat(s) for s in since_prev),
+            "", "## 与第一次快照相比（持续增长的位置可能是泄漏）", *(_format_stat(s) for s in since_first),
+            "", "## 累计增长最多的调用栈",
+        ]
+        for s in growth_tb:
+            mem_lines.append(f"{s.size_diff / 1024:+.1f} KiB ({s.count_diff:+d} 块)")
+            mem_lines.extend("    " + line for line in s.traceback.format())
+        cpu_lines = [
+            f"# CPU 采样 {n}  窗口 {window:.1f} 秒，{samples} 个样本（空闲 {idle}），{self.sample_hz:g} Hz",
+            "", "## 自身耗时最多的函数", *(f"{c / busy:7.1%} {c:8d}  {_label(k)}" for k, c in self_top),
+            "", "## 含子调用耗时最多的函数", *(f"{c / busy:7.1%} {c:8d}  {_label(k)}" for k, c in cum_top),
+        ]
+        with open(os.path.join(self.path, f"mem-{n:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(mem_lines) + "\n")
+        with open(os.path.join(self.path, f"cpu-{n:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(cpu_lines) + "\n")
+        with open(os.path.join(self.path, f"cpu-{n:04d}.folded"), "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in folded.items())
+
+        summary = {
+            "dump": n,
+            "ts": time.time(),
+            "traced_mb": round(current / 1e6, 3),
+            "peak_mb": round(peak / 1e6, 3),
+            "window_s": round(window, 3),
+            "samples": samples,
+            "idle_samples": idle,
+            "top_growth": [{"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                            "kib": round(s.size_diff / 1024, 1), "blocks": s.count_diff} for s in since_first[:5]],
+            "hot": [{"function": _label(k), "share": round(c / busy, 4)} for k, c in self_top[:5]],
+        }
+        with open(os.path.join(self.path, "summary.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        return summary
+
+
+def install_signal_toggle(profiler: Profiler, signame: Optional[str] = DEFAULT_SIGNAL) -> bool:
+    """收到 signame 时开关剖析；只能在主线程调用，平台不支持该信号时返回 False。"""
+    signum = getattr(signal, signame or "", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def handler(_signum, _frame):
+        # 信号处理函数中不做文件写入，交给新线程
+        threading.Thread(target=profiler.toggle, name="profiler-toggle", daemon=True).start()
+
+    signal.signal(signum, handler)
+    return True
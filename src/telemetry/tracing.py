@@ -0,0 +1,171 @@
+"""
+轻量追踪 span
+- span(name, cat, **args)：上下文管理器，记录一段代码的起止时间；traced(...)：同样功能的装饰器
+- 未启用时 span() 返回共享的空对象，traced 包装的函数只多一次全局开关判断，开销可忽略
+- 启用后记录为 Chrome trace-event 的完整事件（ph="X"，微秒），按线程区分，
+  export_chrome_trace() 导出的 JSON 可直接用 Perfetto（ui.perfetto.dev）或 chrome://tracing 打开
+- 事件保存在有界的环形缓冲区中，超出 max_events 时丢弃最早的事件
+"""
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+DEFAULT_TRACE_DIR = os.path.join(os.getcwd(), "data", "traces")
+DEFAULT_MAX_EVENTS = 500_000
+
+_enabled = False
+_events: Deque[Dict[str, Any]] = deque(maxlen=DEFAULT_MAX_EVENTS)
+_threads: Dict[int, str] = {}
+_pid = os.getpid()
+_origin_ns = time.perf_counter_ns()
+_recorded = 0
+
+
+def enable(max_events: int = DEFAULT_MAX_EVENTS):
+    """开始记录；会清空之前的事件。"""
+    global _enabled, _events, _recorded
+    _events = deque(maxlen=max(1, int(max_events)))
+    _threads.clear()
+    _recorded = 0
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _now_us() -> float:
+    return (time.perf_counter_ns() - _origin_ns) / 1000.0
+
+
+def _append(event: Dict[str, Any]):
+    global _recorded
+    tid = threading.get_ident()
+    if tid not in _threads:
+        _threads[tid] = threading.current_thread().name
+    event["pid"] = _pid
+    event["tid"] = tid
+    # deque.append 是原子操作，多线程下无需加锁
+    _events.append(event)
+    _recorded += 1
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    def set(self, **args: Any) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: Dict[str, Any]):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = _now_us()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        event = {"name": self.name, "cat": self.cat, "ph": "X", "ts": self.start, "dur": end - self.start}
+        if self.args:
+            event["args"] = self.args
+        _append(event)
+
+    def set(self, **args: Any) -> None:
+        """补充 span 参数（如响应长度、选中的动作），在 Perfetto 的详情面板中显示。"""
+        self.args.update(args)
+
+
+def span(name: str, cat: str = "app", **args: Any):
+    """
+    记录 with 块的耗时：
+        with span("png_encode", "capture", width=w) as s:
+            ...
+            s.set(bytes=n)
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args)
+
+
+def traced(name: Optional[str] = None, cat: str = "app") -> Callable:
+    """装饰器形式的 span，name 默认为函数的限定名。"""
+    def decorate(fn: Callable) -> Callable:
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _enabled:
+                return fn(*a, **kw)
+            with _Span(label, cat, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+
+def instant(name: str, cat: str = "app", **args: Any):
+    """记录一个瞬时事件（如战斗开始）。"""
+    if _enabled:
+        _append({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": _now_us(), "args": args})
+
+
+def sleep(seconds: float, name: str = "sleep"):
+    """time.sleep 的追踪版本，等待时间在时间线上单独显示。"""
+    if not _enabled:
+        time.sleep(seconds)
+        return
+    with _Span(name, "wait", {"seconds": seconds}):
+        time.sleep(seconds)
+
+
+def stats() -> Dict[str, int]:
+    return {"events": len(_events), "recorded": _recorded, "dropped": _recorded - len(_events)}
+
+
+def export_chrome_trace(path: Optional[str] = None, clear: bool = False) -> str:
+    """把已记录的事件写为 Chrome trace-event JSON，返回文件路径。"""
+    if path is None:
+        os.makedirs(DEFAULT_TRACE_DIR, exist_ok=True)
+        path = os.path.join(DEFAULT_TRACE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    events = list(_events)
+    meta = [{"name": "process_name", "ph": "M", "pid": _pid, "tid": 0, "args": {"name": "StarRailAutoBattle"}}]
+    meta.extend({"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid, "args": {"name": tname}}
+                for tid, tname in list(_threads.items()))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms",
+                   "otherData": {"dropped": _recorded - len(events)}}, f, ensure_ascii=False, default=str)
+    os.replace(tmp, path)
+    if clear:
+        _events.clear()
+    return path
@@ -8,14 +8,15 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from typing import Any, Dict, Optional, Tuple
 
-from src.config import load_config
+from src.config import DEFAULT_CONFIG, load_config
 from src.ai import AIClient, AIConfig, AIProviderType
-from src.storage.memory import MemoryStore
+from src.storage.memory import create_memory_store
 from src.models.character import character_from_config
 from src.models.enemy import enemy_from_config
 from src.models.combat import compute_turn_order, summarize_team_estimates, analyze_team_enemy_synergy
-from src.strategy import StrategyManager, MaterialFarmStrategy, AbyssStrategy, StrategyContext, CustomStrategy
+from src.strategy import StrategyManager, MaterialFarmStrategy, AbyssStrategy, StrategyContext, CustomStrategy, search_teams
 from src.image_recognition.ocr import OCR, OCRConfig
+from src.image_recognition.roi import ROIRegistry, screen_size
 from src.image_recognition.scanner import (
     UIRegions,
     CharacterScanner,
@@ -30,7 +31,7 @@ class AppState:
     def __init__(self):
         self.config: Dict[str, Any] = load_config()
         self.ai_client: Optional[AIClient] = None
-        self.memory = MemoryStore()
+        self.memory = create_memory_store(self.config.get("storage"))
         self.strategy_manager = StrategyManager({
             "material_farm": MaterialFarmStrategy(),
             "abyss": AbyssStrategy(),
@@ -51,6 +52,14 @@ class AppState:
                 timeout=int(ai_cfg.get("timeout", 60)),
                 endpoint=ai_cfg.get("endpoint"),
                 headers=ai_cfg.get("headers"),
+                response_format=ai_cfg.get("response_format", "json_schema"),
+                max_tokens=ai_cfg.get("max_tokens") or None,
+                resilience=ai_cfg.get("resilience") or None,
+                fallbacks=ai_cfg.get("fallbacks") or None,
+                profiles=ai_cfg.get("profiles") or None,
+                routes=ai_cfg.get("routes") or None,
+                escalation=ai_cfg.get("escalation") or None,
+                min_confidence=float(ai_cfg.get("min_confidence", 0.5)),
             )
         except Exception:
             cfg = AIConfig(enabled=False)
@@ -122,6 +131,7 @@ class AppState:
             "steps": plan.steps,
             "requires_reroll": plan.requires_reroll,
             "expected_rounds": plan.expected_rounds,
+            "simulation": plan.simulation,
         })
 
         summary = {
@@ -135,6 +145,28 @@ class AppState:
 
         return {"plan": plan, "computed": computed_all, "ai_text": ai_text, "ai_text_file": ai_text_path}
 
+    def search_teams(self) -> Dict[str, Any]:
+        """在完整 roster 中为当前敌人搜索最优 4 人队伍，并保存到记忆"""
+        ts_cfg = self.config.get("team_search", {}) or {}
+        result = search_teams(
+            self.config.get("roster", []),
+            self.config.get("enemy", {}),
+            top_k=int(ts_cfg.get("top_k", 5)),
+            refine=int(ts_cfg.get("refine", 64)),
+            required=ts_cfg.get("required") or None,
+            trials=int(ts_cfg.get("trials", 2000)),
+            workers=ts_cfg.get("workers"),
+        )
+        summary = {
+            "enemy": (self.config.get("enemy", {}) or {}).get("name"),
+            "total_combinations": result.total_combinations,
+            "refined": result.refined,
+            "elapsed": result.elapsed,
+            "teams": [t.__dict__ for t in result.teams],
+        }
+        self.memory.save("team_search", summary)
+        return summary
+
 
 class ConfigFrame(ttk.Frame):
     def __init__(self, master, state: AppState):
@@ -490,11 +522,12 @@ class ScanFrame(ttk.Frame):
         except Exception as e:
             messagebox.showerror("错误", f"截图失败：{e}")
 
-    def _build_scanners(self) -> Tuple[CharacterScanner, EnemyScanner, UIRegions]:
+    def _build_scanners(self) -> Optional[Tuple[CharacterScanner, EnemyScanner, UIRegions]]:
+        """UI 区域超出当前屏幕时弹窗提示并返回 None"""
         # 读取配置
         cfg = self.export_to_config(self.state.config)
         o = cfg.get("ocr", {})
-        u = cfg.get("ui_regions", {})
+        u = {**DEFAULT_CONFIG["ui_regions"], **(cfg.get("ui_regions") or {})}
         # 根据 provider 构建 OCR
         provider = o.get("provider", "tesseract")
         if provider == "ai_vision":
@@ -513,20 +546,25 @@ class ScanFrame(ttk.Frame):
                 invert=bool(o.get("invert", False)),
                 blur=int(o.get("blur", 1)),
             ))
-        ui = UIRegions(
-            character_stats=tuple(u.get("character_stats", [100, 100, 400, 300])),
-            skill_buttons=[tuple(x) for x in (u.get("skill_buttons", []) or [])],
-            skill_detail_region=tuple(u.get("skill_detail_region", [600, 200, 600, 600])),
-            enemy_panel=tuple(u.get("enemy_panel", [1000, 100, 400, 300])),
-            detail_button=(tuple(u.get("detail_button")) if u.get("detail_button") else None),
-        )
+        try:
+            rois = ROIRegistry(u, cfg.get("ui_reference_resolution"))
+            size = screen_size()
+            if size:
+                rois.resolve(size)
+            ui = rois.ui_regions()
+        except ValueError as e:
+            messagebox.showerror("UI 区域配置错误", str(e))
+            return None
         cscan = CharacterScanner(ocr)
         escan = EnemyScanner(ocr)
         return cscan, escan, ui
 
     def on_scan_character(self):
         try:
-            cscan, _, ui = self._build_scanners()
+            scanners = self._build_scanners()
+            if scanners is None:
+                return
+            cscan, _, ui = scanners
             data = cscan.scan_character_all(ui)
             basic = data.get("basic", {})
             stats = basic.get("stats", {})
@@ -554,7 +592,10 @@ class ScanFrame(ttk.Frame):
 
     def on_scan_enemy(self):
         try:
-            _, escan, ui = self._build_scanners()
+            scanners = self._build_scanners()
+            if scanners is None:
+                return
+            _, escan, ui = scanners
             data = escan.scan_enemy_panel(ui)
             enemy = assemble_enemy_from_scan(self.var_enemy_name.get().strip() or "敌人", data.get("raw_text", ""))
             # 写入敌人 JSON 框
@@ -576,6 +617,9 @@ class PlanFrame(ttk.Frame):
         self.btn_compute = ttk.Button(self, text="生成策略（仅规划）", command=self.on_compute)
         self.btn_compute.pack(anchor="w", padx=8, pady=6)
 
+        self.btn_search = ttk.Button(self, text="搜索最佳队伍（从角色池）", command=self.on_search_teams)
+        self.btn_search.pack(anchor="w", padx=8, pady=2)
+
         self.text_output = tk.Text(self, height=24)
         self.text_output.pack(fill=tk.BOTH, expand=True, padx=8, pady=4)
 
@@ -692,6 +736,23 @@ class PlanFrame(ttk.Frame):
         except Exception as e:
             messagebox.showerror("错误", f"生成策略失败：{e}")
 
+    def on_search_teams(self):
+        try:
+            self._gather_config()
+            summary = self.state.search_teams()
+            lines = [
+                f"队伍搜索：共 {summary['total_combinations']} 种组合，精排 {summary['refined']} 支，耗时 {summary['elapsed']}s",
+                "",
+            ]
+            for i, team in enumerate(summary["teams"], 1):
+                lines.append(f"  {i}. {' / '.join(team['names'])}")
+                lines.append(f"      得分 {team['score']}，期望回合 {team['expected_rounds']}，P90 {team['p90']}")
+                lines.append(f"      弱点命中：{team['synergy'].get('weakness_match_names', [])}")
+            self.text_output.delete("1.0", tk.END)
+            self.text_output.insert("1.0", "\n".join(lines))
+        except Exception as e:
+            messagebox.showerror("错误", f"队伍搜索失败：{e}")
+
     def on_start(self):
         # 将当前 UI 配置保存到内存，并基于该配置启动主循环
         try:
@@ -700,6 +761,7 @@ class PlanFrame(ttk.Frame):
 
             self.state.auto = StarRailAutoBattle()
             self.state.auto.config = self.state.config
+            self.state.auto.memory = self.state.memory
             self.state.auto._setup_ai()
             self.state.auto._prepare_strategy()
 
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+AI 请求容错层测试：重试退避、熔断、故障转移与对冲
+- 请求经 AIClient 发往本地 MockOpenAIServer，用 MockBehavior 的错误率与延迟注入故障
+- 退避与熔断时间都调到毫秒级，整个文件几秒内跑完
+"""
+import threading
+import time
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from src.ai.client import AIClient, AIConfig, AIProviderType
+from src.ai.mock_server import MockBehavior, MockOpenAIServer
+from src.ai.resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, backoff_delay
+
+FAST = {"base_delay": 0.01, "max_delay": 0.05, "reset_timeout": 0.2, "hedge": False}
+
+
+def make_client(server, fallbacks=None, **resilience):
+    return AIClient(AIConfig(
+        enabled=True,
+        provider=AIProviderType.OPENAI_COMPATIBLE,
+        api_key="test",
+        base_url=server.base_url,
+        model="primary-model",
+        timeout=5,
+        response_format="none",
+        resilience={**FAST, **resilience},
+        fallbacks=fallbacks,
+    ))
+
+
+def ask(client):
+    return client.chat([{"role": "user", "content": "ping"}], call_type="battle_decision")
+
+
+@pytest.fixture
+def server():
+    with MockOpenAIServer(behavior=MockBehavior(latency_ms=1, seed=1)) as s:
+        yield s
+
+
+def test_backoff_delay_bounds():
+    for attempt in range(6):
+        for _ in range(50):
+            assert 0 <= backoff_delay(attempt, 0.5, 4.0) <= min(4.0, 0.5 * 2 ** attempt)
+    # Retry-After 优先，但不超过上限
+    assert backoff_delay(0, 0.01, 2.0, hint=1.5) >= 1.5
+    assert backoff_delay(0, 0.01, 2.0, hint=30) <= 2.0
+
+
+def test_retries_until_success(server):
+    server.behavior.error_rates = {503: 0.5}
+    client = make_client(server, max_attempts=10, failure_threshold=100)
+    for _ in range(10):
+        assert ask(client)
+    m = client.resilience.metrics
+    assert m["retries"] > 0
+    assert m["attempts"] == 10 + m["retries"]
+    assert m["failures"] == 0
+
+
+def test_retries_exhausted_raises_http_error(server):
+    server.behavior.error_rates = {500: 1.0}
+    client = make_client(server, max_attempts=3, failure_threshold=100)
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    assert client.resilience.metrics["attempts"] == 3
+    assert client.resilience.metrics["retries"] == 2
+    assert server.stats["by_status"]["500"] == 3
+
+
+def test_non_retryable_status_is_not_retried(server):
+    server.behavior.error_rates = {422: 1.0}
+    client = make_client(server, max_attempts=3)
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    assert client.resilience.metrics["attempts"] == 1
+
+
+def test_breaker_open_half_open_close(server):
+    server.behavior.error_rates = {500: 1.0}
+    client = make_client(server, max_attempts=2, failure_threshold=2)
+    breaker = client.resilience.endpoints[0].breaker
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    assert breaker.state == OPEN
+    # 熔断期间不再发请求
+    sent = server.stats["requests"]
+    with pytest.raises(CircuitOpenError):
+        ask(client)
+    assert server.stats["requests"] == sent
+
+    time.sleep(0.25)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    # 半开时只放行一个探测
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.25)
+    server.behavior.error_rates = {}
+    assert ask(client)
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_failed_probe_reopens(server):
+    server.behavior.error_rates = {500: 1.0}
+    client = make_client(server, max_attempts=1, failure_threshold=1)
+    breaker = client.resilience.endpoints[0].breaker
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    time.sleep(0.25)
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        ask(client)
+
+
+def test_client_error_on_probe_releases_breaker(server):
+    server.behavior.error_rates = {500: 1.0}
+    client = make_client(server, max_attempts=1, failure_threshold=1)
+    breaker = client.resilience.endpoints[0].breaker
+    with pytest.raises(requests.HTTPError):
+        ask(client)
+    assert breaker.state == OPEN
+
+    time.sleep(0.25)
+    server.behavior.error_rates = {400: 1.0}
+    with pytest.raises(requests.HTTPError) as err:
+        ask(client)
+    assert err.value.response.status_code == 400
+    # 端点能正常作答：探测结束，熔断器关闭，后续请求照常放行
+    assert breaker.state == CLOSED
+    server.behavior.error_rates = {}
+    assert ask(client)
+
+
+def test_failover_to_fallback_endpoint(server):
+    server.behavior.error_rates = {500: 1.0}
+    with MockOpenAIServer(behavior=MockBehavior(latency_ms=1, seed=2)) as backup:
+        client = make_client(server, max_attempts=2, failure_threshold=2,
+                             fallbacks=[{"name": "backup", "base_url": backup.base_url, "model": "backup-model"}])
+        assert ask(client)
+        m = client.resilience.metrics
+        assert m["failovers"] == 1
+        assert backup.stats["requests"] == 1
+        stats = client.resilience.endpoint_stats()
+        assert stats["primary"]["state"] == OPEN
+        assert stats["backup"]["successes"] == 1
+
+        # 主端点熔断期间直接走备用端点
+        sent = server.stats["requests"]
+        assert ask(client)
+        assert server.stats["requests"] == sent
+        assert m["breaker_rejected"] >= 1
+
+
+def test_failover_on_auth_error_without_retry(server):
+    server.behavior.error_rates = {401: 1.0}
+    with MockOpenAIServer(behavior=MockBehavior(latency_ms=1)) as backup:
+        client = make_client(server, max_attempts=3,
+                             fallbacks=[{"base_url": backup.base_url}])
+        assert ask(client)
+        assert server.stats["by_status"]["401"] == 1
+        assert client.resilience.metrics["retries"] == 0
+
+
+def test_hedged_request_wins_over_slow_one(server):
+    client = make_client(server, hedge=True, hedge_min_samples=5, hedge_min_delay=0.05)
+    server.behavior.latency_ms = 5
+    for _ in range(5):
+        ask(client)
+    assert client.resilience.hedge_delay(client.resilience.endpoints[0], "battle_decision") is not None
+
+    # 第一个请求抽到 800ms 延迟；发出后改回快速响应，对冲请求应先返回
+    server.behavior.latency_ms = 800
+    result = {}
+    t = threading.Thread(target=lambda: result.setdefault("text", ask(client)))
+    start = time.perf_counter()
+    t.start()
+    time.sleep(0.02)
+    server.behavior.latency_ms = 5
+    t.join(5)
+    elapsed = time.perf_counter() - start
+    assert result.get("text")
+    assert client.resilience.metrics["hedged"] == 1
+    assert client.resilience.metrics["hedge_wins"] == 1
+    assert elapsed < 0.5
+
+
+def test_hedging_disabled_waits_for_slow_request(server):
+    client = make_client(server, hedge=False)
+    server.behavior.latency_ms = 150
+    start = time.perf_counter()
+    assert ask(client)
+    assert time.perf_counter() - start >= 0.15
+    assert client.resilience.metrics["hedged"] == 0
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+列式表测试：RosterTable / EnemyTable 与配置字典的无损互转
+- 写回的配置与输入逐键相等，键序与数值类型（int / float）也相同
+"""
+import json
+
+from src.models.tables import EnemyTable, RosterTable
+
+
+def same(a, b):
+    # json 比较同时检查键序与 int / float 的区别
+    return json.dumps(a) == json.dumps(b)
+
+
+def test_roster_round_trip_partial_config():
+    cfg = {
+        "name": "希儿", "path": "巡猎", "element": "Quantum", "level": 80,
+        "base_stats": {"atk": 640, "hp": 931, "def": 363, "spd": 115},
+        "relics": {"crit_rate": 0.6, "atk_flat": 352, "speed": 12},
+    }
+    out = RosterTable.from_configs([cfg]).to_configs()
+    assert same(out, [cfg])
+
+
+def test_roster_round_trip_full_config():
+    cfg = {
+        "name": "银狼", "path": "虚无", "element": "Quantum", "level": 80, "eidolon": 0,
+        "base_stats": {"atk": 640.5, "hp": 1047, "def": 460, "spd": 107, "taunt": 75},
+        "relics": {"atk_percent": 0.3, "crit_dmg": 1.2, "set": "天才"},
+        "light_cone": {"name": "雨一直下", "superimpose": 1, "stats": {"atk_flat": 582, "crit_rate": 0.12}},
+        "skill_levels": {"basic": 6, "skill": 10},
+        "notes": None,
+        "team_tag": ["debuff"],
+    }
+    out = RosterTable.from_configs([cfg]).to_configs()
+    assert same(out, [cfg])
+
+
+def test_roster_round_trip_keeps_edits():
+    table = RosterTable.from_configs([{"name": "a", "base_stats": {"atk": 500}}])
+    table.base[0, 0] = 512.5
+    assert table.to_config(0) == {"name": "a", "base_stats": {"atk": 512.5}}
+
+
+def test_enemy_round_trip():
+    cfgs = [
+        {"name": "A", "level": 80, "weaknesses": ["Ice", "Fire", "Shadow"], "resistances": {"Wind": 0.2, "Fire": 0},
+         "base_stats": {"toughness": 30, "hp": 1000.0, "x": 1}, "custom": 1, "notes": None},
+        {"name": "B", "weaknesses": ["Quantum", "Physical"]},
+        {"name": "C", "base_stats": {}},
+    ]
+    assert same(EnemyTable.from_configs(cfgs).to_configs(), cfgs)